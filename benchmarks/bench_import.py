@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import sys
+import time
+import click
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RULES_FP = os.path.join(ROOT, 'metadata_cleaning', 'tests', 'test_datasets',
+                        'input', 'rules', 'rules_test_full.yaml')
+CLI_FP = os.path.join(ROOT, 'metadata_cleaning', 'scripts', 'cleaning.py')
+
+# the commands that do not clean metadata, which must not import these
+COMMANDS = [['--help'], ['--version'], ['validate', '-r', RULES_FP]]
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow']
+
+
+def time_command(args, repeats):
+    """
+    Time a Python command (best of the runs) and
+    get the top-level modules that it imports.
+
+    Parameters
+    ----------
+    args : list
+        Arguments of the Python interpreter.
+
+    repeats : int
+        Number of runs.
+
+    Returns
+    -------
+    seconds : float
+        Best wall time.
+
+    modules : set
+        Top-level modules imported.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [ROOT] + [x for x in [os.environ.get('PYTHONPATH')] if x]))
+    seconds = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        run_seconds = time.perf_counter() - start
+        seconds = run_seconds if seconds is None else min(seconds, run_seconds)
+    importtime = subprocess.run([sys.executable, '-X', 'importtime'] + args, env=env,
+                                check=True, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True).stderr
+    modules = set(line.rsplit('|', 1)[-1].strip().split('.')[0]
+                  for line in importtime.splitlines() if line.startswith('import time:'))
+    return seconds, modules
+
+
+@click.command()
+@click.option("--repeats", default=5, type=int, show_default=True,
+              help="Number of runs per command (the best time is reported).")
+@click.option("--budget-ms", default=200., type=float, show_default=True,
+              help="Maximum time of each command on top of the start of the interpreter.")
+def bench_import(repeats, budget_ms):
+    """
+    Time the commands of the cleaning CLI that do not clean metadata (cold
+    start) and fail if they exceed the budget or import pandas or numpy.
+    """
+    baseline, _ = time_command(['-c', 'pass'], repeats)
+    print('command\tseconds\tover_interpreter_ms\theavy_modules')
+    print('python -c pass\t%.4f\t\t' % baseline)
+    failed = False
+    for command in COMMANDS:
+        seconds, modules = time_command([CLI_FP] + command, repeats)
+        over_ms = (seconds - baseline) * 1000
+        heavy = sorted(set(HEAVY_MODULES) & modules)
+        failed = failed or over_ms > budget_ms or bool(heavy)
+        print('%s\t%.4f\t%.1f\t%s' % (' '.join(command[:1]), seconds, over_ms, ','.join(heavy)))
+    if failed:
+        print('Cold start over the budget of %sms or importing: %s' % (
+            budget_ms, ', '.join(HEAVY_MODULES)))
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    bench_import()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import gc
+import io
+import os
+import sys
+import yaml
+import ctypes
+import time
+import click
+import resource
+import warnings
+import tempfile
+import contextlib
+import tracemalloc
+import multiprocessing
+
+from bench_suite import make_bench_metadata, make_bench_rules
+
+# rows generated at once (the table is appended to the file chunk by chunk)
+CHUNK_ROWS = 100000
+
+
+def get_rss_mb(field='VmRSS'):
+    """
+    Get the resident memory of the process, or its peak.
+
+    Parameters
+    ----------
+    field : str
+        'VmRSS' (current) or 'VmHWM' (peak since the last reset).
+
+    Returns
+    -------
+    rss : float
+        Memory in MB (None if not available).
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('%s:' % field):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if field == 'VmHWM':
+        # peak of the whole process (in kB on Linux, in bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return None
+
+
+def release_memory():
+    """
+    Collect the garbage and give the free memory of the heap back to the
+    system (glibc only), so that the resident memory only counts live objects.
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident memory of the process (Linux only).
+
+    Returns
+    -------
+    bool
+        Whether the peak was reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as o:
+            o.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def write_bench_metadata(metadata_fp, size_mb, n_cols):
+    """
+    Generate a metadata file of about the wanted size,
+    by chunks of rows not to hold the whole table in memory.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the metadata file to write.
+
+    size_mb : float
+        Size of the file, in MB.
+
+    n_cols : int
+        Number of columns (besides the sample IDs).
+
+    Returns
+    -------
+    columns : list
+        Columns of the metadata table.
+
+    n_rows : int
+        Number of rows.
+    """
+    sample = make_bench_metadata(1000, n_cols).to_csv(index=False, sep='\t')
+    row_size = len(sample.encode('utf-8')) / 1000
+    n_rows = max(1000, int(size_mb * 1024 * 1024 / row_size))
+    columns = None
+    with open(metadata_fp, 'w') as o:
+        for seed, start in enumerate(range(0, n_rows, CHUNK_ROWS)):
+            chunk_pd = make_bench_metadata(min(CHUNK_ROWS, n_rows - start), n_cols, seed=seed)
+            # the sample IDs of each chunk follow those of the previous chunks
+            chunk_pd['sample_name'] = (chunk_pd['sample_name'].astype(int) + start).astype(str)
+            chunk_pd.to_csv(o, index=False, sep='\t', header=columns is None)
+            columns = chunk_pd.columns.tolist()
+    return columns, n_rows
+
+
+def measure_cleaning(metadata_fp, rules_fp, output_fp):
+    """
+    Measure the memory of the metadata table and the peak memory of its
+    cleaning, to run in a new process (for a baseline without the
+    memory of the generation of the table).
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the metadata file.
+
+    rules_fp : str
+        Path to the rules file.
+
+    output_fp : str
+        Path to the output metadata file.
+
+    Returns
+    -------
+    measures : dict
+        'input_mb'  : memory of the table as read.
+        'peak_mb'   : peak memory while cleaning and writing the table
+                      (the table as read included).
+        'seconds'   : wall time of the cleaning.
+        'method'    : 'rss' or 'tracemalloc' (no peak reset).
+    """
+    import pandas as pd
+    from metadata_cleaning._yaml_utils import parse_yaml_file
+    from metadata_cleaning._df_utils import parse_metadata_file
+    from metadata_cleaning.metadata_clean import metadata_clean
+
+    warnings.simplefilter('ignore', pd.errors.SettingWithCopyWarning)
+    with contextlib.redirect_stdout(io.StringIO()):
+        rules, nan_value, nan_value_user, sample_id_cols = parse_yaml_file(rules_fp)
+    method = 'rss'
+    if not reset_peak_rss():
+        # the peak of the process would include the reading
+        method = 'tracemalloc'
+        tracemalloc.start()
+    release_memory()
+    baseline = get_rss_mb() if method == 'rss' else 0
+    metadata_pd = parse_metadata_file(metadata_fp, sample_id_cols)
+    if method == 'rss':
+        release_memory()
+        input_mb = get_rss_mb() - baseline
+        reset_peak_rss()
+    else:
+        input_mb = tracemalloc.get_traced_memory()[0] / (1024 * 1024)
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        metadata_clean(
+            rules=rules, no_booleans=False, no_combinations=False, no_del_columns=False,
+            no_forbidden_characters=False, no_nans=False, no_per_column=False,
+            no_solve_dtypes=False, no_time_format=False, nan_value=nan_value,
+            nan_value_user=nan_value_user, sample_id_cols=sample_id_cols,
+            metadata_pd=metadata_pd, metadata_fp=metadata_fp, output_fp=output_fp,
+            show=False)
+    seconds = time.perf_counter() - start
+    if method == 'rss':
+        peak_mb = get_rss_mb('VmHWM') - baseline
+    else:
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return {'input_mb': input_mb, 'peak_mb': peak_mb, 'seconds': seconds, 'method': method}
+
+
+@click.command()
+@click.option("--size-mb", default=1024, type=float, show_default=True,
+              help="Size of the generated metadata file, in MB.")
+@click.option("--cols", default=60, type=int, show_default=True,
+              help="Number of columns of the generated table.")
+@click.option("--rules", default='medium', show_default=True,
+              type=click.Choice(['small', 'medium', 'large']), help="Size of the rule set.")
+@click.option("--max-ratio", default=2.6, type=float, show_default=True,
+              help="Maximum peak memory of the cleaning, relative to the table as read "
+                   "(2x plus the margin of the text blocks written at once and of the "
+                   "columns whose missing value tokens are also edited by "
+                   "\"forbidden_characters\", measured at 2.58x and 2.57x on 200MB "
+                   "and 1GB tables).")
+def bench_memory(size_mb, cols, rules, max_ratio):
+    """
+    Measure the peak memory of the cleaning of a generated metadata
+    table relative to the memory of the table, and fail above a bound.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        metadata_fp = os.path.join(tmp_dir, 'md.tsv')
+        columns, n_rows = write_bench_metadata(metadata_fp, size_mb, cols)
+        rules_fp = os.path.join(tmp_dir, 'rules_%s.yaml' % rules)
+        with open(rules_fp, 'w') as o:
+            yaml.dump(make_bench_rules(columns, rules), o)
+        output_fp = os.path.join(tmp_dir, 'out')
+        # spawned, not to count the memory of the generation
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(1) as pool:
+            measures = pool.apply(measure_cleaning, (metadata_fp, rules_fp, output_fp))
+    ratio = measures['peak_mb'] / measures['input_mb']
+    print('rows\tcols\trules\tfile_mb\tinput_mb\tpeak_mb\tratio\tseconds\tmethod')
+    print('%s\t%s\t%s\t%.1f\t%.1f\t%.1f\t%.2f\t%.1f\t%s' % (
+        n_rows, cols + 1, rules, size_mb, measures['input_mb'], measures['peak_mb'],
+        ratio, measures['seconds'], measures['method']))
+    if ratio > max_ratio:
+        print('Peak memory above %s times the table' % max_ratio)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    bench_memory()
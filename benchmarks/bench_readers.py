@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import time
+import click
+import tempfile
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from metadata_cleaning._df_utils import read_input_metadata
+
+
+def make_metadata_table(n_rows, n_cols, seed=0):
+    """
+    Generate a metadata table with the kinds of columns found in the
+    metadata: sample IDs, floats, integers, booleans, factors with
+    missing value tokens, free text and dates.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows.
+
+    n_cols : int
+        Number of columns (besides the sample IDs).
+
+    seed : int
+        Seed of the random generator.
+
+    Returns
+    -------
+    md_pd : pd.DataFrame
+        Metadata table (all columns as text).
+    """
+    rng = np.random.default_rng(seed)
+    factors = np.array(['male', 'female', 'not provided', 'Unknown', 'nan', ''], dtype=object)
+    columns = {'sample_name': np.char.add('000', np.arange(n_rows).astype(str))}
+    for cdx in range(n_cols):
+        kind = cdx % 6
+        if kind == 0:
+            values = np.round(rng.normal(50, 20, n_rows), 3).astype(str)
+        elif kind == 1:
+            values = rng.integers(0, 100, n_rows).astype(str)
+        elif kind == 2:
+            values = rng.choice(np.array(['True', 'False', ''], dtype=object), n_rows)
+        elif kind == 3:
+            values = rng.choice(factors, n_rows)
+        elif kind == 4:
+            values = np.char.add('text_', rng.integers(0, n_rows, n_rows).astype(str))
+        else:
+            values = pd.date_range('2011-01-01', periods=1000).strftime('%Y-%m-%d')[
+                rng.integers(0, 1000, n_rows)]
+        columns['col_%s' % cdx] = values
+    return pd.DataFrame(columns)
+
+
+def time_reader(metadata_fp, reader, repeats):
+    """
+    Get the best time to read a metadata file.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the metadata file.
+
+    reader : str
+        'pandas' or 'arrow'.
+
+    repeats : int
+        Number of reads.
+
+    Returns
+    -------
+    best : float
+        Best time (in seconds).
+
+    md_pd : pd.DataFrame
+        Metadata table.
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        md_pd = read_input_metadata(metadata_fp, False, ['sample_name'], None, reader)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best, md_pd
+
+
+@click.command()
+@click.option("--tall", default=(1000000, 20), type=(int, int), show_default=True,
+              help="Rows and columns of the tall table.")
+@click.option("--wide", default=(1000, 5000), type=(int, int), show_default=True,
+              help="Rows and columns of the wide table.")
+@click.option("--repeats", default=3, type=int, show_default=True,
+              help="Number of reads per reader (the best time is reported).")
+def bench_readers(tall, wide, repeats):
+    """
+    Compare the pandas and Arrow readers of tab-separated metadata files.
+    """
+    print('table\trows\tcolumns\tMB\tpandas_s\tarrow_s\tspeedup')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, (n_rows, n_cols) in [('tall', tall), ('wide', wide)]:
+            metadata_fp = os.path.join(tmp_dir, '%s.tsv' % name)
+            make_metadata_table(n_rows, n_cols).to_csv(metadata_fp, index=False, sep='\t')
+            pandas_s, pandas_pd = time_reader(metadata_fp, 'pandas', repeats)
+            arrow_s, arrow_pd = time_reader(metadata_fp, 'arrow', repeats)
+            # same table whatever the reader
+            assert_frame_equal(pandas_pd, arrow_pd)
+            print('%s\t%s\t%s\t%.1f\t%.3f\t%.3f\t%.1fx' % (
+                name, n_rows, n_cols, os.path.getsize(metadata_fp) / 1e6,
+                pandas_s, arrow_s, pandas_s / arrow_s))
+
+
+if __name__ == "__main__":
+    bench_readers()
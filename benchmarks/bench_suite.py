@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import io
+import os
+import sys
+import json
+import time
+import yaml
+import click
+import warnings
+import platform
+import tempfile
+import itertools
+import subprocess
+import contextlib
+import numpy as np
+import pandas as pd
+
+from metadata_cleaning._yaml_utils import get_yaml_rules, parse_yaml_file
+from metadata_cleaning._df_utils import parse_metadata_file
+from metadata_cleaning._plan_utils import RulePlan
+from metadata_cleaning._profile_utils import CleaningProfile, start_stage, stop_stage
+from metadata_cleaning.metadata_clean import metadata_clean
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RULES_FP = os.path.join(ROOT, 'metadata_cleaning', 'tests', 'test_datasets',
+                        'input', 'rules', 'rules_test_full.yaml')
+CLI_FP = os.path.join(ROOT, 'metadata_cleaning', 'scripts', 'cleaning.py')
+HISTORY_FP = os.path.join(ROOT, 'benchmarks', 'history.jsonl')
+
+# missing value tokens as found in the metadata (some in the "nans" rules)
+NAN_TOKENS = np.array(['not provided', 'Not provided', 'Unknown', 'unspecified',
+                       'no_data', 'nan', ''], dtype=object)
+
+
+def get_tokens(rng, values, ratio=0.05):
+    """
+    Replace a ratio of the values by missing value tokens.
+
+    Parameters
+    ----------
+    rng : np.random.Generator
+        Random generator.
+
+    values : np.array
+        Values of a column (as text).
+
+    ratio : float
+        Ratio of missing value tokens.
+
+    Returns
+    -------
+    values : np.array
+        Values of the column with missing value tokens.
+    """
+    values = values.astype(object)
+    mask = rng.random(values.size) < ratio
+    values[mask] = rng.choice(NAN_TOKENS, int(mask.sum()))
+    return values
+
+
+def get_dates(rng, n_rows, formats):
+    """
+    Get dates between 2011 and 2018 written in various formats.
+
+    Parameters
+    ----------
+    rng : np.random.Generator
+        Random generator.
+
+    n_rows : int
+        Number of dates.
+
+    formats : list
+        strftime formats, e.g. ['%m/%d/%Y', '%m/%d/%y'].
+
+    Returns
+    -------
+    values : np.array
+        Dates as text.
+    """
+    pool = pd.date_range('2011-01-01 06:00', '2018-12-31', freq='37min')[::50]
+    picks = rng.integers(0, len(pool), n_rows)
+    kinds = rng.integers(0, len(formats), n_rows)
+    values = np.empty(n_rows, dtype=object)
+    for fdx, strftime_format in enumerate(formats):
+        mask = kinds == fdx
+        values[mask] = pool.strftime(strftime_format).to_numpy(dtype=object)[picks[mask]]
+    return values
+
+
+# the columns of the "full" data of tests/generate_test_metadata.py, at scale
+TEMPLATES = [
+    ('AGE_CORR', lambda rng, n: get_tokens(rng, rng.integers(0, 130, n).astype(str))),
+    ('bloom_fraction', lambda rng, n: get_tokens(rng, np.round(rng.uniform(-0.5, 2.1, n), 3).astype(str))),
+    ('bmi', lambda rng, n: get_tokens(rng, rng.integers(10, 131, n).astype(str))),
+    ('weight_g', lambda rng, n: get_tokens(rng, np.round(rng.uniform(1, 250, n), 1).astype(str))),
+    ('height_cm', lambda rng, n: get_tokens(rng, rng.integers(10, 400, n).astype(str))),
+    ('sex', lambda rng, n: get_tokens(rng, rng.choice(np.array(['male', 'female'], dtype=object), n), 0.2)),
+    ('pregnant', lambda rng, n: get_tokens(rng, rng.choice(np.array(['True', 'False'], dtype=object), n))),
+    ('TF', lambda rng, n: rng.choice(np.array(['True', 'False'], dtype=object), n)),
+    ('alcohol_consumption', lambda rng, n: get_tokens(rng, rng.choice(np.array(['Yes', 'No'], dtype=object), n))),
+    ('country', lambda rng, n: get_tokens(rng, rng.choice(np.array(
+        ['USA', 'US', 'United States of America', 'France', 'Reunion', 'Libyan Arab Jamahiriya'],
+        dtype=object), n))),
+    ('description', lambda rng, n: np.char.add('plot (north), site/', rng.integers(0, 1000, n).astype(str)).astype(object)),
+    # the date/time columns hold no missing value tokens, as in the "full" data ("time_format"
+    # parses the values left by the "booleans" rule, which does not replace these tokens)
+    ('COLLECTION_DATE', lambda rng, n: get_dates(rng, n, ['%m/%d/%Y', '%m/%d/%y'])),
+    ('COLLECTION_TIME', lambda rng, n: get_dates(rng, n, ['%H:%M:%S'])),
+    ('COLLECTION_TIMESTAMP', lambda rng, n: get_dates(rng, n, ['%m/%d/%Y %H:%M', '%m/%d/%y %H:%M'])),
+    ('latitude', lambda rng, n: np.round(rng.uniform(-90, 90, n), 4).astype(str).astype(object)),
+]
+
+
+def make_bench_metadata(n_rows, n_cols, duplicated=0.01, seed=0):
+    """
+    Generate a metadata table with the columns of the test
+    metadata (numbers, factors, booleans, free text, dates and times)
+    repeated up to the wanted number of columns, with missing value
+    tokens and duplicated sample IDs.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows.
+
+    n_cols : int
+        Number of columns (besides the sample IDs): the first ones are
+        named as in the test metadata, e.g. 'AGE_CORR', then e.g. 'AGE_CORR_1'.
+
+    duplicated : float
+        Ratio of duplicated sample IDs.
+
+    seed : int
+        Seed of the random generator.
+
+    Returns
+    -------
+    md_pd : pd.DataFrame
+        Metadata table (all columns as text).
+    """
+    rng = np.random.default_rng(seed)
+    sample_ids = np.arange(n_rows)
+    mask = rng.random(n_rows) < duplicated
+    sample_ids[mask] = rng.integers(0, n_rows, int(mask.sum()))
+    columns = {'sample_name': sample_ids.astype(str).astype(object)}
+    for cdx in range(n_cols):
+        name, make_values = TEMPLATES[cdx % len(TEMPLATES)]
+        if cdx >= len(TEMPLATES):
+            name = '%s_%s' % (name, cdx // len(TEMPLATES))
+        columns[name] = make_values(rng, n_rows)
+    return pd.DataFrame(columns)
+
+
+def make_bench_rules(columns, size, rules_fp=RULES_FP):
+    """
+    Get rules of growing size for a generated metadata table,
+    from the rules of the test data sets.
+
+    Parameters
+    ----------
+    columns : list
+        Columns of the metadata table.
+
+    size : str
+        'small' : "sample_id", "nans" and "booleans" rules only.
+        'medium': all the rules of the test data sets, for all the
+                  date and time columns.
+        'large' : same as 'medium' plus a "per_column" rule per numeric
+                  column and a "combinations" rule per copy of the columns.
+
+    rules_fp : str
+        Path to the rules of the test data sets.
+
+    Returns
+    -------
+    rules : dict
+        Rules to write in yaml format.
+    """
+    rules = get_yaml_rules(rules_fp)
+    if size == 'small':
+        return dict((x, rules[x]) for x in ['sample_id', 'na_value', 'nans', 'booleans'])
+    rules['time_format']['columns'] = [x for x in columns if x.startswith('COLLECTION_')]
+    if size == 'large':
+        ranges = {'AGE_CORR': 'range(0,120)', 'bloom_fraction': 'range(0,1)',
+                  'bmi': 'range(15,50)', 'weight_g': 'range(2.5,200)',
+                  'height_cm': 'range(48,210)', 'latitude': 'range(-90,90)'}
+        for col in columns:
+            if col.split('_')[-1].isdigit() and col.rsplit('_', 1)[0] in ranges:
+                rules['per_column'][col] = [ranges[col.rsplit('_', 1)[0]]]
+        for col in columns:
+            if col.startswith('AGE_CORR_'):
+                suffix = col.rsplit('_', 1)[-1]
+                alcohol = 'alcohol_consumption_%s' % suffix
+                if alcohol in columns:
+                    rules['combinations'][(col, alcohol)] = [('range(0,4)', True), alcohol]
+    return rules
+
+
+def get_commit():
+    """
+    Get the current commit of the repository (and whether it has edits).
+
+    Returns
+    -------
+    commit : str
+        Commit hash (None outside of a git repository).
+
+    dirty : bool
+        Whether the working tree has uncommitted edits.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                cwd=ROOT, capture_output=True, text=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def time_stages(metadata_fp, rules_fp, output_fp, repeats):
+    """
+    Time the reading and each stage of metadata_clean().
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the metadata file.
+
+    rules_fp : str
+        Path to the rules file.
+
+    output_fp : str
+        Path to the output metadata file.
+
+    repeats : int
+        Number of runs (the best time is reported).
+
+    Returns
+    -------
+    stages : dict
+        key    -> stage
+        value  -> best wall time (in seconds)
+
+    total : float
+        Best wall time of the whole cleaning (in seconds).
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        rules, nan_value, nan_value_user, sample_id_cols = parse_yaml_file(rules_fp)
+    stages, total = {}, None
+    for _ in range(repeats):
+        profile = CleaningProfile(count_edits=False, trace_memory=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            stage = start_stage(profile, 'read')
+            metadata_pd = parse_metadata_file(metadata_fp, sample_id_cols)
+            stop_stage(profile, stage, metadata_pd)
+            metadata_clean(
+                rules=rules, no_booleans=False, no_combinations=False, no_del_columns=False,
+                no_forbidden_characters=False, no_nans=False, no_per_column=False,
+                no_solve_dtypes=False, no_time_format=False, nan_value=nan_value,
+                nan_value_user=nan_value_user, sample_id_cols=sample_id_cols,
+                metadata_pd=metadata_pd, metadata_fp=metadata_fp, output_fp=output_fp,
+                show=False, plan=RulePlan(rules, nan_value), profile=profile)
+        report = profile.get_report()
+        for record in report['stages']:
+            stages[record['stage']] = min(stages.get(record['stage'], np.inf),
+                                          record['wall_time_s'])
+        total = report['wall_time_s'] if total is None else min(total, report['wall_time_s'])
+    return stages, total
+
+
+def time_cli(metadata_fp, rules_fp, output_fp, repeats):
+    """
+    Time the cleaning command (including the start of python).
+
+    Parameters
+    ----------
+    (same as time_stages())
+
+    Returns
+    -------
+    best : float
+        Best wall time (in seconds).
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [ROOT] + [x for x in [os.environ.get('PYTHONPATH')] if x]))
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, CLI_FP, 'clean', '-r', rules_fp, '-m', metadata_fp,
+                        '-o', output_fp], env=env, check=True, capture_output=True)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+
+def read_history(history_fp):
+    """
+    Read the results of the previous benchmarks.
+
+    Parameters
+    ----------
+    history_fp : str
+        Path to the history (one JSON result per line).
+
+    Returns
+    -------
+    history : list
+        Previous results (in order).
+    """
+    if not os.path.isfile(history_fp):
+        return []
+    with open(history_fp) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def get_previous(history, result):
+    """
+    Get the last result of the same case from another commit
+    (or from the same commit if the current tree has edits).
+
+    Parameters
+    ----------
+    history : list
+        Previous results (in order).
+
+    result : dict
+        Current result.
+
+    Returns
+    -------
+    previous : dict
+        Last result of the same case (None if any).
+    """
+    for previous in reversed(history):
+        if previous['case'] == result['case'] and (
+                previous['commit'] != result['commit'] or result['dirty']):
+            return previous
+    return None
+
+
+@click.command()
+@click.option("--rows", multiple=True, type=int, default=[1000, 10000, 100000], show_default=True,
+              help="Numbers of rows of the generated tables (e.g. up to 1000000).")
+@click.option("--cols", multiple=True, type=int, default=[10, 100], show_default=True,
+              help="Numbers of columns of the generated tables (e.g. up to 10000).")
+@click.option("--rules", multiple=True, default=['small', 'medium', 'large'], show_default=True,
+              type=click.Choice(['small', 'medium', 'large']), help="Sizes of the rule sets.")
+@click.option("--repeats", default=1, type=int, show_default=True,
+              help="Number of runs per case (the best time is reported).")
+@click.option("--cli/--no-cli", default=True, show_default=True,
+              help="Also time the cleaning command end-to-end.")
+@click.option("--history", default=HISTORY_FP, show_default=True,
+              help="History of the results (one JSON result per line), appended.")
+def bench_suite(rows, cols, rules, repeats, cli, history):
+    """
+    Time each stage of the cleaning of generated metadata tables of growing
+    size with rule sets of growing size, and compare to the history.
+    """
+    # the warnings of pandas would be repeated for each case
+    warnings.simplefilter('ignore', pd.errors.SettingWithCopyWarning)
+    commit, dirty = get_commit()
+    past = read_history(history)
+    results = []
+    print('rows\tcols\trules\tstage\tseconds\tprevious\tratio')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows, n_cols in itertools.product(sorted(rows), sorted(cols)):
+            metadata_fp = os.path.join(tmp_dir, 'md_%s_%s.tsv' % (n_rows, n_cols))
+            metadata_pd = make_bench_metadata(n_rows, n_cols)
+            metadata_pd.to_csv(metadata_fp, index=False, sep='\t')
+            for size in rules:
+                rules_fp = os.path.join(tmp_dir, 'rules_%s.yaml' % size)
+                with open(rules_fp, 'w') as o:
+                    yaml.dump(make_bench_rules(metadata_pd.columns.tolist(), size), o)
+                output_fp = os.path.join(tmp_dir, 'out')
+                stages, total = time_stages(metadata_fp, rules_fp, output_fp, repeats)
+                result = {
+                    'commit': commit, 'dirty': dirty,
+                    'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'python': platform.python_version(), 'pandas': pd.__version__,
+                    'numpy': np.__version__,
+                    'case': {'rows': n_rows, 'cols': n_cols, 'rules': size},
+                    'stages': stages, 'api_s': total,
+                    'cli_s': time_cli(metadata_fp, rules_fp, output_fp, repeats) if cli else None
+                }
+                results.append(result)
+                previous = get_previous(past, result) or {'stages': {}}
+                timings = list(stages.items()) + [('api', total), ('cli', result['cli_s'])]
+                for stage, seconds in timings:
+                    if seconds is None:
+                        continue
+                    before = previous.get('%s_s' % stage, previous['stages'].get(stage))
+                    print('%s\t%s\t%s\t%s\t%.4f\t%s\t%s' % (
+                        n_rows, n_cols, size, stage, seconds,
+                        '' if before is None else '%.4f' % before,
+                        '' if not before else '%.2f' % (seconds / before)))
+    if history:
+        with open(history, 'a') as o:
+            for result in results:
+                o.write('%s\n' % json.dumps(result))
+        print('History: %s' % history)
+
+
+if __name__ == "__main__":
+    bench_suite()
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import re
+import glob
+import time
+import traceback
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+from metadata_cleaning._df_utils import parse_metadata_file
+from metadata_cleaning.metadata_clean import metadata_clean
+from metadata_cleaning._cache_utils import ColumnCache, CACHE_SIZE_MB
+from metadata_cleaning._profile_utils import CleaningProfile, start_stage, stop_stage
+
+
+def make_cleaning_args(rules, na_value, nan_value_user, sample_id_cols, plan, nan_value=None,
+                       sample_id=None, no_booleans=False, no_combinations=False,
+                       no_del_columns=False, no_forbidden_characters=False, no_nans=False,
+                       no_per_column=False, no_solve_dtypes=False, no_time_format=False,
+                       output_format=None, compression=None, profile=None, no_cache=False,
+                       cache_dir=None, cache_size=CACHE_SIZE_MB, verbose=False):
+    """
+    Get the arguments of metadata_clean() that do not depend on the
+    metadata file, from the parsed rules and the command line options.
+
+    Parameters
+    ----------
+    rules, na_value, nan_value_user, sample_id_cols
+        Parsed rules (from parse_yaml_file()).
+
+    plan : RulePlan
+        Compiled rules.
+
+    nan_value : str
+        Value overriding the "na_value" of the rules ("-na").
+
+    sample_id : list
+        Columns overriding the sample IDs columns of the rules ("-s").
+
+    no_booleans, ..., verbose
+        Options of the cleaning commands.
+
+    Returns
+    -------
+    cleaning_args : dict
+        Keyword arguments of metadata_clean().
+    """
+    return {
+        'rules': rules,
+        'no_booleans': no_booleans,
+        'no_combinations': no_combinations,
+        'no_del_columns': no_del_columns,
+        'no_forbidden_characters': no_forbidden_characters,
+        'no_nans': no_nans,
+        'no_per_column': no_per_column,
+        'no_solve_dtypes': no_solve_dtypes,
+        'no_time_format': no_time_format,
+        'nan_value': na_value,
+        # override default NaN
+        'nan_value_user': nan_value if nan_value else nan_value_user,
+        # override sample IDs columns
+        'sample_id_cols': sample_id if sample_id else sample_id_cols,
+        'show': verbose,
+        'plan': plan,
+        'output_format': output_format,
+        'compression': compression,
+        'profile': profile,
+        'cache': None if no_cache else ColumnCache(cache_dir, cache_size)
+    }
+
+
+def get_batch_metadata_fps(metadata_paths):
+    """
+    Get the metadata files to clean, largest first.
+
+    Parameters
+    ----------
+    metadata_paths : list
+        Metadata file paths, glob patterns or folders
+        (all the .tsv, .txt, excel, parquet and feather files
+        in the folder that are not outputs of a previous cleaning).
+
+    Returns
+    -------
+    metadata_fps : list
+        Metadata file paths sorted by decreasing size
+        (paths that do not exist come last).
+    """
+    metadata_fps = []
+    for metadata_path in metadata_paths:
+        if os.path.isdir(metadata_path):
+            fps = [os.path.join(metadata_path, x) for x in sorted(os.listdir(metadata_path))
+                   if os.path.splitext(x)[1] in ['.tsv', '.txt', '.xls', '.xlsx',
+                                                 '.parquet', '.pq', '.feather']
+                   and not re.search(r'_clean(_[^.]+)?\.(tsv|parquet|feather)$', x)]
+        else:
+            fps = sorted(glob.glob(metadata_path))
+            if not fps:
+                # kept to be reported as failed
+                fps = [metadata_path]
+        for fp in fps:
+            if fp not in metadata_fps:
+                metadata_fps.append(fp)
+    return sorted(metadata_fps, key=lambda x: os.path.getsize(x) if os.path.isfile(x) else -1,
+                  reverse=True)
+
+
+def get_batch_output_fp(metadata_fp, output_dir):
+    """
+    Get the output path (with no extension) for a metadata file.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the metadata file.
+
+    output_dir : str
+        Folder where to write the outputs
+        (next to the metadata file if None).
+
+    Returns
+    -------
+    output_fp : str
+        Path to the output metadata file,
+        to be completed in write_outputs().
+    """
+    if not output_dir:
+        return None
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(metadata_fp))[0])
+
+
+def get_batch_output_fps(metadata_fps, output_dir):
+    """
+    Get the output paths (with no extension) for the metadata files of a
+    batch, so that files with the same name do not overwrite each other's
+    outputs in the output folder: these outputs are written in sub-folders
+    named as the folders of the files, from their common folder
+    (e.g. 'a/md.tsv' and 'b/md.tsv' to 'out/a/md' and 'out/b/md'),
+    and keep the extension of the files if they are in the same folder
+    (e.g. 'md.tsv' and 'md.xlsx' to 'out/md_tsv' and 'out/md_xlsx').
+
+    Parameters
+    ----------
+    metadata_fps : list
+        Paths to the metadata files.
+
+    output_dir : str
+        Folder where to write the outputs
+        (next to each metadata file if None).
+
+    Returns
+    -------
+    output_fps : dict
+        Path to the output metadata file (to be completed
+        in write_outputs()) for each metadata file.
+    """
+    output_fps = dict((fp, get_batch_output_fp(fp, output_dir)) for fp in metadata_fps)
+    if not output_dir:
+        return output_fps
+    same_names = {}
+    for fp, output_fp in output_fps.items():
+        same_names.setdefault(output_fp, []).append(fp)
+    for fps in same_names.values():
+        if len(fps) < 2:
+            continue
+        common_dir = os.path.commonpath([os.path.dirname(os.path.abspath(x)) for x in fps])
+        names = [os.path.splitext(os.path.relpath(os.path.abspath(x), common_dir)) for x in fps]
+        for fp, (name, extension) in zip(fps, names):
+            if sum(1 for x, _ in names if x == name) > 1:
+                name = '%s_%s' % (name, extension.lstrip('.'))
+            output_fps[fp] = os.path.join(output_dir, name)
+    return output_fps
+
+
+def clean_metadata_file(metadata_fp, output_fp, cleaning_args, categorical_ratio=None,
+                        input_format=None, reader=None):
+    """
+    Clean one metadata file and collect the status of the cleaning.
+    All exceptions are caught so that one failure does not stop a batch.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the metadata file.
+
+    output_fp : str
+        Path to the output metadata file.
+
+    cleaning_args : dict
+        Keyword arguments of metadata_clean() that are common
+        to all the files of the batch (rules, flags, plan, ...).
+
+    categorical_ratio : float
+        Passed to parse_metadata_file().
+
+    input_format : str
+        Passed to parse_metadata_file().
+
+    reader : str
+        Passed to parse_metadata_file().
+
+    Returns
+    -------
+    status : dict
+        Status of the cleaning for the summary.
+    """
+    status = {'metadata_fp': metadata_fp, 'status': 'done', 'seconds': 0.,
+              'rows': '', 'columns': '', 'error': ''}
+    start = time.time()
+    try:
+        if cleaning_args.get('profile') is not None:
+            # one profile per file, including its reading
+            cleaning_args = dict(cleaning_args, profile=CleaningProfile())
+        stage = start_stage(cleaning_args.get('profile'), 'read')
+        metadata_pd = parse_metadata_file(metadata_fp, cleaning_args['sample_id_cols'],
+                                          categorical_ratio, input_format, reader=reader)
+        stop_stage(cleaning_args.get('profile'), stage, metadata_pd)
+        status['rows'], status['columns'] = metadata_pd.shape
+        exit_code = metadata_clean(metadata_pd=metadata_pd, metadata_fp=metadata_fp,
+                                   output_fp=output_fp, **cleaning_args)
+        if exit_code:
+            status['status'] = 'failed'
+            status['error'] = 'metadata_clean exited with code %s' % exit_code
+    except Exception as e:
+        status['status'] = 'failed'
+        status['error'] = '%s: %s' % (type(e).__name__, str(e).replace('\n', ' '))
+        if cleaning_args.get('show'):
+            traceback.print_exc()
+    status['seconds'] = round(time.time() - start, 3)
+    return status
+
+
+def get_failed_status(metadata_fp, error):
+    """
+    Get the status of a metadata file whose cleaning did not return
+    (e.g. its worker process was killed).
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the metadata file.
+
+    error : Exception
+        Error raised when getting the result of the cleaning.
+
+    Returns
+    -------
+    status : dict
+        Status of the cleaning for the summary.
+    """
+    return {'metadata_fp': metadata_fp, 'status': 'failed', 'seconds': 0.,
+            'rows': '', 'columns': '',
+            'error': '%s: %s' % (type(error).__name__, str(error).replace('\n', ' '))}
+
+
+def clean_metadata_file_alone(metadata_fp, output_fp, cleaning_args, categorical_ratio=None,
+                              input_format=None, reader=None):
+    """
+    Clean one metadata file in a process of its own, so that the file
+    whose cleaning kills its process can be told apart from the others.
+
+    Parameters
+    ----------
+    (same as clean_metadata_file())
+
+    Returns
+    -------
+    status : dict
+        Status of the cleaning for the summary.
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(clean_metadata_file, metadata_fp, output_fp, cleaning_args,
+                                 categorical_ratio, input_format, reader)
+        try:
+            return future.result()
+        except Exception as e:
+            return get_failed_status(metadata_fp, e)
+
+
+def clean_metadata_files(metadata_fps, output_fps, cleaning_args, jobs,
+                         categorical_ratio=None, input_format=None, reader=None):
+    """
+    Clean metadata files on a pool of processes, with at most one file
+    per process at a time. If a process dies (e.g. killed when out of
+    memory), the pool is broken: the files that were being cleaned are
+    cleaned again each in a process of its own, to fail only the file
+    that kills its process, and the other files go on in a new pool.
+
+    Parameters
+    ----------
+    metadata_fps : list
+        Paths to the metadata files (in the scheduling order).
+
+    output_fps : dict
+        Path to the output metadata file of each metadata file.
+
+    cleaning_args : dict
+        Keyword arguments of metadata_clean() that are common
+        to all the files of the batch (rules, flags, plan, ...).
+
+    jobs : int
+        Number of worker processes.
+
+    categorical_ratio : float
+        Passed to parse_metadata_file().
+
+    input_format : str
+        Passed to parse_metadata_file().
+
+    reader : str
+        Passed to parse_metadata_file().
+
+    Returns
+    -------
+    statuses : list
+        Status of the cleaning of each metadata file (in completion order).
+    """
+    statuses = []
+    pending = list(metadata_fps)[::-1]
+    while pending:
+        broken = []
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {}
+            while pending or futures:
+                while pending and len(futures) < jobs and not broken:
+                    metadata_fp = pending.pop()
+                    futures[executor.submit(
+                        clean_metadata_file, metadata_fp, output_fps[metadata_fp],
+                        cleaning_args, categorical_ratio, input_format, reader)] = metadata_fp
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    metadata_fp = futures.pop(future)
+                    try:
+                        statuses.append(future.result())
+                    except BrokenProcessPool as e:
+                        broken.append((metadata_fp, e))
+                    except Exception as e:
+                        statuses.append(get_failed_status(metadata_fp, e))
+        if len(broken) == 1:
+            statuses.append(get_failed_status(*broken[0]))
+        else:
+            for metadata_fp, _ in broken:
+                statuses.append(clean_metadata_file_alone(
+                    metadata_fp, output_fps[metadata_fp], cleaning_args,
+                    categorical_ratio, input_format, reader))
+    return statuses
+
+
+def write_batch_summary(statuses, summary_fp):
+    """
+    Write the per-file status and timing of a batch.
+
+    Parameters
+    ----------
+    statuses : list
+        Status of the cleaning of each metadata file.
+
+    summary_fp : str
+        Path to the summary file.
+
+    Returns
+    -------
+    summary_fp : str
+        Path to the summary file.
+    """
+    summary_pd = pd.DataFrame(statuses, columns=['metadata_fp', 'status', 'seconds',
+                                                 'rows', 'columns', 'error'])
+    summary_pd.to_csv(summary_fp, index=False, sep='\t')
+    return summary_fp
+
+
+def run_batch(metadata_paths, cleaning_args, output_dir=None, jobs=1, summary_fp=None,
+              categorical_ratio=None, input_format=None, reader=None):
+    """
+    Clean many metadata files with the same rules on a pool of processes.
+
+    Parameters
+    ----------
+    metadata_paths : list
+        Metadata file paths, glob patterns or folders.
+
+    cleaning_args : dict
+        Keyword arguments of metadata_clean() that are common
+        to all the files of the batch (rules, flags, plan, ...).
+
+    output_dir : str
+        Folder where to write the outputs
+        (next to each metadata file if None).
+
+    jobs : int
+        Number of worker processes.
+
+    summary_fp : str
+        Path to the summary file (Default: 'metadata_cleaning_batch.tsv'
+        in the output folder or in the current folder).
+
+    categorical_ratio : float
+        Passed to parse_metadata_file().
+
+    input_format : str
+        Passed to parse_metadata_file().
+
+    reader : str
+        Passed to parse_metadata_file().
+
+    Returns
+    -------
+    statuses : list
+        Status of the cleaning of each metadata file.
+    """
+    metadata_fps = get_batch_metadata_fps(metadata_paths)
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    output_fps = get_batch_output_fps(metadata_fps, output_dir)
+    for output_fp in output_fps.values():
+        if output_fp and not os.path.isdir(os.path.dirname(output_fp)):
+            os.makedirs(os.path.dirname(output_fp))
+
+    statuses = []
+    if jobs > 1 and len(metadata_fps) > 1:
+        statuses = clean_metadata_files(metadata_fps, output_fps, cleaning_args, jobs,
+                                        categorical_ratio, input_format, reader)
+        # report in the scheduling order
+        order = dict((fp, fdx) for fdx, fp in enumerate(metadata_fps))
+        statuses = sorted(statuses, key=lambda x: order[x['metadata_fp']])
+    else:
+        for metadata_fp in metadata_fps:
+            statuses.append(clean_metadata_file(
+                metadata_fp, output_fps[metadata_fp], cleaning_args,
+                categorical_ratio, input_format, reader))
+
+    if not summary_fp:
+        summary_fp = os.path.join(output_dir if output_dir else '.', 'metadata_cleaning_batch.tsv')
+    write_batch_summary(statuses, summary_fp)
+
+    failed = sum(1 for status in statuses if status['status'] != 'done')
+    print('\n%s metadata file(s) cleaned, %s failed (summary: %s)' % (
+        len(statuses) - failed, failed, summary_fp))
+    return statuses
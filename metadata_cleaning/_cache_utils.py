@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import pickle
+import hashlib
+
+# version of the cached results (a new version ignores the previous entries)
+CACHE_VERSION = 4
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'metadata_cleaning')
+CACHE_SIZE_MB = 1024
+
+
+def get_column_content_hash(input_col):
+    """
+    Hash the raw content of a metadata column: its name, dtype and values.
+
+    Parameters
+    ----------
+    input_col : pd.Series
+        Column as read from the metadata file.
+
+    Returns
+    -------
+    str
+        Hexadecimal hash.
+    """
+    import pandas as pd
+
+    content = hashlib.sha256(repr((input_col.name, str(input_col.dtype))).encode('utf-8'))
+    content.update(pd.util.hash_pandas_object(input_col, index=False).to_numpy().tobytes())
+    return content.hexdigest()
+
+
+def get_column_rules(name_col, rules, no_booleans, no_nans, no_per_column,
+                     no_time_format, nan_value, plan):
+    """
+    Get the rules that apply to a metadata column in the steps that only
+    depend on its content ("nans", "booleans", "time_format", "per_column").
+
+    Parameters
+    ----------
+    name_col : str
+        Name of the column.
+
+    rules : dict
+        All rules (as read from the yaml file).
+
+    no_booleans, no_nans, no_per_column, no_time_format : bool
+        Booleans to not apply these rules (see metadata_clean()).
+
+    nan_value : str
+        Value to use for replacement for NaN / declared as such.
+
+    plan : RulePlan
+        Compiled rules.
+
+    Returns
+    -------
+    column_rules : list
+        (rule, content) of each rule applying to the column, in order.
+    """
+    column_rules = [('version', CACHE_VERSION), ('na_value', nan_value)]
+    for rule, no_rule in [('nans', no_nans), ('booleans', no_booleans)]:
+        if rule in rules and not no_rule:
+            column_rules.append((rule, rules[rule]))
+    if 'time_format' in rules and not no_time_format \
+            and name_col in rules['time_format'].get('columns', []):
+        column_rules.append(('time_format', sorted(
+            (x, y) for x, y in rules['time_format'].items() if x != 'columns')))
+    if 'per_column' in rules and not no_per_column:
+        lower_col = str(name_col).lower()
+        for name_rule in plan.per_column:
+            if str(name_rule).lower() in lower_col:
+                column_rules.append(('per_column', name_rule, rules['per_column'][name_rule]))
+    return column_rules
+
+
+def get_column_rules_hash(column_rules):
+    """
+    Hash the rules that apply to a metadata column.
+
+    Parameters
+    ----------
+    column_rules : list
+        Rules applying to the column (from get_column_rules()).
+
+    Returns
+    -------
+    str
+        Hexadecimal hash.
+    """
+    return hashlib.sha256(repr(column_rules).encode('utf-8')).hexdigest()
+
+
+class ColumnCache(object):
+    """
+    On-disk cache of the metadata columns cleaned by the steps that only
+    depend on their content, so that cleaning again a metadata table after
+    editing e.g. one rule only cleans the columns concerned by this rule.
+
+    Each entry is addressed by the hash of the raw content of a column and
+    the hash of the rules that apply to it, and holds the cleaned column and
+    the values it decided as NaN. The least recently used entries are removed
+    when the cache exceeds its size.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Folder of the cache (Default: '~/.cache/metadata_cleaning').
+
+    max_size_mb : float
+        Maximum size of the cache, in MB.
+
+    Attributes
+    ----------
+    hits : int
+        Number of columns read from the cache.
+
+    misses : int
+        Number of columns not in the cache.
+    """
+    def __init__(self, cache_dir=None, max_size_mb=CACHE_SIZE_MB):
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.max_size = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+
+    def get_fp(self, key):
+        """
+        Get the path to a cache entry.
+        """
+        return os.path.join(self.cache_dir, '%s.pkl' % key)
+
+    def get(self, key):
+        """
+        Get a cleaned column (and mark it as recently used).
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry.
+
+        Returns
+        -------
+        entry : dict
+            'column' (pd.Series) and 'nan_decisions' (dict), None if absent.
+        """
+        entry_fp = self.get_fp(key)
+        try:
+            with open(entry_fp, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(entry_fp)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, output_col, nan_decisions):
+        """
+        Store a cleaned column.
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry.
+
+        output_col : pd.Series
+            Cleaned column.
+
+        nan_decisions : dict
+            Values decided as NaN while cleaning the column.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_fp = self.get_fp(key)
+        # write then move, not to leave a partial entry (e.g. for parallel cleanings)
+        tmp_fp = '%s.%s.tmp' % (entry_fp, os.getpid())
+        with open(tmp_fp, 'wb') as o:
+            pickle.dump({'column': output_col, 'nan_decisions': nan_decisions}, o,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_fp, entry_fp)
+
+    def evict(self):
+        """
+        Remove the least recently used entries until
+        the cache is not larger than its maximum size.
+
+        Returns
+        -------
+        removed : int
+            Number of entries removed.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(x[1] for x in entries)
+        removed = 0
+        for _, entry_size, entry_fp in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(entry_fp)
+            except OSError:
+                continue
+            size -= entry_size
+            removed += 1
+        return removed
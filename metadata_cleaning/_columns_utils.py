@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import numpy as np
+
+
+class ColumnIndex(object):
+    """
+    Lookup structure for the columns of a metadata table, built once
+    per table and shared by the cleaning stages that resolve the rules
+    names (e.g. 'age') into actual columns (e.g. 'AGE_CORR').
+
+    Parameters
+    ----------
+    columns : list
+        Columns of the metadata table (in order).
+
+    Attributes
+    ----------
+    columns : list
+        Columns of the metadata table (in order).
+
+    exact : dict
+        key    -> column
+        value  -> position of the column
+
+    lower : dict
+        key    -> lowercase column name
+        value  -> columns with this lowercase name (in order)
+
+    cache : dict
+        key    -> lowercase rule name
+        value  -> columns whose lowercase name contains the rule name
+    """
+    def __init__(self, columns):
+        self.set_columns(columns)
+
+    def set_columns(self, columns):
+        """
+        (Re)build the lookup structures and clear the cached resolutions.
+
+        Parameters
+        ----------
+        columns : list
+            Columns of the metadata table (in order).
+        """
+        self.columns = list(columns)
+        self.exact = dict((col, cdx) for cdx, col in enumerate(self.columns))
+        self.lower = {}
+        for col in self.columns:
+            self.lower.setdefault(str(col).lower(), []).append(col)
+        # all the lowercase names in one text, to search the rule names at C speed
+        lowers = [str(col).lower() for col in self.columns]
+        self.text = '\n'.join(lowers)
+        self.starts = np.cumsum([0] + [len(x) + 1 for x in lowers[:-1]])
+        self.cache = {}
+
+    def __contains__(self, column):
+        return column in self.exact
+
+    def get_lower(self, name):
+        """
+        Get the columns that have the passed name, whatever the case.
+
+        Parameters
+        ----------
+        name : str
+            Name to look for, e.g. 'age'.
+
+        Returns
+        -------
+        list
+            Matching columns (in order), e.g. ['Age', 'AGE']
+        """
+        return list(self.lower.get(str(name).lower(), []))
+
+    def get_containing(self, name):
+        """
+        Get the columns whose name contains the passed name, whatever
+        the case (the results are cached per lowercase name).
+
+        Parameters
+        ----------
+        name : str
+            Name to look for, e.g. 'age'.
+
+        Returns
+        -------
+        columns_match : list
+            Matching columns (in order), e.g. ['age', 'AGE_CORR']
+        """
+        key = str(name).lower()
+        if key not in self.cache:
+            positions = []
+            if self.columns and '\n' not in key:
+                start = self.text.find(key)
+                while start != -1:
+                    position = int(np.searchsorted(self.starts, start, side='right')) - 1
+                    positions.append(position)
+                    # skip to the next column
+                    if position + 1 == len(self.columns):
+                        break
+                    start = self.text.find(key, self.starts[position + 1])
+            self.cache[key] = [self.columns[x] for x in positions]
+        return list(self.cache[key])
+
+    def delete(self, columns):
+        """
+        Remove columns from the index, which invalidates the cache.
+
+        Parameters
+        ----------
+        columns : list
+            Columns to remove.
+        """
+        columns = set(columns)
+        if columns & set(self.exact):
+            self.set_columns([x for x in self.columns if x not in columns])
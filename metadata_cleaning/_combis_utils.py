@@ -7,9 +7,13 @@
 # The full license is in the file LICENSE.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
-import re
+import numpy as np
 import pandas as pd
 
+from metadata_cleaning._misc_utils import get_range_bounds
+from metadata_cleaning._columns_utils import ColumnIndex
+from metadata_cleaning._df_utils import make_columns_frame
+
 
 def get_combinations_rule_details(combination, conditions):
     """
@@ -42,7 +46,7 @@ def get_combinations_rule_details(combination, conditions):
         if condition in [True, False]:
             cur_rules[column] = ('is', condition, None)
         elif condition.startswith('range('):
-            cur_range_xy = [float(x) if x != 'None' else None for x in re.split('\(|\)', condition)[1].split(',')]
+            cur_range_xy = get_range_bounds(condition)
             if cur_range_xy[0] == None:
                 cur_rules[column] = ('<', cur_range_xy[1], None)
             elif cur_range_xy[1] == None:
@@ -52,7 +56,7 @@ def get_combinations_rule_details(combination, conditions):
     return cur_rules
 
 
-def get_columns_from_combination(md, combination):
+def get_columns_from_combination(md, combination, column_index=None):
     """
     Get the metadata columns that match the given combination.
 
@@ -65,31 +69,80 @@ def get_columns_from_combination(md, combination):
         Columns to check for decision,
         e.g. ('age', 'alcohol_consumption')
 
+    column_index : ColumnIndex
+        Lookup structure of the metadata columns
+        (built here if None).
+
     Returns
     -------
     columns_match : dict
         key    -> item in combination
         value  -> list of columns that match
     """
-
+    if column_index is None:
+        column_index = ColumnIndex(md.columns)
     columns_match = {}
     for combi in combination:
-        for col in md.columns:
-            if combi.lower() in col.lower():
-                columns_match.setdefault(combi, []).append(col)
+        combi_columns = column_index.get_containing(combi)
+        if combi_columns:
+            columns_match[combi] = combi_columns
 
     return columns_match
 
 
-def apply_combination_rule_check(row, cur_rules, columns_match, nan_decisions):
+def get_rule_column_mask(md_col, cur_rule, col_nan_decisions):
     """
-    Check if the rule that is depending on >1 column applies.
+    Check if the rule applying to one column is met, for each row.
 
     Parameters
     ----------
-    row : pd.Series
-        Row of the dataframe reduced to the usefule columns
-        to check if the rule applies.
+    md_col : pd.Series
+        Column of the metadata matching the column of the rule.
+
+    cur_rule : tuple
+        Rule that has been prepared in get_combinations_rule_details()
+        e.g. ('<', 18, None) or ('is', True, None)
+
+    col_nan_decisions : set
+        Edits encountered so far in the column (from nan_decisions).
+
+    Returns
+    -------
+    mask : np.ndarray
+        Boolean array, True for the rows where the rule is met.
+    """
+    col_str = md_col.astype('str')
+    if cur_rule[0] == 'is':
+        if cur_rule[1]:
+            return col_str.isin(['True', 'Yes', '1']).to_numpy()
+        return col_str.isin(['False', 'No', '0']).to_numpy()
+
+    # only the (non-edited) entries made of digits can be compared to the range
+    comparable = col_str.str.isdigit().to_numpy(dtype=bool)
+    if col_nan_decisions:
+        comparable &= ~md_col.isin(list(col_nan_decisions)).to_numpy()
+    col_num = pd.to_numeric(col_str.where(comparable), errors='coerce').to_numpy()
+    with np.errstate(invalid='ignore'):
+        if cur_rule[0] == 'in':
+            in_range = (col_num >= cur_rule[1]) & (col_num <= cur_rule[2])
+        elif cur_rule[0] == '>':
+            in_range = col_num >= cur_rule[1]
+        elif cur_rule[0] == '<':
+            in_range = col_num <= cur_rule[1]
+        else:
+            in_range = np.zeros(col_num.size, dtype=bool)
+    return comparable & in_range
+
+
+def get_combination_mask(md, cur_rules, columns_match, nan_decisions):
+    """
+    Check if the rule that is depending on >1 column applies,
+    for all the rows at once.
+
+    Parameters
+    ----------
+    md : pd.DataFrame
+        Metadata with columns to clean.
 
     cur_rules : dict
         Multi-columns rule that has been prepared in
@@ -103,53 +156,59 @@ def apply_combination_rule_check(row, cur_rules, columns_match, nan_decisions):
         to the current rule.
 
     nan_decisions : dict
-        Dict to update with the encountered edits.
+        Dict of the encountered edits.
 
     Returns
     -------
-    md : pd.DataFrame
-        Metadata with cleaned columns.
+    mask : np.ndarray
+        Boolean array, True for the rows where all the rules apply.
     """
-    rule_applies = 0
+    mask = np.ones(md.shape[0], dtype=bool)
     # for each column used for the combination rule (col_rule)
     # and each rule that applies to this paticular column (cur_rule)
     for col_rule, cur_rule in cur_rules.items():
-        # for each source metadata column
+        # the condition is met if met in any of the source metadata columns...
+        col_rule_mask = np.zeros(md.shape[0], dtype=bool)
         for md_col in columns_match[col_rule]:
-            # first go into the "type of comparison" condition
-            # ... then into the actual comparison
-            if cur_rule[0] == 'is':
-                if cur_rule[1] and str(row[md_col]) in ['True', 'Yes', '1']:
-                    break
-                if not cur_rule[1] and str(row[md_col]) in ['False', 'No', '0']:
-                    break
-            elif cur_rule[0] == 'in':
-                if row[md_col] in nan_decisions[md_col] or not str(row[md_col]).isdigit():
-                    continue
-                if row[md_col] >= cur_rule[1] and row[md_col] <= cur_rule[2]:
-                    break
-            elif cur_rule[0] == '>':
-                if row[md_col] in nan_decisions[md_col] or not str(row[md_col]).isdigit():
-                    continue
-                if row[md_col] >= cur_rule[1]:
-                    break
-            elif cur_rule[0] == '<':
-                if row[md_col] in nan_decisions[md_col] or not str(row[md_col]).isdigit():
-                    continue
-                if row[md_col] <= cur_rule[2]:
-                    break
-        else:
-            # if the condition is never met then the
-            # below "rule_applies" is not incremented
-            continue
-        rule_applies += 1
-    # return if number of met rules equals the number of rules
-    if rule_applies == len(cur_rules.keys()):
-        return True
-    return False
+            col_rule_mask |= get_rule_column_mask(
+                md[md_col], cur_rule, nan_decisions.get(md_col, set()))
+        # ... and all the conditions must be met
+        mask &= col_rule_mask
+    return mask
+
+
+def get_decision(conditions_decision, nan_value):
+    """
+    Get the column to edit and the value to write
+    if the conditions of a combination are satisfied.
+
+    Parameters
+    ----------
+    conditions_decision : list
+        [0] tuple  : Index-wise values of the combinations items
+        [1] dict   : Edits to apply if conditions satisfied.
+        e.g. [('range(0,4)', True), {'alcohol_consumption': 'Missing'}]
 
+    nan_value : str
+        Value to use for replacement for NaN / declared as such.
+
+    Returns
+    -------
+    decision_key : str
+        Name of the column to edit, e.g. 'alcohol_consumption'.
 
-def make_combinations_cleaning(md, combination, conditions_decision, nan_decisions, nan_value):
+    decision_value : str
+        Value to write, e.g. 'Missing' (nan_value if not given).
+    """
+    # decision   -->  {'alcohol_consumption': 'Missing'}
+    decision = conditions_decision[1]
+    if isinstance(decision, dict):
+        return [(x, y) for x, y in decision.items()][0]
+    return decision, nan_value
+
+
+def make_combinations_cleaning(md, combination, conditions_decision, nan_decisions, nan_value, cur_rules=None,
+                               column_index=None):
     """
     Change column(s) based on the combination
     of factors in multiple columns.
@@ -168,47 +227,52 @@ def make_combinations_cleaning(md, combination, conditions_decision, nan_decisio
         [1] dict   : Edits to apply if conditions satisfied.
         e.g. [('range(0,4)', True), {'alcohol_consumption': 'Missing'}]
 
+    nan_decisions : dict
+        Dict of the encountered edits.
+
     nan_value : str
         Value to use for replacement for NaN / declared as such.
 
+    cur_rules : dict
+        Rule already parsed by get_combinations_rule_details()
+        (e.g. from a RulePlan), parsed here if None.
+
+    column_index : ColumnIndex
+        Lookup structure of the metadata columns
+        (built here if None).
+
     Returns
     -------
     md : pd.DataFrame
         Metadata with cleaned columns.
     """
     show = 0
-    columns_match = get_columns_from_combination(md, combination)
+    if column_index is None:
+        column_index = ColumnIndex(md.columns)
+    columns_match = get_columns_from_combination(md, combination, column_index)
     if len(columns_match) == len(combination):
 
-        conditions, decision = conditions_decision
+        conditions = conditions_decision[0]
         # conditions -->  ('range(0,4)', True)
-        # decision   -->  {'alcohol_consumption': 'Missing'}
-        if isinstance(decision, dict):
-            decision_key, decision_value = [(x, y) for x, y in decision.items()][0]
-        else:
-            decision_key, decision_value = decision, nan_value
+        decision_key, decision_value = get_decision(conditions_decision, nan_value)
 
         # get the column name and dataframe's column that may be edited
-        decision_col = list(set([x for x in md.columns if decision_key.lower() in x.lower()]))[0]
-        output_copy = md[decision_col].tolist()
-
-        # parse the rules and prepare an encoding for the actual row-wise filterinf
-        cur_rules = get_combinations_rule_details(combination, conditions)
-
-        # get all the unique metadata columns that will serve for the rule
-        all_columns_match = list(set([y for columns in columns_match.values() for y in columns]))
-
-        for rdx, (r, row) in enumerate(md[all_columns_match].iterrows()):
-            # check if the combinations of the columns contents match the rule from the yaml file
-            rule_applies = apply_combination_rule_check(row, cur_rules,
-                                                        columns_match,
-                                                        nan_decisions)
-
-            # if yes -> edit the current entry of the current decision column
-            if rule_applies:
-                output_copy[rdx] = decision_value
-
-        # put the edited column as a replacement in the dataframe
-        md[decision_col] = output_copy
+        decision_col = column_index.get_containing(decision_key)[0]
+
+        # parse the rules and prepare an encoding for the actual column-wise filtering
+        if cur_rules is None:
+            cur_rules = get_combinations_rule_details(combination, conditions)
+
+        # check if the combinations of the columns contents match the rule from the yaml file
+        rule_applies = get_combination_mask(md, cur_rules, columns_match, nan_decisions)
+
+        # if yes -> edit the matching entries of the current decision column
+        if rule_applies.any():
+            decision_series = md[decision_col]
+            if str(decision_series.dtype) == 'category' and not pd.isnull(decision_value) \
+                    and decision_value not in decision_series.cat.categories:
+                decision_series = decision_series.cat.add_categories([decision_value])
+            md = make_columns_frame(md, {decision_col: decision_series.mask(
+                rule_applies, decision_value)})
 
     return md
\ No newline at end of file
@@ -7,9 +7,31 @@
 # The full license is in the file LICENSE.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 import os
+import csv
+import gzip
+import pickle
+from io import StringIO
+import numpy as np
 import pandas as pd
 import getpass
 
+# default missing values of the pandas reader (pd.read_csv)
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+             '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null']
+
+# formats of the metadata tables read/written through Apache Arrow (pyarrow)
+ARROW_FORMATS = {'.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather'}
+
+# extensions of the compressed tsv outputs
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+# placeholder written for the missing values when formatting the tsv outputs
+NA_SENTINEL = '\x1f'
+
+# number of cells formatted at once when writing the tsv outputs
+# (the text of a block is held in memory once per output file)
+WRITE_BLOCK_CELLS = 1000000
+
 
 def validate_fp(fp):
     """
@@ -38,7 +60,96 @@ def validate_pd(metadata_fp, metadata_pd):
         )
 
 
-def read_input_metadata(file_path, is_excel=False, as_str=None):
+def get_table_format(file_path, table_format=None):
+    """
+    Get the format of a metadata table.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the metadata file.
+
+    table_format : str
+        Format passed by the user, if any
+        ('tsv', 'excel', 'parquet' or 'feather').
+
+    Returns
+    -------
+    table_format : str
+        The passed format or otherwise the format
+        given by the extension of the file ('tsv' by default).
+    """
+    if table_format:
+        return table_format
+    extension = os.path.splitext(file_path)[1].lower()
+    if 'xls' in extension:
+        return 'excel'
+    return ARROW_FORMATS.get(extension, 'tsv')
+
+
+def read_arrow_csv(file_path, as_str=None, usecols=None):
+    """
+    Read a tab-separated metadata file with the multithreaded
+    Arrow CSV reader (pyarrow), to get the same table as pandas.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the metadata file.
+
+    as_str : list
+        Metadata columns to read as strings (e.g. the samples IDs).
+
+    usecols : list
+        Columns to read (all if None).
+
+    Returns
+    -------
+    md_pd : pd.DataFrame
+        Metadata table in pandas dataframe format.
+    """
+    import pyarrow as pa
+    from pyarrow import csv
+
+    read_options = csv.ReadOptions(use_threads=True)
+    parse_options = csv.ParseOptions(delimiter='\t')
+    # same missing values and booleans as the pandas reader
+    convert_options = dict(
+        null_values=NA_VALUES, strings_can_be_null=True,
+        true_values=['True', 'TRUE', 'true'], false_values=['False', 'FALSE', 'false'],
+        column_types=dict((x, pa.string()) for x in as_str), include_columns=usecols)
+    # the pandas reader does not parse the dates and times: keep the
+    # columns typed so from the first block of the file as text
+    with csv.open_csv(file_path, read_options, parse_options,
+                      csv.ConvertOptions(**convert_options)) as reader:
+        convert_options['column_types'].update(
+            (field.name, pa.string()) for field in reader.schema
+            if pa.types.is_temporal(field.type))
+    table = csv.read_csv(file_path, read_options, parse_options,
+                         csv.ConvertOptions(**convert_options))
+    columns = dict(zip(table.column_names, table.columns))
+    # ... and read again the few columns whose dates only come after this block
+    temporal = [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+    if temporal:
+        convert_options.update(column_types=dict((x, pa.string()) for x in temporal),
+                               include_columns=temporal)
+        columns.update(zip(temporal, csv.read_csv(file_path, read_options, parse_options,
+                                                  csv.ConvertOptions(**convert_options)).columns))
+    for col, column in columns.items():
+        if pa.types.is_null(column.type):
+            # empty columns are numeric for pandas
+            columns[col] = np.full(table.num_rows, np.nan)
+            continue
+        values = column.to_pandas()
+        if column.null_count and str(values.dtype) == 'object':
+            # the missing strings or booleans are NaN (not None) for pandas
+            values = values.fillna(np.nan)
+        columns[col] = values.to_numpy()
+    md_pd = pd.DataFrame(columns, columns=table.column_names)
+    return md_pd
+
+
+def read_input_metadata(file_path, is_excel=False, as_str=None, usecols=None, reader=None):
     """
     Read metadata file.
 
@@ -53,6 +164,13 @@ def read_input_metadata(file_path, is_excel=False, as_str=None):
     as_str : list
         Metadata columns containing samples IDs.
 
+    usecols : list
+        Columns to read (all if None).
+
+    reader : str
+        'arrow' to read a tab-separated file with the
+        multithreaded Arrow CSV reader (Default: pandas).
+
     Returns
     -------
     md_pd : pd.DataFrame
@@ -65,14 +183,151 @@ def read_input_metadata(file_path, is_excel=False, as_str=None):
 
     if is_excel:
         md_pd = pd.read_excel(file_path, header=0,
-                              sep='\t', dtype=as_str_d)
+                              sep='\t', dtype=as_str_d, usecols=usecols)
+    elif reader == 'arrow':
+        md_pd = read_arrow_csv(file_path, list(as_str_d), usecols)
     else:
         md_pd = pd.read_csv(file_path, header=0,
-                            sep='\t', dtype=as_str_d)
+                            sep='\t', dtype=as_str_d, usecols=usecols)
     return md_pd
 
 
-def parse_metadata_file(metadata_fp, sample_id_cols):
+def read_arrow_metadata(file_path, table_format, as_str=None, usecols=None):
+    """
+    Read a parquet or feather metadata file (the columns
+    are decoded on multiple threads by pyarrow).
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the metadata file.
+
+    table_format : str
+        'parquet' or 'feather'.
+
+    as_str : list
+        Metadata columns containing samples IDs.
+
+    usecols : list
+        Columns to read (all if None).
+
+    Returns
+    -------
+    md_pd : pd.DataFrame
+        Metadata table in pandas dataframe format.
+    """
+    if table_format == 'parquet':
+        md_pd = pd.read_parquet(file_path, columns=usecols, use_threads=True)
+    else:
+        md_pd = pd.read_feather(file_path, columns=usecols, use_threads=True)
+    if not as_str:
+        as_str = ['#SampleID', 'sample_name']
+    # as for the tab-separated files, the sample IDs are strings (or NaN)
+    for col in as_str:
+        if col in md_pd.columns and str(md_pd[col].dtype) != 'object':
+            md_pd[col] = md_pd[col].astype('str').where(md_pd[col].notna())
+    return md_pd
+
+
+def make_columns_frame(metadata_pd, new_columns=None, columns=None):
+    """
+    Make a metadata table from the columns of another, some of them
+    replaced and/or selected, without copying any column: each column
+    keeps its own array (shared with the other table if not replaced).
+
+    This is used instead of "metadata_pd[col] = new_col" to replace the
+    columns edited by a cleaning step, as pandas copies the new column
+    and the other columns of the same dtype (block) at each assignment.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Metadata table.
+
+    new_columns : dict
+        key    -> column name
+        value  -> new column (pd.Series on the same index, or array)
+
+    columns : list
+        Columns to keep, in this order (Default: all).
+
+    Returns
+    -------
+    metadata_pd : pd.DataFrame
+        Metadata table (the same if there is nothing to replace or select).
+    """
+    if not new_columns and columns is None:
+        return metadata_pd
+    if new_columns is None:
+        new_columns = {}
+    if columns is None:
+        positions = np.arange(metadata_pd.shape[1])
+    else:
+        positions = metadata_pd.columns.get_indexer(columns)
+    names = metadata_pd.columns[positions]
+    arrays = {}
+    for cdx, (pos, col) in enumerate(zip(positions, names)):
+        column = new_columns[col] if col in new_columns else metadata_pd.iloc[:, pos]
+        arrays[cdx] = getattr(column, 'array', column)
+    # no copy, which also means no consolidation into blocks of the same dtype
+    columns_pd = pd.DataFrame(arrays, index=metadata_pd.index, copy=False)
+    columns_pd.columns = names
+    return columns_pd
+
+
+def make_categorical_columns(metadata_pd, sample_id_cols, categorical_ratio):
+    """
+    Convert the columns of strings that have few distinct
+    values (e.g. 'sex', 'country') into categorical columns.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Metadata data frame.
+
+    sample_id_cols : list
+        Names of the columns containing the sample IDs
+
+    categorical_ratio : float
+        Maximum ratio of the number of distinct values to the
+        number of rows for a column to be made categorical.
+
+    Returns
+    -------
+    metadata_pd : pd.DataFrame
+        Metadata data frame.
+    """
+    max_distinct = categorical_ratio * metadata_pd.shape[0]
+    new_columns = {}
+    for col in metadata_pd.columns:
+        if col in sample_id_cols or str(metadata_pd[col].dtype) != 'object':
+            continue
+        if metadata_pd[col].nunique(dropna=False) <= max_distinct:
+            new_columns[col] = metadata_pd[col].astype('category')
+    return make_columns_frame(metadata_pd, new_columns)
+
+
+def make_object_columns(metadata_pd):
+    """
+    Convert the categorical columns back into columns of objects.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Metadata data frame.
+
+    Returns
+    -------
+    metadata_pd : pd.DataFrame
+        Metadata data frame.
+    """
+    new_columns = dict((col, metadata_pd[col].astype('object')) for col in metadata_pd.columns
+                       if str(metadata_pd[col].dtype) == 'category')
+    return make_columns_frame(metadata_pd, new_columns)
+
+
+def parse_metadata_file(metadata_fp, sample_id_cols, categorical_ratio=None,
+                        table_format=None, usecols=None, reader=None):
     """
     Read the metadata input file.
 
@@ -82,8 +337,25 @@ def parse_metadata_file(metadata_fp, sample_id_cols):
         Names of the columns containing the sample IDs
 
     metadata_fp : str
-        File path for the metadata file
-        if either excel of tab-separated format.
+        File path for the metadata file if either excel,
+        tab-separated, parquet or feather format.
+
+    categorical_ratio : float
+        If set, the columns of strings with a ratio of the number of
+        distinct values to the number of rows below this threshold
+        are read as categorical, so that the cleaning rules apply
+        on their distinct values rather than on their rows.
+
+    table_format : str
+        'tsv', 'excel', 'parquet' or 'feather'
+        (Default: given by the file extension).
+
+    usecols : list
+        Columns to read (all if None).
+
+    reader : str
+        'arrow' to read a tab-separated file with the
+        multithreaded Arrow CSV reader (Default: pandas).
 
     Returns
     -------
@@ -91,15 +363,603 @@ def parse_metadata_file(metadata_fp, sample_id_cols):
         Metadata data frame.
     """
     metadata_fp = validate_fp(metadata_fp)
-    if 'xls' in os.path.splitext(metadata_fp)[1]:
-        metadata_pd = read_input_metadata(metadata_fp, True, sample_id_cols)
+    table_format = get_table_format(metadata_fp, table_format)
+    if table_format in ARROW_FORMATS.values():
+        metadata_pd = read_arrow_metadata(metadata_fp, table_format, sample_id_cols, usecols)
     else:
-        metadata_pd = read_input_metadata(metadata_fp, False, sample_id_cols)
+        metadata_pd = read_input_metadata(metadata_fp, table_format == 'excel',
+                                          sample_id_cols, usecols, reader)
     validate_pd(metadata_fp, metadata_pd)
+    if categorical_ratio:
+        metadata_pd = make_categorical_columns(metadata_pd, sample_id_cols, categorical_ratio)
     return metadata_pd
 
 
-def write_clean_metadata(metadata_pd, metadata_fp, output_fp):
+def get_read_kinds(metadata_pd):
+    """
+    Get the kinds of values that a chunk of the metadata table was read
+    with, for each column: 'int', 'float', 'bool', 'str' (any other text)
+    and 'nan' (missing values).
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Chunk of the metadata table (as read by pd.read_csv()).
+
+    Returns
+    -------
+    read_kinds : dict
+        key    -> column
+        value  -> set of the kinds of values of the column
+    """
+    read_kinds = {}
+    for col in metadata_pd.columns:
+        cur_col = metadata_pd[col]
+        kinds = {'nan'} if cur_col.isna().any() else set()
+        dtype = str(cur_col.dtype)
+        if dtype == 'bool':
+            kinds.add('bool')
+        elif dtype.startswith('int'):
+            kinds.add('int')
+        elif dtype.startswith('float'):
+            if cur_col.notna().any():
+                kinds.add('float')
+        elif pd.api.types.infer_dtype(cur_col, skipna=True) == 'boolean':
+            kinds.add('bool')
+        elif cur_col.notna().any():
+            kinds.add('str')
+        read_kinds[col] = kinds
+    return read_kinds
+
+
+def merge_read_kinds(read_kinds, chunk_read_kinds):
+    """
+    Merge the kinds of values that a chunk of the metadata table was
+    read with into those of the previous chunks.
+
+    Parameters
+    ----------
+    read_kinds : dict
+        Kinds of values of the previous chunks (updated here).
+
+    chunk_read_kinds : dict
+        Kinds of values of the current chunk (see get_read_kinds()).
+
+    Returns
+    -------
+    read_kinds : dict
+        Merged kinds of values.
+    """
+    for col, kinds in chunk_read_kinds.items():
+        read_kinds.setdefault(col, set()).update(kinds)
+    return read_kinds
+
+
+def get_read_dtypes(read_kinds):
+    """
+    Get the dtypes that the entire metadata table would be read with by
+    pd.read_csv(), from the kinds of values of all its chunks, so that
+    each chunk is read as a part of the entire table (e.g. a column of
+    integers is read as float in all the chunks if one chunk has blanks).
+
+    Parameters
+    ----------
+    read_kinds : dict
+        Kinds of values of all the chunks (see get_read_kinds()).
+
+    Returns
+    -------
+    read_dtypes : dict
+        key    -> column
+        value  -> 'str', 'float64', 'int64', 'bool' or 'object'
+                  (booleans with missing values, read as is and
+                  then made objects, as pd.read_csv() does)
+    """
+    read_dtypes = {}
+    for col, kinds in read_kinds.items():
+        if 'str' in kinds or ('bool' in kinds and kinds & {'int', 'float'}):
+            read_dtypes[col] = 'str'
+        elif 'bool' in kinds:
+            read_dtypes[col] = 'object' if 'nan' in kinds else 'bool'
+        elif kinds == {'int'}:
+            read_dtypes[col] = 'int64'
+        else:
+            read_dtypes[col] = 'float64'
+    return read_dtypes
+
+
+def read_metadata_chunks(metadata_fp, sample_id_cols, chunksize, usecols=None, read_dtypes=None):
+    """
+    Read the metadata input file by chunks of rows.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        File path for the metadata file (tab-separated format).
+
+    sample_id_cols : list
+        Names of the columns containing the sample IDs
+
+    chunksize : int
+        Number of rows per chunk.
+
+    usecols : list or callable
+        Columns to read (all if None).
+
+    read_dtypes : dict
+        Dtypes of the columns of the entire table (see get_read_dtypes()),
+        for all the chunks to be read with the same dtypes (Default: the
+        dtypes of each chunk are inferred from its own rows).
+
+    Yields
+    ------
+    md_pd : pd.DataFrame
+        Chunk of the metadata table.
+    """
+    metadata_fp = validate_fp(metadata_fp)
+    table_format = get_table_format(metadata_fp)
+    if table_format != 'tsv':
+        raise ValueError(
+            "{} metadata file {} cannot be read by chunks.".format(
+                table_format.capitalize(), metadata_fp)
+        )
+    if sample_id_cols:
+        as_str_d = dict((x, 'str') for x in sample_id_cols)
+    else:
+        as_str_d = {'#SampleID': 'str', 'sample_name': 'str'}
+    read_dtypes = read_dtypes or {}
+    dtypes = dict((col, dtype) for col, dtype in read_dtypes.items() if dtype != 'object')
+    dtypes.update(as_str_d)
+    object_cols = [col for col, dtype in read_dtypes.items() if dtype == 'object' and col not in as_str_d]
+    md_chunks = pd.read_csv(metadata_fp, header=0, sep='\t', dtype=dtypes,
+                            usecols=usecols, chunksize=chunksize)
+    for cdx, md_pd in enumerate(md_chunks):
+        if not cdx and chunksize > 1 and usecols is None:
+            validate_pd(metadata_fp, md_pd)
+        for col in object_cols:
+            if col in md_pd.columns:
+                md_pd[col] = md_pd[col].astype(object)
+        # each chunk is cleaned as a table of its own
+        yield md_pd.reset_index(drop=True)
+
+
+def spill_chunk(chunk, spill):
+    """
+    Keep a chunk of the metadata table aside in a temporary file,
+    to be read back with read_spilled_chunks().
+
+    Parameters
+    ----------
+    chunk : pd.DataFrame
+        Chunk of the metadata table.
+
+    spill : file object
+        Temporary file opened in binary mode (e.g. tempfile.TemporaryFile()).
+    """
+    pickle.dump(chunk, spill, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_spilled_chunks(spill):
+    """
+    Read back the chunks kept aside with spill_chunk(), in order.
+
+    Parameters
+    ----------
+    spill : file object
+        Temporary file the chunks were spilled to.
+
+    Yields
+    ------
+    chunk : pd.DataFrame
+        Chunk of the metadata table.
+    """
+    spill.seek(0)
+    while True:
+        try:
+            chunk = pickle.load(spill)
+        except EOFError:
+            return
+        yield chunk
+
+
+def get_output_extension(table_format=None, compression=None):
+    """
+    Get the extension of the output files.
+
+    Parameters
+    ----------
+    table_format : str
+        'tsv', 'parquet' or 'feather' (Default: 'tsv').
+
+    compression : str
+        'gzip' or 'zstd' (Default: no compression).
+        Only the tsv files get a compression extension,
+        parquet and feather files are compressed internally.
+
+    Returns
+    -------
+    str
+        Extension of the output files, e.g. '.tsv' or '.tsv.gz'
+    """
+    if table_format in ARROW_FORMATS.values():
+        return '.%s' % table_format
+    return '.tsv%s' % COMPRESSION_EXTENSIONS.get(compression, '')
+
+
+def get_compressed_fp(output_fp, table_format=None, compression=None):
+    """
+    Get the path to a tsv output file with the extension of its compression.
+
+    Parameters
+    ----------
+    output_fp : str
+        Path to the output metadata file, e.g. 'clean.tsv'.
+
+    table_format : str
+        'tsv', 'parquet' or 'feather'
+        (Default: given by the file extension).
+
+    compression : str
+        'gzip' or 'zstd' (Default: no compression).
+
+    Returns
+    -------
+    output_fp : str
+        Path to the output metadata file, e.g. 'clean.tsv.gz'.
+    """
+    extension = COMPRESSION_EXTENSIONS.get(compression, '')
+    if extension and not output_fp.endswith(extension) and get_table_format(
+            output_fp, table_format) == 'tsv':
+        output_fp = '%s%s' % (output_fp, extension)
+    return output_fp
+
+
+def get_clean_metadata_fp(metadata_fp, output_fp, table_format=None, compression=None):
+    """
+    Get the path to the clean metadata file.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the original metadata file.
+
+    output_fp : str
+        Path to the output metadata file.
+
+    table_format : str
+        Format of the output ('tsv', 'parquet' or 'feather')
+        used for the extension of the default file name.
+
+    compression : str
+        Compression of the tsv output ('gzip' or 'zstd').
+
+    Returns
+    -------
+    output_fp : str
+        Path to the output metadata file.
+    """
+    extension = get_output_extension(table_format, compression)
+    if not output_fp:
+        output_fp = '%s_clean%s' % (os.path.splitext(metadata_fp)[0], extension)
+    elif '.' not in os.path.basename(output_fp) or len(output_fp.split('.')[-1])>15:
+        output_fp = '%s_clean%s' % (output_fp, extension)
+    return get_compressed_fp(output_fp, table_format, compression)
+
+
+def get_clean_metadata_user_fp(metadata_fp, output_fp, table_format=None, compression=None):
+    """
+    Get the path to the clean metadata file with user-specified NaN encoding.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the original metadata file.
+
+    output_fp : str
+        Path to the output metadata file.
+
+    table_format : str
+        Format of the output ('tsv', 'parquet' or 'feather')
+        used for the extension of the default file name.
+
+    compression : str
+        Compression of the tsv output ('gzip' or 'zstd').
+
+    Returns
+    -------
+    output_fp : str
+        Path to the output metadata file.
+    """
+    extension = get_output_extension(table_format, compression)
+    user = str(getpass.getuser())
+    if not output_fp:
+        if user:
+            output_fp = '%s_clean_%s%s' % (os.path.splitext(metadata_fp)[0], user, extension)
+        else:
+            output_fp = '%s_clean_user%s' % (os.path.splitext(metadata_fp)[0], extension)
+    elif '.' not in os.path.basename(output_fp) or len(output_fp.split('.')[-1]) > 15:
+        output_fp = '%s_clean_%s%s' % (output_fp, user, extension)
+    else:
+        # explicit file name: '<previous_output>_<username>.tsv'
+        # (and not the path to the clean metadata file, that it would overwrite)
+        output_fp = get_compressed_fp(output_fp, table_format, compression)
+        root, ext = os.path.splitext(output_fp)
+        if ext in COMPRESSION_EXTENSIONS.values():
+            root, ext_table = os.path.splitext(root)
+            ext = '%s%s' % (ext_table, ext)
+        output_fp = '%s_%s%s' % (root, user or 'user', ext)
+    return get_compressed_fp(output_fp, table_format, compression)
+
+
+def get_profile_fp(metadata_fp, output_fp, table_format=None):
+    """
+    Get the path to the profiling report of the cleaning,
+    next to the clean metadata file.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the original metadata file.
+
+    output_fp : str
+        Path to the output metadata file.
+
+    table_format : str
+        Format of the output ('tsv', 'parquet' or 'feather').
+
+    Returns
+    -------
+    profile_fp : str
+        Path to the profiling report, e.g. 'md_clean_profile.json'.
+    """
+    clean_metadata_fp = get_clean_metadata_fp(metadata_fp, output_fp, table_format)
+    return '%s_profile.json' % os.path.splitext(clean_metadata_fp)[0]
+
+
+def get_state_fp(metadata_fp, output_fp, table_format=None):
+    """
+    Get the path to the state of the cleaning kept for the next
+    incremental cleaning, next to the clean metadata file.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the original metadata file.
+
+    output_fp : str
+        Path to the output metadata file.
+
+    table_format : str
+        Format of the output (only 'tsv').
+
+    Returns
+    -------
+    state_fp : str
+        Path to the state of the cleaning, e.g. 'md_clean_state.npz'.
+    """
+    clean_metadata_fp = get_clean_metadata_fp(metadata_fp, output_fp, table_format)
+    return '%s_state.npz' % os.path.splitext(clean_metadata_fp)[0]
+
+
+def get_typed_metadata(metadata_pd, fill_value=None):
+    """
+    Get the metadata with columns that have one type, as needed
+    to write parquet or feather files: the float columns (e.g. decided
+    numeric by "solve_dtypes") are kept and the object columns are
+    made of strings (or missing values).
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Clean metadata table.
+
+    fill_value : str
+        Value to write for the missing values (Default: kept missing).
+
+    Returns
+    -------
+    metadata_pd : pd.DataFrame
+        Clean metadata table with typed columns (on a default index).
+    """
+    typed = {}
+    for col in metadata_pd.columns:
+        cur_col = metadata_pd[col]
+        if fill_value is not None and cur_col.hasnans:
+            cur_col = cur_col.astype('object').fillna(fill_value)
+        if str(cur_col.dtype) in ['object', 'category']:
+            cur_col = cur_col.astype('object')
+            cur_col = cur_col.where(cur_col.isna(), cur_col.astype('str'))
+        typed[col] = cur_col.to_numpy()
+    return pd.DataFrame(typed, columns=metadata_pd.columns)
+
+
+def open_output(output_fp, mode='w', compression=None):
+    """
+    Open a tsv output file, compressed or not.
+
+    Parameters
+    ----------
+    output_fp : str
+        Path to the output metadata file.
+
+    mode : str
+        'w' to overwrite, 'a' to append to or 'r' to read the file.
+
+    compression : str
+        'gzip' or 'zstd' (Default: no compression).
+
+    Returns
+    -------
+    file object
+        Text file object (with no newline translation).
+    """
+    if compression == 'gzip':
+        return gzip.open(output_fp, '%st' % mode, newline='')
+    elif compression == 'zstd':
+        import zstandard
+        return zstandard.open(output_fp, '%st' % mode, newline='')
+    elif compression:
+        raise ValueError(
+            "Compression '{}' is not supported (use 'gzip' or 'zstd').".format(compression)
+        )
+    return open(output_fp, mode, newline='')
+
+
+def get_tsv_cell(value):
+    """
+    Get a value as it is written in a tsv cell (quoted if needed).
+
+    Parameters
+    ----------
+    value : str
+        Value, e.g. 'Missing'.
+
+    Returns
+    -------
+    str
+        Content of the cell, e.g. 'Missing'.
+    """
+    if not value:
+        return ''
+    cell = StringIO()
+    csv.writer(cell, delimiter='\t', lineterminator='').writerow([value])
+    return cell.getvalue()
+
+
+def format_tsv_blocks(metadata_pd, na_values, header=True, block_rows=None):
+    """
+    Format the clean metadata as the text of one or more tsv files that
+    only differ by the value written for the missing values: each block of
+    rows is formatted once, with a placeholder for the missing values that
+    is then replaced by the value of each output.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Clean metadata table.
+
+    na_values : list
+        Value to write for the missing values in each output
+        ('' for empty cells).
+
+    header : bool
+        Whether to format the header.
+
+    block_rows : int
+        Number of rows formatted at once
+        (Default: for WRITE_BLOCK_CELLS cells).
+
+    Yields
+    ------
+    texts : list
+        Text of the block of rows for each output.
+    """
+    na_cells = [get_tsv_cell(str(na_value)) for na_value in na_values]
+    if not block_rows:
+        block_rows = max(1, WRITE_BLOCK_CELLS // max(1, metadata_pd.shape[1]))
+    for start in range(0, max(metadata_pd.shape[0], 1), block_rows):
+        block = metadata_pd.iloc[start:(start + block_rows)]
+        block_header = header and not start
+        text = block.to_csv(index=False, sep='\t', header=block_header,
+                            na_rep=NA_SENTINEL)
+        if text.count(NA_SENTINEL) == int(block.isna().values.sum()):
+            yield [text.replace(NA_SENTINEL, na_cell) for na_cell in na_cells]
+        else:
+            # the placeholder is in the metadata: format each output separately
+            categories = dict((col, 'object') for col, dtype in block.dtypes.items()
+                              if str(dtype) == 'category')
+            yield [block.astype(categories).fillna(str(na_value)).to_csv(
+                index=False, sep='\t', header=block_header)
+                if na_value else block.to_csv(index=False, sep='\t', header=block_header)
+                for na_value in na_values]
+
+
+def write_tsv_outputs(metadata_pd, output_fps, na_values, mode='w', header=True,
+                      compression=None, block_rows=None):
+    """
+    Write the clean metadata in one or more tsv files that only differ
+    by the value written for the missing values (see format_tsv_blocks()).
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Clean metadata table.
+
+    output_fps : list
+        Paths to the output metadata files.
+
+    na_values : list
+        Value to write for the missing values in each output file
+        ('' for empty cells).
+
+    mode : str
+        'w' to overwrite or 'a' to append to the files.
+
+    header : bool
+        Whether to write the header.
+
+    compression : str
+        'gzip' or 'zstd' (Default: no compression).
+
+    block_rows : int
+        Number of rows formatted at once
+        (Default: for WRITE_BLOCK_CELLS cells).
+    """
+    handles = []
+    try:
+        for output_fp in output_fps:
+            handles.append(open_output(output_fp, mode, compression))
+        for texts in format_tsv_blocks(metadata_pd, na_values, header, block_rows):
+            for handle, cur_text in zip(handles, texts):
+                handle.write(cur_text)
+    finally:
+        for handle in handles:
+            handle.close()
+
+
+def write_metadata_table(metadata_pd, output_fp, table_format=None, compression=None,
+                         fill_value=None):
+    """
+    Write a metadata table in the format given by the user
+    or otherwise by the extension of the file.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Clean metadata table.
+
+    output_fp : str
+        Path to the output metadata file.
+
+    table_format : str
+        'tsv', 'parquet' or 'feather'
+        (Default: given by the file extension).
+
+    compression : str
+        'gzip' or 'zstd' (Default: no compression for tsv,
+        the pyarrow defaults for parquet and feather).
+
+    fill_value : str
+        Value to write for the missing values (Default: kept missing).
+    """
+    table_format = get_table_format(output_fp, table_format)
+    if table_format == 'parquet':
+        get_typed_metadata(metadata_pd, fill_value).to_parquet(
+            output_fp, index=False, compression=compression or 'snappy')
+    elif table_format == 'feather':
+        if compression not in [None, 'zstd']:
+            raise ValueError(
+                "Feather files can only be compressed with 'zstd'."
+            )
+        get_typed_metadata(metadata_pd, fill_value).to_feather(
+            output_fp, compression=compression)
+    else:
+        na_value = '' if fill_value is None else fill_value
+        write_tsv_outputs(metadata_pd, [output_fp], [na_value], compression=compression)
+
+
+def write_clean_metadata(metadata_pd, metadata_fp, output_fp, table_format=None,
+                         compression=None):
     """
     Write clean metadata file.
 
@@ -114,20 +974,25 @@ def write_clean_metadata(metadata_pd, metadata_fp, output_fp):
     output_fp : str
         Path to the output metadata file.
 
+    table_format : str
+        'tsv', 'parquet' or 'feather'
+        (Default: given by the file extension).
+
+    compression : str
+        'gzip' or 'zstd' (Default: no compression).
+
     Returns
     -------
     output_fp : str
         Path to the output metadata file.
     """
-    if not output_fp:
-        output_fp = '%s_clean.tsv' % os.path.splitext(metadata_fp)[0]
-    elif '.' not in output_fp or len(output_fp.split('.')[-1])>15:
-        output_fp = '%s_clean.tsv' % output_fp
-    metadata_pd.to_csv(output_fp, index=False, sep='\t')
+    output_fp = get_clean_metadata_fp(metadata_fp, output_fp, table_format, compression)
+    write_metadata_table(metadata_pd, output_fp, table_format, compression)
     return output_fp
 
 
-def write_clean_metadata_user(metadata_pd, metadata_fp, output_fp, nan_value_user):
+def write_clean_metadata_user(metadata_pd, metadata_fp, output_fp, nan_value_user,
+                              table_format=None, compression=None):
     """
     Write clean metadata file with user-specified NaN encoding
 
@@ -145,49 +1010,133 @@ def write_clean_metadata_user(metadata_pd, metadata_fp, output_fp, nan_value_use
     nan_value_user : str
         Value to use for replacement for NaN declared by user.
 
+    table_format : str
+        'tsv', 'parquet' or 'feather'
+        (Default: given by the file extension).
+
+    compression : str
+        'gzip' or 'zstd' (Default: no compression).
 
     Returns
     -------
     output_fp : str
         Path to the output metadata file.
     """
-    # edit to make another copy of the file with actual np.nan in the numeric columns
-    # (so that these columns can be read as numeric)
-    if not output_fp:
-        if str(getpass.getuser()):
-            output_fp = '%s_clean_%s.tsv' % (os.path.splitext(metadata_fp)[0], str(getpass.getuser()))
-        else:
-            output_fp = '%s_clean_user.tsv' % os.path.splitext(metadata_fp)[0]
-    elif '.' not in output_fp or len(output_fp.split('.')[-1]) > 15:
-        output_fp = '%s_clean_%s.tsv' % (output_fp, str(getpass.getuser()))
-    metadata_out_pd = metadata_pd.fillna(str(nan_value_user)).copy()
-    metadata_out_pd.to_csv(output_fp, index=False, sep='\t')
+    output_fp = get_clean_metadata_user_fp(metadata_fp, output_fp, table_format, compression)
+    write_metadata_table(metadata_pd, output_fp, table_format, compression,
+                         str(nan_value_user))
     return output_fp
 
 
-def write_outputs(metadata_pd, metadata_fp, output_fp, nan_value, nan_value_user):
+def get_outputs_fps(metadata_fp, output_fp, nan_value, nan_value_user, table_format=None,
+                    compression=None):
+    """
+    Get the paths to the output files and the value that
+    each of them uses for the missing values.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the original metadata file.
+
+    output_fp : str
+        Path to the output metadata file.
 
-    clean_metadata_fps = list()
+    nan_value : str
+        Value to use for replacement for NaN / declared as such.
 
-    clean_metadata_fps.append(
-        write_clean_metadata(
-            metadata_pd,
-            metadata_fp,
-            output_fp
-        )
-    )
+    nan_value_user : str
+        Value to use for replacement for NaN declared by user.
+
+    table_format : str
+        'tsv', 'parquet' or 'feather'
+        (Default: given by the file extension).
+
+    compression : str
+        'gzip' or 'zstd' (Default: no compression).
+
+    Returns
+    -------
+    clean_metadata_fps : list
+        Paths to the output metadata files.
+
+    na_values : list
+        Value to write for the missing values in each output file.
+    """
+    clean_metadata_fps = [get_clean_metadata_fp(metadata_fp, output_fp, table_format,
+                                                 compression)]
+    na_values = ['']
     if nan_value_user != nan_value:
-        clean_metadata_fps.append(
-            write_clean_metadata_user(
-                metadata_pd,
-                metadata_fp,
-                output_fp,
-                nan_value_user
-            )
-        )
+        clean_metadata_fps.append(get_clean_metadata_user_fp(
+            metadata_fp, output_fp, table_format, compression))
+        na_values.append(str(nan_value_user))
+    return clean_metadata_fps, na_values
+
+
+def write_outputs(metadata_pd, metadata_fp, output_fp, nan_value, nan_value_user,
+                  table_format=None, compression=None):
+
+    clean_metadata_fps, na_values = get_outputs_fps(
+        metadata_fp, output_fp, nan_value, nan_value_user, table_format, compression)
+    if get_table_format(clean_metadata_fps[0], table_format) == 'tsv':
+        # the outputs only differ by the missing values: format the table once
+        write_tsv_outputs(metadata_pd, clean_metadata_fps, na_values,
+                          compression=compression)
+    else:
+        for clean_metadata_fp, na_value in zip(clean_metadata_fps, [None] + na_values[1:]):
+            write_metadata_table(metadata_pd, clean_metadata_fp, table_format,
+                                 compression, na_value)
     if clean_metadata_fps:
         print("\nOutput(s) of metadata_cleaning:")
         print('\n'.join(clean_metadata_fps))
         return 0
 
     return 1
+
+
+def append_outputs(metadata_pd, metadata_fp, output_fp, nan_value, nan_value_user, first,
+                   table_format=None, compression=None):
+    """
+    Write a chunk of the clean metadata at the end of the output file(s).
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Chunk of the clean metadata table.
+
+    metadata_fp : str
+        Path to the original metadata file.
+
+    output_fp : str
+        Path to the output metadata file.
+
+    nan_value : str
+        Value to use for replacement for NaN / declared as such.
+
+    nan_value_user : str
+        Value to use for replacement for NaN declared by user.
+
+    first : bool
+        Whether this is the first chunk (the output files
+        are then overwritten and the header is written).
+
+    table_format : str
+        Only 'tsv' (default) outputs can be written by chunks.
+
+    compression : str
+        'gzip' or 'zstd' (Default: no compression).
+
+    Returns
+    -------
+    clean_metadata_fps : list
+        Paths to the output metadata files.
+    """
+    clean_metadata_fps, na_values = get_outputs_fps(
+        metadata_fp, output_fp, nan_value, nan_value_user, table_format, compression)
+    if get_table_format(clean_metadata_fps[0], table_format) != 'tsv':
+        raise ValueError(
+            "Output metadata file {} cannot be written by chunks.".format(clean_metadata_fps[0])
+        )
+    write_tsv_outputs(metadata_pd, clean_metadata_fps, na_values, 'w' if first else 'a',
+                      first, compression)
+    return clean_metadata_fps
@@ -10,6 +10,13 @@
 import pandas as pd
 import numpy as np
 import re
+from collections import Counter
+
+from metadata_cleaning._df_utils import make_columns_frame
+
+# number of unique values of a column inferred at once
+# (their text is held in memory as strings and in lower case once per block)
+INFERENCE_BLOCK = 50000
 
 
 def make_regex_from_nan_value(nan_value):
@@ -53,7 +60,150 @@ def set_column_dtypes(dtypes, column, float_to_string):
     return dtypes
 
 
-def get_dtypes_and_unks(md_pd, nan_value, sampleID_cols, length=25):
+def get_str_methods(values):
+    """
+    Get the pandas string methods (.str) of some values, without caching
+    them on a series: a cached accessor and its series reference each other,
+    so that their memory would only be freed by the garbage collector.
+
+    Parameters
+    ----------
+    values : pd.Series
+        Strings.
+
+    Returns
+    -------
+    pandas.core.strings.accessor.StringMethods
+        String methods of the values.
+    """
+    # the accessor class, as pd.Series.str is not bound to a series
+    return pd.Series.str(values)
+
+
+def get_unique_values_inference(uniques, regex_nan, length, nan_value=None):
+    """
+    Get, for all the unique values of a column (by blocks), the
+    information used to infer the dtype and the potential NaNs.
+
+    Parameters
+    ----------
+    uniques : np.ndarray
+        Unique values of a metadata column.
+
+    regex_nan : re.Pattern
+        Compiled regex allowing finding persistent NaN values.
+
+    length : int
+        Length threshold for the potential unknown factors.
+
+    nan_value : str / np.nan
+        Value to use for replacement for NaN / declared as such.
+
+    Returns
+    -------
+    nan_hits : np.ndarray
+        Whether each value hits the NaN regex (but ':unspecified').
+
+    is_nan : np.ndarray
+        Whether each value is 'nan' (case insensitive, or np.nan).
+
+    is_float : np.ndarray
+        Whether each value is a number (pd.to_numeric()).
+
+    unks : list
+        Lower-case potential unknown factors, i.e. "short" strings
+        that are not floats and have no '/', '-' or digit.
+
+    is_nan_value : np.ndarray
+        Whether each value is nan_value (as a string).
+    """
+    is_numeric = pd.notnull(pd.to_numeric(uniques, errors='coerce'))
+    # boolean masks of each block (an empty one for the columns with no values)
+    nan_hits, is_nan, is_nan_value = ([np.zeros(0, dtype=bool)] for _ in range(3))
+    unks = []
+    for start in range(0, len(uniques), INFERENCE_BLOCK):
+        end = start + INFERENCE_BLOCK
+        uniques_str = pd.Series(np.asarray(uniques[start:end], dtype='object'),
+                                dtype='object').astype('str')
+        is_nan_value.append((uniques_str == str(nan_value)).to_numpy(dtype=bool))
+        if uniques.dtype.kind in 'iuf':
+            # the numbers are already in lower case, e.g. 'nan', 'inf' or '1e-05'
+            lower = uniques_str
+        else:
+            lower = get_str_methods(uniques_str).lower()
+        del uniques_str
+        block_hits = get_str_methods(lower).contains(regex_nan).to_numpy(dtype=bool)
+        block_hits[block_hits] = ~get_str_methods(lower[block_hits]).contains(
+            ':unspecified', regex=False)
+        nan_hits.append(block_hits)
+        is_nan.append((lower == 'nan').to_numpy(dtype=bool))
+        # "short" strings with no '/', '-' or digit (str.isdigit() also holds for e.g. superscripts)
+        unks.extend(x for x in lower[~is_nan[-1] & ~is_numeric[start:end]]
+                    if len(x) < length and '/' not in x and '-' not in x and
+                    not any(map(str.isdigit, x)))
+    nan_hits, is_nan, is_nan_value = map(np.concatenate, [nan_hits, is_nan, is_nan_value])
+    is_float = ~is_nan & is_numeric
+    return nan_hits, is_nan, is_float, unks, is_nan_value
+
+
+def get_column_dtypes_and_unks(cur_col, nan_value, length, regex_nan, with_floats_but_nan):
+    """
+    Infer the dtype of a column and get its potential unknown
+    factors, all its unique values at once (see get_dtypes_and_unks()).
+
+    Parameters
+    ----------
+    cur_col : pd.Series
+        Metadata column.
+
+    nan_value : str / np.nan
+        Value to use for replacement for NaN / declared as such
+
+    length : int
+        Length threshold for the factor.
+
+    regex_nan : re.Pattern
+        Compiled regex allowing finding persistent NaN values.
+
+    with_floats_but_nan : bool
+        Whether to check if all the values are floats or nan_value.
+
+    Returns
+    -------
+    nan_hits : np.ndarray
+        Unique values that hit the regex.
+
+    float_to_string : list
+        Counts of NaN, float64 and non-float64 unique values,
+        and the non-float64 unique values.
+
+    unks : list
+        Potential unknown factors.
+
+    float_or_nan : bool
+        Whether all the values are floats or nan_value (None if not checked).
+    """
+    uniques = cur_col.unique()
+    if not isinstance(uniques, np.ndarray):
+        uniques = np.asarray(uniques, dtype='object')
+    nan_hits, is_nan, is_float, unks, is_nan_value = get_unique_values_inference(
+        uniques, regex_nan, length, nan_value)
+    is_not_float = ~is_nan & ~is_float
+    float_to_string = [int(is_nan.sum()), int((~is_nan & is_float).sum()),
+                       int(is_not_float.sum()), uniques[is_not_float].tolist()]
+    #  [0] - int  : contains a 'nan'
+    #  [1] - int  : contains a 'float64'
+    #  [2] - int  : contains a non-'float64'
+    #  [3] - list : collect the unique non-'float64's
+    float_or_nan = None
+    if with_floats_but_nan:
+        # float() also converts the 'nan' values
+        float_or_nan = bool((is_float | is_nan | is_nan_value).all())
+    return uniques[nan_hits], float_to_string, unks, float_or_nan
+
+
+def get_dtypes_and_unks(md_pd, nan_value, sampleID_cols, length=25, regex_nan=None,
+                        floats_but_nan=None, unks_counts=None, workers=None):
     """
     Get the native dtype and infer it too for each column of the passed metadata.
     Also get the the unknown factors that are ultimately considered "missing"
@@ -75,6 +225,21 @@ def get_dtypes_and_unks(md_pd, nan_value, sampleID_cols, length=25):
         Length threshold for the factor - that could be a frequent
         unwanted factor (e.g. non, nan,...)
 
+    regex_nan : re.Pattern
+        Compiled regex allowing finding persistent NaN values
+        (e.g. from a RulePlan), made from nan_value if None.
+
+    floats_but_nan : dict
+        If passed, filled with whether all the values of each
+        column are floats or nan_value, for get_dtypes_final().
+
+    unks_counts : collections.Counter
+        If passed, updated with the number of columns in which
+        each potential unknown factor is found, for get_certainly_NaNs().
+
+    workers : ColumnWorkers
+        Workers inferring the columns in parallel (None to infer them in turn).
+
     Returns
     -------
     dtypes : dict
@@ -95,47 +260,67 @@ def get_dtypes_and_unks(md_pd, nan_value, sampleID_cols, length=25):
     """
 
     # get the regex allowing finding persistent NaN values
-    regex_nan = make_regex_from_nan_value(nan_value)
+    if regex_nan is None:
+        regex_nan = re.compile(make_regex_from_nan_value(nan_value))
+
+    # look at content non "sample identifier" columns, all unique values at once
+    positions = [pos for pos, column in enumerate(md_pd.columns) if column not in sampleID_cols]
+    infer_args = (nan_value, length, regex_nan, floats_but_nan is not None)
+    if workers is None:
+        inferences = [get_column_dtypes_and_unks(md_pd.iloc[:, pos], *infer_args)
+                      for pos in positions]
+    else:
+        inferences = workers.map_columns(get_column_dtypes_and_unks, md_pd, positions,
+                                         *infer_args)
+    inferences = dict(zip(positions, inferences))
 
     dtypes_inferred = {}
     potential_unks = {}
     nan_diversity = set()
-    for column in md_pd.columns:
+    for pos, column in enumerate(md_pd.columns):
         native_dtype = str(md_pd[column].dtypes)  # get native dtype (may be "wrong")
         dtypes_inferred[column] = [native_dtype]
-        float_to_string = [0, 0, 0, []]
-        #  [0] - int  : contains a 'nan'
-        #  [1] - int  : contains a 'float64'
-        #  [2] - int  : contains a non-'float64'
-        #  [3] - list : collect the unique non-'float64's
         if column in sampleID_cols:
             # force "#SampleID" or "sample_name" to not be a string
             dtypes_inferred[column].append('object')
             continue
-        # look at content non "sample identifier" columns
-        for V in md_pd[column].unique():
-            v = str(V).lower()
-            if re.search(regex_nan, v):
-                if ':unspecified' not in v:
-                    nan_diversity.add(V)
-            if v == 'nan':
-                float_to_string[0] += 1
-            else:
-                # check if column contains at least one float
-                try:
-                    float_V = float(V)
-                    float_to_string[1] += 1
-                except:
-                    float_to_string[2] += 1
-                    float_to_string[3].append(V)
-                    if len(v) < length and '/' not in v and '-' not in v and not len(
-                            [x for x in str(v) if x.isdigit()]):
-                        potential_unks.setdefault(v, []).append(column)
+        nan_hits, float_to_string, unks, float_or_nan = inferences[pos]
+        nan_diversity.update(nan_hits)
+        for unk in unks:
+            potential_unks.setdefault(unk, []).append(column)
+        if unks_counts is not None:
+            unks_counts.update(set(unks))
+        if floats_but_nan is not None:
+            floats_but_nan[column] = float_or_nan
         dtypes_inferred = set_column_dtypes(dtypes_inferred, column, float_to_string)
     return dtypes_inferred, potential_unks, nan_diversity
 
 
-def get_certainly_NaNs(potential_unks, md_pd, freq=10):
+def get_unks_counts(potential_unks, columns):
+    """
+    Count the number of columns in which each potential NaN factor is found.
+
+    Parameters
+    ----------
+    potential_unks : dict
+        all the factors that have the characetristics of a NaN.
+
+    columns : list
+        metadata columns to count.
+
+    Returns
+    -------
+    unks_counts : collections.Counter
+        number of columns per factor.
+    """
+    columns = set(columns)
+    unks_counts = Counter()
+    for unk, unk_samples in potential_unks.items():
+        unks_counts[unk] = len(columns.intersection(unk_samples))
+    return unks_counts
+
+
+def get_certainly_NaNs(potential_unks, md_pd, freq=10, unks_counts=None):
     """
     Count the occurrences of the potential NaN (et al.)
     variables factors and return those that more than a
@@ -154,33 +339,32 @@ def get_certainly_NaNs(potential_unks, md_pd, freq=10):
         to be considered a recurrent NaN and then to be staged
         for replacement.
 
+    unks_counts : collections.Counter
+        number of columns per factor, as collected by
+        get_dtypes_and_unks() (counted here if None).
+
     Returns
     -------
-    certainly_NaNs : ps.Series
+    certainly_NaNs : pd.DataFrame
         final list of sufficiently occurrent factors that may be
         check by user and set on stage for replacement by commmon
-        NaN-encoding value.
+        NaN-encoding value (columns), encoded as binary for each
+        metadata variable (index).
     """
-    # encode the entire metadata as binary for each potential missing factor
-    potential_unks_pd_L = []
-    for col in md_pd.columns:
-        potential_unks_pd_L.append(
-            [1 if col in unk_samples else 0 for unk, unk_samples in sorted(potential_unks.items())])
-
-    # make this binary data a dataframe
-    potential_unks_pd = pd.DataFrame(potential_unks_pd_L,
-                                     index=md_pd.columns.tolist(),
-                                     columns=sorted(potential_unks.keys()))
-    # nrows = potential_unks_pd.shape[0]
-    sumCols = potential_unks_pd.sum(0)
-
-    # Keep only the columns (i.e. the variables) that have at least 10 entries
-    # all_unks_pd_common = all_unks_pd.loc[:, sumCols > (nrows*0.1)]
-    certainly_NaNs = potential_unks_pd.loc[:, sumCols > freq].copy()
+    if unks_counts is None:
+        unks_counts = get_unks_counts(potential_unks, md_pd.columns)
+    # Keep only the factors that are in more than freq variables
+    common_unks = [unk for unk, count in sorted(unks_counts.items()) if count > freq]
+    # encode only these factors as binary for each variable
+    columns = md_pd.columns.tolist()
+    certainly_NaNs = pd.DataFrame(
+        dict((unk, np.isin(columns, list(potential_unks[unk])).astype('int64'))
+             for unk in common_unks),
+        index=columns, columns=common_unks)
     return certainly_NaNs
 
 
-def get_dtypes_final(dtypes_inferred, md_pd, nan_value, sampleID_cols):
+def get_dtypes_final(dtypes_inferred, md_pd, nan_value, sampleID_cols, floats_but_nan=None):
     """
     Verify the dtypes of each column and apply
     it to some of the metadata columns.
@@ -201,6 +385,10 @@ def get_dtypes_final(dtypes_inferred, md_pd, nan_value, sampleID_cols):
     sampleID_cols : list
         Names of the columns containing the sample IDs
 
+    floats_but_nan : dict
+        Whether all the values of each column are floats or nan_value,
+        as collected by get_dtypes_and_unks() (checked here if None).
+
     Returns
     -------
     dtypes_inferred : dict
@@ -220,28 +408,73 @@ def get_dtypes_final(dtypes_inferred, md_pd, nan_value, sampleID_cols):
         # for the columns that might be numeric but
         # to which a string has been added during cleaning
         elif checks[-1] in ['check', 'object']:
-            for v in md_pd[col].unique():
-                # if str(v) == 'nan':
-                # if the value is
-                if str(v) == str(nan_value):
-                    continue
-                else:
-                    try:
-                        float_v = float(v)
-                        continue
-                    except:
-                        dtypes_inferred[col].append('object')
-                        dtypes_final[col] = 'O'
-                        break
+            if floats_but_nan is not None and col in floats_but_nan:
+                numeric = floats_but_nan[col]
             else:
+                uniques = np.asarray(md_pd[col].unique(), dtype='object')
+                uniques_str = pd.Series(uniques, dtype='object').astype('str')
+                # numeric if all the values but nan_value are floats (or NaNs)
+                numeric = (pd.notnull(pd.to_numeric(uniques, errors='coerce')) |
+                           (get_str_methods(uniques_str).lower() == 'nan').to_numpy(dtype=bool) |
+                           (uniques_str == str(nan_value)).to_numpy(dtype=bool)).all()
+            if numeric:
                 dtypes_inferred[col].append('float64')
                 dtypes_final[col] = 'Q'
+            else:
+                dtypes_inferred[col].append('object')
+                dtypes_final[col] = 'O'
         else:
             dtypes_inferred[col].append(checks[-1])
             dtypes_final[col] = 'Q'
     return dtypes_inferred, dtypes_final
 
 
+def is_str_column(cur_col):
+    """
+    Check whether a column already only has strings,
+    i.e. setting it to "str" would only copy it.
+
+    Parameters
+    ----------
+    cur_col : pd.Series
+        Metadata column.
+
+    Returns
+    -------
+    bool
+        True if all the values are strings (no NaN).
+    """
+    if str(cur_col.dtype) != 'object':
+        return False
+    return pd.api.types.infer_dtype(cur_col, skipna=False) == 'string'
+
+
+def rectify_dtype_in_column(cur_col, dtype):
+    """
+    Set the dtype of a column, unless it already has it.
+
+    Parameters
+    ----------
+    cur_col : pd.Series
+        Metadata column.
+
+    dtype : str
+        Final dtype of the column ('Q' for float64, else 'str').
+
+    Returns
+    -------
+    cur_col : pd.Series
+        Column with its final dtype (the same column if unchanged).
+    """
+    if dtype == 'Q':
+        # no copy of the columns that already are numeric
+        if str(cur_col.dtype) != 'float64':
+            return cur_col.astype('float64')
+    elif not is_str_column(cur_col):
+        return cur_col.astype('str')
+    return cur_col
+
+
 def rectify_dtypes_in_md(md_pd, dtypes_final):
     """
     Set the dtypes of the columns based on the
@@ -263,21 +496,23 @@ def rectify_dtypes_in_md(md_pd, dtypes_final):
     md_pd : pd.DataFrame
         final metadata table with updated dtypes
     """
+    new_columns = {}
+    columns = set(md_pd.columns)
     for col, dtype in dtypes_final.items():
-        if col in md_pd.columns.tolist():
-            if dtype == 'Q':
-                md_pd[col] = md_pd[col].astype('float64')
-            else:
-                md_pd[col] = md_pd[col].astype('str')
+        if col in columns:
+            cur_col = rectify_dtype_in_column(md_pd[col], dtype)
+            if cur_col is not md_pd[col]:
+                new_columns[col] = cur_col
         else:
             print('Warning: No dtype for "%s"' % col, '(set to "str")')
-            md_pd[col] = md_pd[col].astype('str')
-    return md_pd
+            new_columns[col] = md_pd[col].astype('str')
+    return make_columns_frame(md_pd, new_columns)
 
 
-def make_solve_dtypes_cleaning(md_pd, nan_value, sampleID_cols, show=None):
+def get_dtypes_final_and_unks(md_pd, nan_value, sampleID_cols, regex_nan=None, unks_counts=None,
+                              workers=None):
     """
-    Run functions to understand and treat dtypes information.
+    Get the final dtypes of the columns and the factors that may be NaNs.
 
     Parameters
     ----------
@@ -290,32 +525,220 @@ def make_solve_dtypes_cleaning(md_pd, nan_value, sampleID_cols, show=None):
     sampleID_cols : list
         Names of the columns containing the sample IDs.
 
+    regex_nan : re.Pattern
+        Compiled regex allowing finding persistent NaN values
+        (e.g. from a RulePlan), made from nan_value if None.
+
+    unks_counts : collections.Counter
+        If passed, updated with the number of columns
+        in which each potential unknown factor is found.
+
+    workers : ColumnWorkers
+        Workers inferring the dtypes of the columns in parallel.
+
     Returns
     -------
-    md_pd : pd.DataFrame
-        dtypes-solved metadata table.
+    dtypes_final : dict
+        final dtypes verified for NaN columns,
+        e.g. {'sample_name': 'O', ..., 'age_years': 'Q'}
+
+    potential_unks : dict
+        keys    -> "NaN" metadata factor (e.g. "not provided")
+        values  -> n-items lists
+            [...] metadata columns where "NaN" factor is encountered
+    """
+    # get columns native and inferred dtypes (in one pass over the unique values)
+    floats_but_nan = {}
+    dtypes_inferred, potential_unks, nan_diversity = get_dtypes_and_unks(
+        md_pd, nan_value, sampleID_cols, 20, regex_nan, floats_but_nan, unks_counts, workers)
+
+    # get the final dtype by verifying the numeric column "without" the added nan_values
+    dtypes_inferred, dtypes_final = get_dtypes_final(dtypes_inferred, md_pd, nan_value,
+                                                     sampleID_cols, floats_but_nan)
+    return dtypes_final, potential_unks
+
+
+def merge_dtypes_final(dtypes_final, chunk_dtypes_final):
+    """
+    Merge the final dtypes obtained on a chunk of the metadata
+    into the final dtypes obtained on the previous chunks:
+    a column is numeric only if it is numeric in all the chunks.
+
+    Parameters
+    ----------
+    dtypes_final : dict
+        final dtypes of the previous chunks (updated here).
 
+    chunk_dtypes_final : dict
+        final dtypes of the current chunk.
+
+    Returns
+    -------
+    dtypes_final : dict
+        merged final dtypes.
+    """
+    for col, dtype in chunk_dtypes_final.items():
+        if dtypes_final.get(col) != 'O':
+            dtypes_final[col] = dtype
+    return dtypes_final
+
+
+def show_certainly_NaNs(potential_unks, md_pd, nan_value, unks_counts=None):
     """
-    # starts by converting all the instances of the
-    # replacement string to numpy NaN
-    md_pd.replace(str(nan_value), np.nan, inplace=True)
+    Print the frequent factors that may have to be added to the "nans" rule.
+
+    Parameters
+    ----------
+    potential_unks : dict
+        all the factors that have the characetristics of a NaN.
+
+    md_pd : pd.DataFrame
+        original metadata table.
 
-    # get columns native and inferred dtypes
-    dtypes_inferred, potential_unks, nan_diversity = get_dtypes_and_unks(md_pd, nan_value, sampleID_cols, 20)
+    nan_value : str / np.nan
+        Value to use for replacement for NaN / declared as such.
 
-    # get metadata factors that are short (length in the previous command) and frequent (freq here)
-    certainly_NaNs = get_certainly_NaNs(potential_unks, md_pd, freq=10)
-    if len(certainly_NaNs) and show:
+    unks_counts : collections.Counter
+        number of columns per factor (counted if None).
+    """
+    # get metadata factors that are short (length in get_dtypes_and_unks) and frequent (freq here)
+    certainly_NaNs = get_certainly_NaNs(potential_unks, md_pd, freq=10, unks_counts=unks_counts)
+    if len(certainly_NaNs):
         print('\nWarning: should not these '
               'be "%s" factors in the "nans" rule?:\n\t%s\n' % (
             nan_value, ', '.join(certainly_NaNs.columns.tolist())
         ))
 
-    # get the final dtype by verifying the numeric column "without" the added nan_values
-    dtypes_inferred, dtypes_final = get_dtypes_final(dtypes_inferred, md_pd, nan_value, sampleID_cols)
 
-    # apply dtypes changes based on final dtypes
-    md_pd = rectify_dtypes_in_md(md_pd, dtypes_final)
+def replace_nan_value_in_column(cur_col, nan_str):
+    """
+    Replace the instances of the replacement string by numpy's NaN in a column.
+
+    Parameters
+    ----------
+    cur_col : pd.Series
+        Metadata column.
+
+    nan_str : str
+        Replacement string for NaN.
+
+    Returns
+    -------
+    cur_col : pd.Series
+        Column with numpy's NaN (the same column if there is no instance).
+    """
+    if cur_col.dtype.kind in 'biufcmM':
+        # no string in the numeric, boolean and date columns
+        return cur_col
+    if str(cur_col.dtype) == 'object' and not (cur_col.to_numpy() == nan_str).any():
+        return cur_col
+    return cur_col.replace(nan_str, np.nan)
+
 
-    md_pd.replace(str(nan_value), np.nan, inplace=True)
-    return md_pd
+def replace_nan_value(md_pd, nan_value):
+    """
+    Replace the instances of the replacement string by numpy's NaN.
+    Only the columns having instances are replaced (not edited in
+    place), so that the other columns may be shared with another table.
+
+    Parameters
+    ----------
+    md_pd : pd.DataFrame
+        metadata table.
+
+    nan_value : str / np.nan
+        Value to use for replacement for NaN / declared as such.
+
+    Returns
+    -------
+    md_pd : pd.DataFrame
+        metadata table with numpy's NaN.
+    """
+    nan_str = str(nan_value)
+    new_columns = {}
+    for col in md_pd.columns:
+        cur_col = replace_nan_value_in_column(md_pd[col], nan_str)
+        if cur_col is not md_pd[col]:
+            new_columns[col] = cur_col
+    return make_columns_frame(md_pd, new_columns)
+
+
+def apply_dtypes_final(md_pd, nan_value, dtypes_final):
+    """
+    Apply the final dtypes and encode the NaN as numpy's NaN.
+
+    Parameters
+    ----------
+    md_pd : pd.DataFrame
+        original metadata table.
+
+    nan_value : str / np.nan
+        Value to use for replacement for NaN / declared as such.
+
+    dtypes_final : dict
+        dtypes inferred from the metadata and verified
+        e.g. {'sample_name': 'O',
+              ...
+              'age_years': 'Q'}
+
+    Returns
+    -------
+    md_pd : pd.DataFrame
+        dtypes-solved metadata table.
+    """
+    nan_str = str(nan_value)
+    new_columns = {}
+    # one column at a time, so that only the final version of each column is kept
+    for col in md_pd.columns:
+        # starts by converting all the instances of the
+        # replacement string to numpy NaN
+        cur_col = replace_nan_value_in_column(md_pd[col], nan_str)
+        # apply dtypes changes based on final dtypes
+        if col in dtypes_final:
+            cur_col = rectify_dtype_in_column(cur_col, dtypes_final[col])
+        cur_col = replace_nan_value_in_column(cur_col, nan_str)
+        if cur_col is not md_pd[col]:
+            new_columns[col] = cur_col
+    return make_columns_frame(md_pd, new_columns)
+
+
+def make_solve_dtypes_cleaning(md_pd, nan_value, sampleID_cols, show=None, regex_nan=None,
+                               workers=None):
+    """
+    Run functions to understand and treat dtypes information.
+
+    Parameters
+    ----------
+    md_pd : pd.DataFrame
+        original metadata table.
+
+    nan_value : str / np.nan
+        Value to use for replacement for NaN / declared as such.
+
+    sampleID_cols : list
+        Names of the columns containing the sample IDs.
+
+    show : bool
+        Verbosity
+
+    regex_nan : re.Pattern
+        Compiled regex allowing finding persistent NaN values
+        (e.g. from a RulePlan), made from nan_value if None.
+
+    workers : ColumnWorkers
+        Workers inferring the dtypes of the columns in parallel.
+
+    Returns
+    -------
+    md_pd : pd.DataFrame
+        dtypes-solved metadata table.
+
+    """
+    # get the final dtypes (the replacement string is treated as NaN)
+    unks_counts = Counter()
+    dtypes_final, potential_unks = get_dtypes_final_and_unks(md_pd, nan_value, sampleID_cols,
+                                                             regex_nan, unks_counts, workers)
+    if show:
+        show_certainly_NaNs(potential_unks, md_pd, nan_value, unks_counts)
+
+    return apply_dtypes_final(md_pd, nan_value, dtypes_final)
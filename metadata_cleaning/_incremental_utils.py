@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+# version of the state saved next to the outputs (a new version re-cleans everything)
+STATE_VERSION = 3
+
+
+def get_rules_hash(rules, *options):
+    """
+    Hash the rules and the options that change the outputs of the cleaning.
+
+    Parameters
+    ----------
+    rules : dict
+        All rules (as read from the yaml file).
+
+    options
+        Other arguments of the cleaning, e.g. the "no_*" flags.
+
+    Returns
+    -------
+    str
+        Hexadecimal hash.
+    """
+    return hashlib.sha256(repr((rules, options)).encode('utf-8')).hexdigest()
+
+
+def get_rows_fingerprints(metadata_pd):
+    """
+    Hash the content of each row of the metadata table, as read: the
+    dtypes read for the columns are kept in the state, so that a change
+    of dtype (e.g. an appended decimal number makes all the integers of
+    its column floats) is detected on its own.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Metadata table (as read from the file).
+
+    Returns
+    -------
+    np.array
+        Hash of each row (uint64).
+    """
+    return pd.util.hash_pandas_object(metadata_pd, index=False).to_numpy()
+
+
+def get_ids_summary(metadata_pd, sample_id_cols):
+    """
+    Count the sample IDs of each sample ID column, by their hash.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Metadata table (as read from the file).
+
+    sample_id_cols : list
+        Names of the columns containing the sample IDs.
+
+    Returns
+    -------
+    ids_summary : dict
+        key    -> sample ID column
+        value  -> distinct hashes of the sample IDs (sorted uint64)
+                  and their number of occurrences
+    """
+    ids_summary = {}
+    for sample_col in sample_id_cols:
+        if sample_col in metadata_pd.columns:
+            hashes = pd.util.hash_array(metadata_pd[sample_col].astype('str').to_numpy(dtype=object))
+            ids_summary[sample_col] = np.unique(hashes, return_counts=True)
+    return ids_summary
+
+
+def get_previous_counts(hashes, counts, values):
+    """
+    Get the number of occurrences of sample IDs in a summary.
+
+    Parameters
+    ----------
+    hashes : np.array
+        Distinct hashes of the summarized sample IDs (sorted).
+
+    counts : np.array
+        Number of occurrences of each hash.
+
+    values : np.array
+        Sample IDs (as strings) to count.
+
+    Returns
+    -------
+    np.array
+        Number of occurrences of each of the values (0 if not summarized).
+    """
+    values_hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+    if not len(hashes):
+        return np.zeros(len(values_hashes), dtype=np.int64)
+    pos = np.minimum(np.searchsorted(hashes, values_hashes), len(hashes) - 1)
+    return np.where(hashes[pos] == values_hashes, counts[pos], 0)
+
+
+def merge_ids_summaries(ids_summary, new_ids_summary):
+    """
+    Add the sample IDs counts of new rows to a summary.
+
+    Parameters
+    ----------
+    ids_summary : dict
+        Summary of the sample IDs of the previous rows (see get_ids_summary()).
+
+    new_ids_summary : dict
+        Summary of the sample IDs of the new rows.
+
+    Returns
+    -------
+    dict
+        Summary of the sample IDs of all the rows.
+    """
+    merged = {}
+    for sample_col, (new_hashes, new_counts) in new_ids_summary.items():
+        hashes, counts = ids_summary.get(sample_col, (new_hashes[:0], new_counts[:0]))
+        hashes, inverse = np.unique(np.concatenate([hashes, new_hashes]), return_inverse=True)
+        merged[sample_col] = (hashes, np.bincount(inverse, weights=np.concatenate(
+            [counts, new_counts]), minlength=len(hashes)).astype(np.int64))
+    return merged
+
+
+def get_new_ids_counts(new_pd, sample_id_cols, ids_summary, force_ids):
+    """
+    Get the counts of the sample IDs of new rows over all the rows, from the
+    summary of the previous rows, and the suffixes from which the duplicated
+    sample IDs of the new rows are numbered (see make_sample_id_cleaning()).
+
+    Parameters
+    ----------
+    new_pd : pd.DataFrame
+        New rows of the metadata table.
+
+    sample_id_cols : list
+        Names of the columns containing the sample IDs.
+
+    ids_summary : dict
+        Summary of the sample IDs of the previous rows (see get_ids_summary()).
+
+    force_ids : bool
+        Whether the duplicated sample IDs are made unique.
+
+    Returns
+    -------
+    id_counts : dict
+        Number of occurrences of the sample IDs of the new rows
+        in all the rows, per sample ID column.
+
+    id_seen : dict
+        Number of occurrences of the duplicated sample IDs in the previous
+        rows, per sample ID column (None if a sample ID that was unique
+        is now duplicated: its previous row would get a suffix).
+    """
+    id_counts, id_seen = {}, {}
+    for sample_col in sample_id_cols:
+        if sample_col not in new_pd.columns:
+            continue
+        new_counts = new_pd[sample_col].astype('str').value_counts()
+        hashes, counts = ids_summary.get(sample_col, (np.zeros(0, dtype=np.uint64), []))
+        previous = get_previous_counts(hashes, np.asarray(counts, dtype=np.int64),
+                                       new_counts.index.to_numpy(dtype=object))
+        if force_ids and (previous == 1).any():
+            return id_counts, None
+        id_counts[sample_col] = dict(zip(new_counts.index, (new_counts.to_numpy() + previous).tolist()))
+        id_seen[sample_col] = dict((x, int(y) + 1) for x, y in zip(new_counts.index, previous) if y > 1)
+    return id_counts, id_seen
+
+
+def read_state(state_fp, rules_hash, columns, dtypes, clean_metadata_fps, fingerprints):
+    """
+    Read the state of the previous cleaning, if it can be continued: same
+    rules and options, same input columns read with the same dtypes, same
+    previous rows (only rows appended since) and outputs left as written.
+
+    The previous rows must not have changed, as only the appended
+    rows are cleaned: a change of a previous row cleans all the rows.
+
+    Parameters
+    ----------
+    state_fp : str
+        Path to the state of the previous cleaning.
+
+    rules_hash : str
+        Hash of the current rules and options.
+
+    columns : list
+        Columns of the current metadata table.
+
+    dtypes : list
+        Dtypes read for these columns.
+
+    clean_metadata_fps : list
+        Paths to the output metadata files.
+
+    fingerprints : np.array
+        Hash of each row of the current metadata table.
+
+    Returns
+    -------
+    state : dict
+        State of the previous cleaning, with its rows 'fingerprints' and
+        the summary of its sample IDs ('ids', see get_ids_summary())
+        (None if the cleaning must start from scratch).
+    """
+    if not os.path.isfile(state_fp) or not all(map(os.path.isfile, clean_metadata_fps)):
+        return None
+    try:
+        with np.load(state_fp, allow_pickle=False) as arrays:
+            state = json.loads(str(arrays['state']))
+            state['fingerprints'] = arrays['fingerprints']
+            state['ids'] = dict((sample_col, (arrays['ids_%s' % idx], arrays['counts_%s' % idx]))
+                                for idx, sample_col in enumerate(state['ids_cols']))
+    except (OSError, ValueError, KeyError):
+        return None
+    if state.get('version') != STATE_VERSION or state['rules_hash'] != rules_hash \
+            or state['columns'] != [str(x) for x in columns] \
+            or state['dtypes'] != [str(x) for x in dtypes] \
+            or state['outputs_sizes'] != [os.path.getsize(x) for x in clean_metadata_fps]:
+        return None
+    n_old = state['fingerprints'].shape[0]
+    if n_old > fingerprints.shape[0] or (fingerprints[:n_old] != state['fingerprints']).any():
+        return None
+    return state
+
+
+def write_state(state_fp, state, fingerprints, ids_summary, clean_metadata_fps):
+    """
+    Write the state of the cleaning for the next incremental cleaning.
+
+    Parameters
+    ----------
+    state_fp : str
+        Path to the state of the cleaning.
+
+    state : dict
+        Summaries of the cleaning (JSON-serializable).
+
+    fingerprints : np.array
+        Hash of each row of the metadata table.
+
+    ids_summary : dict
+        Summary of the sample IDs of all the rows (see get_ids_summary()).
+
+    clean_metadata_fps : list
+        Paths to the output metadata files (as written).
+    """
+    state = dict(state, version=STATE_VERSION, ids_cols=list(ids_summary),
+                 outputs_sizes=[os.path.getsize(x) for x in clean_metadata_fps])
+    arrays = {}
+    for idx, (hashes, counts) in enumerate(ids_summary.values()):
+        arrays['ids_%s' % idx], arrays['counts_%s' % idx] = hashes, counts
+    # write then move, not to leave a partial state
+    with open('%s.tmp' % state_fp, 'wb') as o:
+        np.savez(o, state=np.array(json.dumps(state, default=str)),
+                 fingerprints=fingerprints, **arrays)
+    os.replace('%s.tmp' % state_fp, state_fp)
+
+
+def get_nan_decisions_key(nan_decisions):
+    """
+    Get a comparable version of the values decided as NaN
+    (the values of a loaded state are not the same objects).
+
+    Parameters
+    ----------
+    nan_decisions : dict
+        key    -> column
+        value  -> values decided as NaN (set or list)
+
+    Returns
+    -------
+    dict
+        key    -> column (with values decided as NaN)
+        value  -> sorted representations of the values
+    """
+    return dict((col, sorted(map(repr, values)))
+                for col, values in nan_decisions.items() if values)
@@ -6,10 +6,186 @@
 #
 # The full license is in the file LICENSE.txt, distributed with this software.
 # ----------------------------------------------------------------------------
+import re
+import numpy as np
 import pandas as pd
+from itertools import repeat
 
+from metadata_cleaning._df_utils import make_columns_frame
 
-def get_output_col_and_edits(name_col, input_col, nan_value, replacement, nan_decisions):
+DEFAULT_TIME_FORMAT = 'DD/MM/YYYY HH:MM:SS'
+DATE_TOKENS = re.compile('YYYY|YY|MM|DD')
+DATE_DIRECTIVES = {'YYYY': '%Y', 'YY': '%y', 'MM': '%m', 'DD': '%d'}
+TIME_TOKENS = re.compile('HH|MM|SS')
+TIME_DIRECTIVES = {'HH': '%H', 'MM': '%M', 'SS': '%S'}
+TIME_ONLY = re.compile(r'\d{1,2}:\d{2}(:\d{2})?')
+# kinds of the columns formatted before any content detection
+LEGACY_TIME_KINDS = {'collection_date': 'date', 'collection_time': 'time',
+                     'collection_timestamp': 'timestamp'}
+
+
+def get_replacement_aug(replacement, nan_value):
+    """
+    Get the replacement dict augmented with the
+    lowercase and uppercase versions of the factors.
+
+    Parameters
+    ----------
+    replacement : dict or list
+        Dict of replacements to execute.
+        Or list of factor to replace by np.nan
+
+    nan_value : str
+        Value to use for replacement for NaN / declared as such
+
+    Returns
+    -------
+    replacement_aug : dict
+        Replacements to execute.
+    """
+    if isinstance(replacement, dict):
+        replacement_aug = dict(replacement)
+        for k, v in replacement.items():
+            replacement_aug[k.lower()] = v
+            replacement_aug[k.upper()] = v
+    else:
+        replacement_aug = dict((x, nan_value) for x in replacement)
+    return replacement_aug
+
+
+def get_replacement_edits(values, replacement_aug):
+    """
+    Get the replacement values that replacing
+    distinct values would leave in a column.
+
+    Parameters
+    ----------
+    values : iterable
+        Distinct values of the column (as strings).
+
+    replacement_aug : dict
+        Replacements to execute.
+
+    Returns
+    -------
+    edits : set
+        Replacement values found in the cleaned column.
+    """
+    replacement_values = set(replacement_aug.values())
+    edits = set()
+    for value in values:
+        if value in replacement_aug:
+            edits.add(replacement_aug[value])
+        elif value in replacement_values:
+            edits.add(value)
+    return edits
+
+
+def replace_with_mask(input_col, replacement_aug):
+    """
+    Replace the values of a column of strings and get the edits.
+    The replacements are only looked up for the distinct values of
+    the column and only the cells to replace (mask) are rewritten.
+
+    Parameters
+    ----------
+    input_col : pd.Series
+        Column to clean (as strings).
+
+    replacement_aug : dict
+        Replacements to execute.
+
+    Returns
+    -------
+    output_col : pd.Series
+        Cleaned column.
+
+    edits : set
+        Replacement values found in the cleaned column.
+    """
+    uniques = input_col.unique()
+    edits = get_replacement_edits(uniques, replacement_aug)
+    to_replace = [value for value in uniques if value in replacement_aug]
+    if to_replace:
+        mask = input_col.isin(to_replace)
+        output_col = input_col.copy()
+        output_col[mask] = input_col[mask].map(replacement_aug)
+    else:
+        output_col = input_col
+    return output_col, edits
+
+
+def recode_categories(input_col, new_values):
+    """
+    Rebuild a categorical column from the new value of each of its
+    categories, merging the categories that get the same new value.
+
+    Parameters
+    ----------
+    input_col : pd.Series
+        Categorical column.
+
+    new_values : list
+        New value of each category of the column
+        (in the order of the categories).
+
+    Returns
+    -------
+    output_col : pd.Series
+        Categorical column with the new values.
+    """
+    new_categories, new_codes, new_index = [], [], {}
+    for value in new_values:
+        if pd.isnull(value):
+            new_codes.append(-1)
+            continue
+        if value not in new_index:
+            new_index[value] = len(new_categories)
+            new_categories.append(value)
+        new_codes.append(new_index[value])
+    # the missing values (code -1) pick this last code
+    new_codes.append(-1)
+    codes = np.asarray(new_codes)[input_col.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=new_categories),
+                     index=input_col.index, name=input_col.name)
+
+
+def replace_categories(input_col, replacement_aug):
+    """
+    Replace the values of a categorical column and get the edits by
+    rewriting its categories rather than its rows. As for a column
+    converted to strings, the missing values are treated as 'nan'.
+
+    Parameters
+    ----------
+    input_col : pd.Series
+        Categorical column to clean.
+
+    replacement_aug : dict
+        Replacements to execute.
+
+    Returns
+    -------
+    output_col : pd.Series
+        Cleaned categorical column.
+
+    edits : set
+        Replacement values found in the cleaned column.
+    """
+    if input_col.hasnans:
+        if 'nan' not in input_col.cat.categories:
+            input_col = input_col.cat.add_categories(['nan'])
+        input_col = input_col.fillna('nan')
+    categories = [str(x) for x in input_col.cat.categories]
+    present = np.bincount(input_col.cat.codes.to_numpy(), minlength=len(categories)) > 0
+    edits = get_replacement_edits([x for x, is_present in zip(categories, present) if is_present],
+                                  replacement_aug)
+    new_values = [replacement_aug.get(x, x) for x in categories]
+    return recode_categories(input_col, new_values), edits
+
+
+def get_output_col_and_edits(name_col, input_col, nan_value, replacement,
+                             nan_decisions, replacement_aug=None):
     """
     Get the replaced column and update the decisions
     dict with the replacement values for the current column.
@@ -25,9 +201,6 @@ def get_output_col_and_edits(name_col, input_col, nan_value, replacement, nan_de
     nan_value : str
         Value to use for replacement for NaN / declared as such
 
-    nan_decisions : dict
-        Dict to update with the encountered edits.
-
     replacement : dict or list
         Dict of replacements to execute.
         Or list of factor to replace by np.nan
@@ -35,6 +208,10 @@ def get_output_col_and_edits(name_col, input_col, nan_value, replacement, nan_de
     nan_decisions : dict
         Dict to update with the encountered edits.
 
+    replacement_aug : dict
+        Replacements already augmented by get_replacement_aug()
+        (e.g. from a RulePlan), in which case replacement is ignored.
+
     Returns
     -------
     output_col : pd.Series
@@ -43,22 +220,20 @@ def get_output_col_and_edits(name_col, input_col, nan_value, replacement, nan_de
     nan_decisions : dict
         Updated dict of the encountered edits.
     """
-    if isinstance(replacement, dict):
-        replacement_aug = dict(replacement)
-        for k, v in replacement.items():
-            replacement_aug[k.lower()] = v
-            replacement_aug[k.upper()] = v
+    if replacement_aug is None:
+        replacement_aug = get_replacement_aug(replacement, nan_value)
+    if str(input_col.dtype) == 'category':
+        output_col, edits = replace_categories(input_col, replacement_aug)
     else:
-        replacement_aug = dict((x, nan_value) for x in replacement)
-    output_col = input_col.astype('str').replace(replacement_aug)
-    edits = [edit for edit in output_col if edit in list(replacement_aug.values())]
+        output_col, edits = replace_with_mask(input_col.astype('str'), replacement_aug)
     # always collect an edit value in the column (nan_decisions)
     nan_decisions[name_col].update(edits)
     return output_col, nan_decisions
 
 
 def make_replacement_cleaning(input_col, name_col, sample_id_cols,
-                              nan_decisions, nan_value, rules, key=None):
+                              nan_decisions, nan_value, rules, key=None,
+                              replacement_aug=None):
     """
     Treat column by replacement.
 
@@ -90,6 +265,10 @@ def make_replacement_cleaning(input_col, name_col, sample_id_cols,
         Could be None if a replacement dict is directly
             passed in the rules dict
 
+    replacement_aug : dict
+        Replacements already augmented by get_replacement_aug()
+        (e.g. from a RulePlan), in which case rules and key are ignored.
+
     Returns
     -------
     input_col : pd.Series
@@ -101,18 +280,135 @@ def make_replacement_cleaning(input_col, name_col, sample_id_cols,
         return input_col, nan_decisions
 
     input_col_dtype = str(input_col.dtype)
-    if input_col_dtype == 'bool' and key == 'booleans':
-        return get_output_col_and_edits(name_col, input_col, nan_value, rules[key], nan_decisions)
-    elif input_col_dtype != 'object':
+    if input_col_dtype not in ['object', 'category'] and not (
+            input_col_dtype == 'bool' and key == 'booleans'):
         return input_col, nan_decisions
+
+    if replacement_aug is None:
+        replacement = rules[key] if key else rules
     else:
-        if key:
-            return get_output_col_and_edits(name_col, input_col, nan_value, rules[key], nan_decisions)
+        replacement = None
+    return get_output_col_and_edits(name_col, input_col, nan_value, replacement,
+                                    nan_decisions, replacement_aug)
+
+
+def make_nans_booleans_cleaning(input_col, name_col, sample_id_cols,
+                                nan_decisions, replacements_aug, booleans_aug):
+    """
+    Treat column by replacement of both the "nans"
+    and the "booleans" rules in one pass.
+
+    Each rule is applied to the original column, as when the rules
+    were applied one after the other: the column gets the replacements
+    of the last rule only, but the edits of all the rules are recorded.
+
+    Parameters
+    ----------
+    input_col : pd.Series
+        Column to clean.
+
+    name_col : str
+        Name of the passed column.
+
+    sample_id_cols : list
+        Names of the columns containing the sample IDs
+
+    nan_decisions : dict
+        Dict to update with the encountered edits.
+
+    replacements_aug : list
+        Replacements of the "nans" and "booleans" rules,
+        in this order (for the "object" columns).
+
+    booleans_aug : dict
+        Replacements of the "booleans" rule (for the "bool" columns).
+
+    Returns
+    -------
+    output_col : pd.Series
+        Cleaned column.
+
+    nan_decisions : dict
+        Updated dict of the encountered edits.
+    """
+    if name_col in sample_id_cols:
+        return input_col, nan_decisions
+
+    input_col_dtype = str(input_col.dtype)
+    if input_col_dtype == 'bool' and booleans_aug:
+        replacements_aug = [booleans_aug]
+    elif input_col_dtype not in ['object', 'category'] or not replacements_aug:
+        return input_col, nan_decisions
+
+    if len(replacements_aug) > 1:
+        if input_col_dtype == 'category':
+            values = [str(x) for x in input_col.cat.remove_unused_categories().cat.categories]
+            if input_col.hasnans:
+                values.append('nan')
         else:
-            return get_output_col_and_edits(name_col, input_col, nan_value, rules, nan_decisions)
+            values = input_col.astype('str').unique()
+        for replacement_aug in replacements_aug[:-1]:
+            nan_decisions[name_col].update(get_replacement_edits(values, replacement_aug))
+    return get_output_col_and_edits(name_col, input_col, None, None,
+                                    nan_decisions, replacements_aug[-1])
 
 
-def make_sample_id_cleaning(md, sample_id_cols, sample_rules, show=False):
+def make_duplicated_ids_unique(input_col, codes, uniques, counts, new_ids_d):
+    """
+    Add a '.1', '.2', ... suffix to the sample IDs that are not unique,
+    numbering the rows of each ID by cumulative count, in the order of the rows.
+
+    Parameters
+    ----------
+    input_col : pd.Series
+        Sample IDs (as strings).
+
+    codes : np.ndarray
+        Index in uniques of the ID of each row.
+
+    uniques : np.ndarray
+        Distinct sample IDs.
+
+    counts : np.ndarray
+        Number of occurrences of each distinct ID.
+
+    new_ids_d : dict
+        Next suffix number of each duplicated ID
+        (from the previous chunks, updated here).
+
+    Returns
+    -------
+    output_col : pd.Series
+        Unique sample IDs (on the same index).
+    """
+    is_duplicated = counts[codes] > 1
+    duplicated_codes = codes[is_duplicated]
+    # cumulative count of the rows of each ID
+    order = np.argsort(duplicated_codes, kind='stable')
+    sorted_codes = duplicated_codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    sizes = np.diff(np.r_[starts, len(sorted_codes)])
+    suffixes = np.empty(len(sorted_codes), dtype=np.int64)
+    suffixes[order] = np.arange(len(sorted_codes)) - np.repeat(starts, sizes) + 1
+
+    # continue the numbering of the previous chunks
+    offsets = np.ones(len(uniques), dtype=np.int64)
+    if new_ids_d:
+        offsets = np.fromiter(map(new_ids_d.get, uniques, repeat(1)),
+                              dtype=np.int64, count=len(uniques))
+        suffixes += offsets[duplicated_codes] - 1
+    duplicated_uniques = sorted_codes[starts]
+    new_ids_d.update(zip(uniques[duplicated_uniques],
+                         (offsets[duplicated_uniques] + sizes).tolist()))
+
+    suffixes_str = np.array(['.%s' % x for x in range(suffixes.max() + 1)], dtype='object')
+    new_ids = input_col.to_numpy(dtype='object', copy=True)
+    new_ids[is_duplicated] = new_ids[is_duplicated] + suffixes_str[suffixes]
+    return pd.Series(new_ids, index=input_col.index)
+
+
+def make_sample_id_cleaning(md, sample_id_cols, sample_rules, show=False,
+                            id_counts=None, id_seen=None):
     """
     Check and correct the sample identifiers.
     Print warnings if something wrong.
@@ -131,38 +427,264 @@ def make_sample_id_cleaning(md, sample_id_cols, sample_rules, show=False):
     show : bool
         Verbosity
 
+    id_counts : dict
+        Number of occurrences of each sample ID per sample ID column
+        when md is only a chunk of the metadata (counted on all chunks).
+
+    id_seen : dict
+        Number of occurrences of each duplicated sample ID per sample ID
+        column in the previous chunks (updated here).
+
     Returns
     -------
     md : pd.DataFrame
         Dataframe with cleaned sample_ids.
     """
+    new_columns = {}
     for sample_col in sample_id_cols:
         if sample_col not in md.columns:
             continue
         input_col = md[sample_col].astype('str')
         if 'check_sample_id_unique' in sample_rules and sample_rules['check_sample_id_unique']:
-            if input_col.unique().size != input_col.size:
-                if show:
+            codes, uniques = pd.factorize(input_col)
+            uniques = np.asarray(uniques, dtype='object')
+            if id_counts is None:
+                counts = np.bincount(codes, minlength=len(uniques))
+                new_ids_d = {}
+            else:
+                counts = np.fromiter(map(id_counts[sample_col].get, uniques, repeat(0)),
+                                     dtype=np.int64, count=len(uniques))
+                new_ids_d = id_seen.setdefault(sample_col, {})
+            if show:
+                if id_counts is None:
+                    n_duplicated = int((counts > 1).sum())
+                else:
+                    n_duplicated = sum(x > 1 for x in id_counts[sample_col].values())
+                if n_duplicated:
                     print('Warning: duplicate sample names in "%s"' % sample_col)
-                    print(' (Duplication number: %s)\n' % sum(input_col.value_counts() > 1))
-                if 'check_sample_id_force' in sample_rules and sample_rules['check_sample_id_force']:
-                    replicated = dict(input_col.value_counts())
-                    new_ids = []
-                    new_ids_d = {}
-                    for i in input_col:
-                        if replicated[i] > 1:
-                            if i not in new_ids_d:
-                                new_ids_d[i] = 1
-                            new_ids.append('%s.%s' % (i, new_ids_d[i]))
-                            new_ids_d[i] += 1
-                        else:
-                            new_ids.append(i)
-                    input_col = pd.Series(new_ids)
-        md[sample_col] = input_col
-    return md
-
-
-def make_date_time_cleaning(md, rules):
+                    print(' (Duplication number: %s)\n' % n_duplicated)
+            if 'check_sample_id_force' in sample_rules and sample_rules['check_sample_id_force']:
+                if (counts > 1).any():
+                    input_col = make_duplicated_ids_unique(input_col, codes, uniques,
+                                                           counts, new_ids_d)
+        new_columns[sample_col] = input_col
+    return make_columns_frame(md, new_columns)
+
+
+def get_strftime_formats(time_format=None):
+    """
+    Translate the target format of the "time_format" rules,
+    e.g. DD/MM/YYYY HH:MM, into strftime formats.
+
+    Parameters
+    ----------
+    time_format : str
+        Target format as in the yaml file. It could also be
+        already given as a strftime format, e.g. '%d/%m/%Y %H:%M'.
+
+    Returns
+    -------
+    strftime_formats : dict
+        Target strftime formats for the columns holding
+        a 'date', a 'time' or both ('timestamp').
+    """
+    if not time_format:
+        time_format = DEFAULT_TIME_FORMAT
+    date_parts, time_parts = [], []
+    for part in time_format.split():
+        if ':' in part or part.startswith(('HH', '%H', '%I')):
+            time_parts.append(part)
+        else:
+            date_parts.append(part)
+    # "MM" are the months in the date part and the minutes in the time part
+    date_format = re.sub(DATE_TOKENS, lambda x: DATE_DIRECTIVES[x.group()], ' '.join(date_parts))
+    time_format = re.sub(TIME_TOKENS, lambda x: TIME_DIRECTIVES[x.group()], ' '.join(time_parts))
+    strftime_formats = {
+        'date': date_format or time_format,
+        'time': time_format or date_format,
+        'timestamp': ' '.join(x for x in [date_format, time_format] if x)
+    }
+    return strftime_formats
+
+
+def get_time_kind(name_col, uniques, parsed):
+    """
+    Get whether a column holds dates, times or both.
+
+    Parameters
+    ----------
+    name_col : str
+        Name of the column.
+
+    uniques : pd.Series
+        Distinct values of the column (as strings).
+
+    parsed : pd.Series
+        Distinct values of the column, parsed.
+
+    Returns
+    -------
+    str
+        'date', 'time' or 'timestamp'.
+    """
+    # the legacy column names tell first...
+    if name_col.lower() in LEGACY_TIME_KINDS:
+        return LEGACY_TIME_KINDS[name_col.lower()]
+    # ...and otherwise the content (a time written at midnight is kept)
+    if uniques.str.fullmatch(TIME_ONLY).all():
+        return 'time'
+    parsed = parsed.dropna()
+    if (parsed == parsed.dt.normalize()).all() and not uniques.str.contains(':').any():
+        return 'date'
+    return 'timestamp'
+
+
+def parse_unique_datetimes(uniques):
+    """
+    Parse distinct date/time strings using the format inferred
+    once by pandas from the first value, falling back to the
+    flexible parser only for the values that do not match it.
+
+    Parameters
+    ----------
+    uniques : pd.Series
+        Distinct values of the column (as strings).
+
+    Returns
+    -------
+    parsed : pd.Series
+        Parsed values (NaT for the missing values).
+    """
+    if uniques.str.fullmatch(TIME_ONLY).all():
+        time_only_format = '%H:%M:%S' if uniques.str.count(':').min() == 2 else '%H:%M'
+        parsed = pd.to_datetime(uniques, format=time_only_format, errors='coerce')
+        # the values not matching this format (raise if unparsable)
+        leftovers = parsed.isna()
+        if leftovers.any():
+            parsed[leftovers] = pd.to_datetime(uniques[leftovers])
+        return parsed
+    return pd.to_datetime(uniques, infer_datetime_format=True)
+
+
+def get_unique_datetimes(input_col):
+    """
+    Get the distinct values of a date/time column, as strings.
+
+    Parameters
+    ----------
+    input_col : pd.Series
+        Date/time column.
+
+    Returns
+    -------
+    codes : np.ndarray
+        Position of the value of each row in the distinct
+        values (-1 for the missing values).
+
+    uniques : pd.Series
+        Distinct values (as strings), in order of appearance.
+    """
+    codes, uniques = pd.factorize(input_col)
+    return codes, pd.Series(np.asarray(uniques, dtype=object)).astype('str')
+
+
+def format_unique_datetimes(uniques, name_col, strftime_formats):
+    """
+    Parse and format the distinct values of a date/time column.
+
+    Parameters
+    ----------
+    uniques : pd.Series
+        Distinct values of the column (as strings).
+
+    name_col : str
+        Name of the column.
+
+    strftime_formats : dict
+        Target strftime formats (from get_strftime_formats()).
+
+    Returns
+    -------
+    formatted : np.ndarray
+        Formatted values ('NaT' for the missing values).
+    """
+    parsed = parse_unique_datetimes(uniques)
+    kind = get_time_kind(name_col, uniques, parsed)
+    return parsed.dt.strftime(strftime_formats[kind]).fillna('NaT').to_numpy()
+
+
+def get_date_time_formats(date_time_uniques, rules):
+    """
+    Format the distinct values of the date/time columns of an entire
+    metadata table cleaned by chunks, for each chunk to be formatted
+    as the entire table (the format and the kind of the values of a
+    column are inferred from all its values).
+
+    Parameters
+    ----------
+    date_time_uniques : dict
+        key    -> date/time column
+        value  -> distinct values of all the chunks (as strings,
+                  in order of appearance, e.g. as dict keys)
+
+    rules : dict
+        All rules (uses "time_format").
+
+    Returns
+    -------
+    date_time_formats : dict
+        key    -> date/time column
+        value  -> formatted value of each distinct value
+    """
+    strftime_formats = get_strftime_formats(rules['time_format'].get('format'))
+    date_time_formats = {}
+    for name_col, uniques in date_time_uniques.items():
+        uniques = pd.Series(list(uniques), dtype=object)
+        formatted = format_unique_datetimes(uniques, name_col, strftime_formats)
+        date_time_formats[name_col] = dict(zip(uniques, formatted))
+    return date_time_formats
+
+
+def make_date_time_column_cleaning(input_col, name_col, strftime_formats, formatted=None):
+    """
+    Re-format a date/time column. Only the distinct
+    values are parsed and formatted: the results are
+    broadcast back to the rows through the codes.
+
+    Parameters
+    ----------
+    input_col : pd.Series
+        Column to clean.
+
+    name_col : str
+        Name of the column.
+
+    strftime_formats : dict
+        Target strftime formats (from get_strftime_formats()).
+
+    formatted : dict
+        Formatted value of each distinct value (as a string), when
+        decided on the entire table (see get_date_time_formats()).
+
+    Returns
+    -------
+    output_col : pd.Series
+        Cleaned column (on the same index).
+    """
+    codes, uniques = get_unique_datetimes(input_col)
+    if formatted is None:
+        formatted = format_unique_datetimes(uniques, name_col, strftime_formats)
+    else:
+        formatted = [formatted[x] for x in uniques]
+    # the missing values (code -1) pick this last, "NaT", value
+    formatted = np.append(formatted, 'NaT').astype(object)
+    output_col = pd.Series(formatted[codes], index=input_col.index, name=input_col.name)
+    if str(input_col.dtype) == 'category':
+        output_col = output_col.astype('category')
+    return output_col
+
+
+def make_date_time_cleaning(md, rules, date_time_formats=None):
     """
     Edit the date/time information.
 
@@ -176,35 +698,121 @@ def make_date_time_cleaning(md, rules):
             ['booleans', 'combinations', 'nans',
             'per_column', 'sample_id', 'time_format']
 
+    date_time_formats : dict
+        Formatted distinct values of each date/time column, when md is only
+        a chunk of the metadata (decided on all chunks, see get_date_time_formats()).
+
     Returns
     -------
     md : pd.DataFrame
         Data frame with cleaned time columns.
     """
-
+    strftime_formats = get_strftime_formats(rules['time_format'].get('format'))
+    new_columns = {}
     # for each time column passed in the rules file
     if 'columns' in rules['time_format']:
         for name_col in rules['time_format']['columns']:
             if name_col in md:
-                input_col = md[name_col].copy()
-                # format using pandas function .to_datetime and eventually parse this formatting
-                if name_col.lower() == 'collection_date':
-                    input_col_dt = pd.to_datetime(input_col, infer_datetime_format=True).astype('str').copy()
-                    clean_time = ['/'.join(x.split('-')[::-1]) for x in input_col_dt]
-                elif name_col.lower() == 'collection_time':
-                    clean_time = pd.to_datetime(input_col, format='%H:%M:%S').dt.time.astype('str').copy()
-                elif name_col.lower() == 'collection_timestamp':
-                    input_col_dt = pd.to_datetime(input_col, infer_datetime_format=True).astype('str').copy()
-                    clean_time = ['%s %s' % ('/'.join(x.split()[0].split('-')[::-1]), x.split()[1]) for x in input_col_dt]
-                else:
-                    continue
-                md[name_col] = clean_time
-    return md
+                formatted = None
+                if date_time_formats is not None:
+                    formatted = date_time_formats[name_col]
+                new_columns[name_col] = make_date_time_column_cleaning(
+                    md[name_col], name_col, strftime_formats, formatted)
+    return make_columns_frame(md, new_columns)
 
 
-def make_forbidden_characters_cleaning(md_pd, sample_id_cols, forbidden_rules):
+def compile_forbidden_characters(forbidden_rules):
     """
-    Replace the characters in columns that contain characters.
+    Prepare the forbidden characters rules for the actual cleaning:
+    a single translation table when all the keys are characters,
+    or else a single regex alternation of all the keys.
+
+    Parameters
+    ----------
+    forbidden_rules : dict
+        Replacement values.
+        keys  -> e.g. '('
+        value -> e.g. '_'
+
+    Returns
+    -------
+    compiled_rules : tuple
+        ('translate', translation table) or
+        ('regex', (compiled alternation, replacements))
+    """
+    replacements = dict((str(k), str(v)) for k, v in forbidden_rules.items() if str(k))
+    if all(len(k) == 1 for k in replacements):
+        return 'translate', str.maketrans(replacements)
+    # longest keys first, for the alternation to match them first
+    keys = sorted(replacements, key=len, reverse=True)
+    return 'regex', (re.compile('|'.join(re.escape(k) for k in keys)), replacements)
+
+
+def replace_forbidden_characters(values, compiled_rules):
+    """
+    Replace the forbidden characters in each of the passed strings.
+
+    Parameters
+    ----------
+    values : list
+        Values to clean (the values that are not strings are kept).
+
+    compiled_rules : tuple
+        Rules compiled with compile_forbidden_characters().
+
+    Returns
+    -------
+    new_values : list
+        Cleaned values.
+    """
+    rule_type, rule = compiled_rules
+    if rule_type == 'translate':
+        replace = lambda x: x.translate(rule)
+    else:
+        regex, replacements = rule
+        replace = lambda x: regex.sub(lambda y: replacements[y.group()], x)
+    new_values = [replace(x) if isinstance(x, str) else x for x in values]
+    return new_values
+
+
+def make_forbidden_characters_column_cleaning(cur_col, compiled_rules):
+    """
+    Replace the forbidden characters in a column, in one pass on its distinct values.
+
+    Parameters
+    ----------
+    cur_col : pd.Series
+        Metadata column.
+
+    compiled_rules : tuple
+        Rules compiled with compile_forbidden_characters().
+
+    Returns
+    -------
+    new_col : pd.Series or np.ndarray
+        Clean column (None if no value is edited).
+    """
+    if str(cur_col.dtype) == 'object':
+        codes, uniques = pd.factorize(cur_col)
+        uniques = list(uniques)
+        new_uniques = replace_forbidden_characters(uniques, compiled_rules)
+        if new_uniques != uniques:
+            # the missing values (code -1) pick this last value
+            new_values = np.array(new_uniques + [np.nan], dtype=object)
+            return new_values[codes]
+    elif str(cur_col.dtype) == 'category':
+        # replace in the categories only
+        categories = list(cur_col.cat.categories)
+        new_categories = replace_forbidden_characters(categories, compiled_rules)
+        if new_categories != categories:
+            return recode_categories(cur_col, new_categories)
+    return None
+
+
+def make_forbidden_characters_cleaning(md_pd, sample_id_cols, forbidden_rules, workers=None):
+    """
+    Replace the forbidden characters in the columns that contain characters.
+    Each column is cleaned in one pass on its distinct values.
 
     Parameters
     ----------
@@ -213,32 +821,40 @@ def make_forbidden_characters_cleaning(md_pd, sample_id_cols, forbidden_rules):
 
     sample_id_cols : list
         Names of the columns containing the sample IDs
+        (or of any column to leave as is).
 
     forbidden_rules : dict
         Replacement values.
         keys  -> e.g. '('
         value -> e.g. '_'
+        Rules could also be already compiled with
+        compile_forbidden_characters() (e.g. from a RulePlan).
+
+    workers : ColumnWorkers
+        Workers cleaning the columns in parallel (None to clean them in turn).
 
     Returns
     -------
     md_pd : pd.DataFrame
-        Clean metadata table.
+        Clean metadata table (the same table if no column is edited).
 
     """
-    if not isinstance(forbidden_rules, dict):
+    if isinstance(forbidden_rules, tuple):
+        compiled_rules = forbidden_rules
+    elif isinstance(forbidden_rules, dict):
+        compiled_rules = compile_forbidden_characters(forbidden_rules)
+    else:
         print('Warning: object in "forbidden_characters" must be a dict')
         print(' -> no forbidden_characters cleaning...\n')
         return md_pd
 
-    md_dp_copy = md_pd.copy()
-    for col in md_pd.columns:
-        if col in sample_id_cols:
-            continue
-        if str(md_pd[col].dtype) == 'object':
-            cur_col = md_dp_copy[col]
-            for k,v in forbidden_rules.items():
-                cur_col = cur_col.replace(k,v)
-            md_dp_copy[col] = cur_col
-    return md_dp_copy
-
-
+    positions = [pos for pos, col in enumerate(md_pd.columns) if col not in sample_id_cols]
+    if workers is None:
+        new_cols = [make_forbidden_characters_column_cleaning(md_pd.iloc[:, pos], compiled_rules)
+                    for pos in positions]
+    else:
+        new_cols = workers.map_columns(make_forbidden_characters_column_cleaning, md_pd,
+                                       positions, compiled_rules)
+    new_columns = dict((md_pd.columns[pos], new_col) for pos, new_col in zip(positions, new_cols)
+                       if new_col is not None)
+    return make_columns_frame(md_pd, new_columns)
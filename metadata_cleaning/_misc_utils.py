@@ -7,6 +7,7 @@
 # The full license is in the file LICENSE.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import re
 import pandas as pd
 
 
@@ -62,4 +63,23 @@ def check_nan(md, column):
     # col_null_num = col_null.sum()
     cur_nans = set([str(x) for x in col_content[col_null]])
     col_non_null_counts = col_content[col_null==False].value_counts()
-    return cur_nans, non_nan_idx
\ No newline at end of file
+    return cur_nans, non_nan_idx
+
+
+def get_range_bounds(range_rule):
+    """
+    Parse a range rule into its min and max values.
+
+    Parameters
+    ----------
+    range_rule : str
+        Range rule, e.g. 'range(0,120)', 'range(20,None)' or 'range(,4)'.
+
+    Returns
+    -------
+    cur_range_xy : list
+        Min and max values of a range (None if no bound),
+        e.g. [0.0, 120.0], [20.0, None] or [None, 4.0]
+    """
+    return [float(x) if x.strip() not in ['', 'None'] else None
+            for x in re.split(r'\(|\)', range_rule)[1].split(',')]
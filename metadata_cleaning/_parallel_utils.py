@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# number of shards of columns per worker (the columns are not equally long to clean)
+SHARDS_PER_JOB = 4
+
+# table, function and arguments of the current task, inherited by the forked workers
+_SHARED = {}
+
+
+def run_columns_shard(function, metadata_pd, positions, args):
+    """
+    Apply a function to each column of a shard of columns.
+
+    Parameters
+    ----------
+    function : callable
+        Function of a column (pd.Series) and args.
+
+    metadata_pd : pd.DataFrame
+        Metadata table.
+
+    positions : list
+        Positions of the columns of the shard.
+
+    args : tuple
+        Other arguments of the function.
+
+    Returns
+    -------
+    results : list
+        Result of the function for each column.
+    """
+    return [function(metadata_pd.iloc[:, pos], *args) for pos in positions]
+
+
+def run_shared_columns_shard(positions):
+    """
+    Apply the function of the current task to a shard of columns
+    of its table, in a forked worker (nothing but the positions is sent).
+    """
+    function, metadata_pd, args = _SHARED['task']
+    return run_columns_shard(function, metadata_pd, positions, args)
+
+
+class ColumnWorkers(object):
+    """
+    Pool of workers applying a function to the columns of a metadata table
+    in parallel, for the cleaning steps that clean each column independently.
+
+    The columns are split in contiguous shards and the results are
+    returned in the order of the columns, i.e. as for a serial run.
+    On processes, the workers are forked with the table (whose memory is
+    then shared until written), so that only the positions of the columns
+    are sent to them and only the results are sent back.
+
+    Parameters
+    ----------
+    jobs : int
+        Number of workers.
+
+    threads : bool
+        Run on threads rather than processes: only faster when the
+        function mostly runs in numpy/pandas code releasing the GIL.
+    """
+    def __init__(self, jobs, threads=False):
+        self.jobs = max(1, int(jobs))
+        self.threads = threads
+
+    def get_shards(self, positions):
+        """
+        Split the columns in contiguous shards.
+
+        Parameters
+        ----------
+        positions : list
+            Positions of the columns.
+
+        Returns
+        -------
+        shards : list
+            Positions of the columns of each shard.
+        """
+        n_shards = min(len(positions), self.jobs * SHARDS_PER_JOB)
+        return [x.tolist() for x in np.array_split(np.asarray(positions, dtype=int), n_shards)]
+
+    def map_columns(self, function, metadata_pd, positions=None, *args):
+        """
+        Apply a function to columns of a metadata table.
+
+        Parameters
+        ----------
+        function : callable
+            Function of a column (pd.Series) and args, defined
+            at the top level of a module (to run on processes).
+
+        metadata_pd : pd.DataFrame
+            Metadata table.
+
+        positions : list
+            Positions of the columns (Default: all).
+
+        args
+            Other arguments of the function (the same for each column).
+
+        Returns
+        -------
+        results : list
+            Result of the function for each column, in order.
+        """
+        if positions is None:
+            positions = list(range(metadata_pd.shape[1]))
+        if self.jobs == 1 or len(positions) < 2:
+            return run_columns_shard(function, metadata_pd, positions, args)
+        shards = self.get_shards(positions)
+        if self.threads:
+            with ThreadPoolExecutor(self.jobs) as executor:
+                futures = [executor.submit(run_columns_shard, function, metadata_pd, x, args)
+                           for x in shards]
+                shards_results = [x.result() for x in futures]
+        elif 'fork' in multiprocessing.get_all_start_methods():
+            _SHARED['task'] = (function, metadata_pd, args)
+            try:
+                with ProcessPoolExecutor(self.jobs, multiprocessing.get_context('fork')) as executor:
+                    shards_results = list(executor.map(run_shared_columns_shard, shards))
+            finally:
+                _SHARED.pop('task')
+        else:
+            # the columns of each shard are sent to the workers
+            with ProcessPoolExecutor(self.jobs) as executor:
+                futures = [executor.submit(run_columns_shard, function, metadata_pd.iloc[:, x],
+                                           range(len(x)), args) for x in shards]
+                shards_results = [x.result() for x in futures]
+        return [result for shard_results in shards_results for result in shard_results]
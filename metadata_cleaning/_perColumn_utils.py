@@ -7,10 +7,17 @@
 # The full license is in the file LICENSE.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
-import re
+import numpy as np
 import pandas as pd
 
-from metadata_cleaning._main_utils import make_replacement_cleaning
+from metadata_cleaning._main_utils import (
+    get_replacement_aug,
+    make_replacement_cleaning,
+    recode_categories
+)
+from metadata_cleaning._misc_utils import get_range_bounds
+from metadata_cleaning._columns_utils import ColumnIndex
+from metadata_cleaning._df_utils import make_columns_frame
 
 
 def missing_decision(cur_range_xy, entry_float):
@@ -34,17 +41,143 @@ def missing_decision(cur_range_xy, entry_float):
         Whether the value is not in the range.
     """
     # check whether the current value is outside the given range
-    if not cur_range_xy[0] and entry_float > cur_range_xy[1]:
+    # (a bound of 0 is a bound, only None means no bound)
+    if cur_range_xy[0] is not None and entry_float < cur_range_xy[0]:
         return True
-    elif not cur_range_xy[1] and entry_float < cur_range_xy[0]:
-        return True
-    elif entry_float > cur_range_xy[1] or entry_float < cur_range_xy[0]:
+    elif cur_range_xy[1] is not None and entry_float > cur_range_xy[1]:
         return True
     else:
         return False
 
 
-def make_per_column_cleaning(md, name_col, sample_id_cols, ranges_or_reps, nan_value, nan_decisions):
+def get_out_of_range_numbers(values_float, cur_range_xy):
+    """
+    Get the mask of the numbers outside a range.
+
+    Parameters
+    ----------
+    values_float : np.ndarray
+        Numbers to check in range.
+
+    cur_range_xy : list
+        Min and max values of a range (inclusive).
+
+    Returns
+    -------
+    out_of_range : np.ndarray
+        Whether each number is not in the range.
+    """
+    out_of_range = np.zeros(len(values_float), dtype=bool)
+    # NaN comparisons are always False: NaN and non-numbers stay in range
+    with np.errstate(invalid='ignore'):
+        if cur_range_xy[0] is not None:
+            out_of_range |= values_float < cur_range_xy[0]
+        if cur_range_xy[1] is not None:
+            out_of_range |= values_float > cur_range_xy[1]
+    return out_of_range
+
+
+def get_out_of_range_mask(values, cur_range_xy):
+    """
+    Get the mask of the values that are numbers outside a range,
+    i.e. missing_decision() applied on all the values at once.
+
+    Parameters
+    ----------
+    values : pd.Series or pd.Index
+        Values to check in range (the values that are
+        not numbers are never out of range).
+
+    cur_range_xy : list
+        Min and max values of a range (inclusive).
+        Could be just the min: e.g. (0, None)
+              or just the max: e.g. (None, 1)
+
+    Returns
+    -------
+    out_of_range : np.ndarray
+        Whether each value is a number not in the range.
+    """
+    if values.dtype.kind in 'biuf':
+        return get_out_of_range_numbers(np.asarray(values, dtype='float64'), cur_range_xy)
+    # coerce each distinct value once (metadata values repeat a lot)
+    codes, uniques = pd.factorize(values)
+    uniques_float = np.asarray(pd.to_numeric(uniques, errors='coerce'), dtype='float64')
+    # the missing values (code -1) pick the last, always in range, value
+    out_of_range_uniques = np.append(get_out_of_range_numbers(uniques_float, cur_range_xy), False)
+    out_of_range = out_of_range_uniques[codes]
+    return out_of_range
+
+
+def make_range_cleaning(input_col, cur_range_xy, nan_value):
+    """
+    Replace the numbers of a column that are outside a range.
+
+    Parameters
+    ----------
+    input_col : pd.Series
+        Column to clean.
+
+    cur_range_xy : list
+        Min and max values of a range (inclusive).
+
+    nan_value : str
+        Value to use for replacement for NaN / declared as such
+
+    Returns
+    -------
+    output_col : pd.Series
+        Cleaned column (on the same index).
+
+    edited : bool
+        Whether some values were replaced.
+    """
+    if str(input_col.dtype) == 'category':
+        # check the categories only
+        categories = input_col.cat.categories
+        out_of_range = get_out_of_range_mask(categories, cur_range_xy)
+        if not out_of_range.any():
+            return input_col, False
+        edited = bool(input_col.isin(categories[out_of_range]).any())
+        new_values = np.where(out_of_range, nan_value, np.asarray(categories, dtype=object))
+        return recode_categories(input_col, list(new_values)), edited
+
+    out_of_range = get_out_of_range_mask(input_col, cur_range_xy)
+    if not out_of_range.any():
+        return input_col, False
+    output_col = input_col.astype('object')
+    output_col[out_of_range] = nan_value
+    return output_col, True
+
+
+def compile_per_column_rule(range_or_rep, nan_value):
+    """
+    Prepare one per-column rule for the actual cleaning.
+
+    Parameters
+    ----------
+    range_or_rep : dict or str
+        Rule as in the yaml file, i.e. a dictionary of
+        replacements or a range, e.g. 'range(0,120)'.
+
+    nan_value : str
+        Value to use for replacement for NaN / declared as such
+
+    Returns
+    -------
+    compiled_rule : tuple or None
+        ('replace', dict of the case-augmented replacements)
+        or ('range', [min, max]) or None if the rule is not recognized.
+    """
+    if isinstance(range_or_rep, dict):
+        return 'replace', get_replacement_aug(range_or_rep, nan_value)
+    elif isinstance(range_or_rep, str) and range_or_rep.startswith('range('):
+        return 'range', get_range_bounds(range_or_rep)
+    return None
+
+
+def make_per_column_cleaning(md, name_col, sample_id_cols, ranges_or_reps, nan_value, nan_decisions,
+                             column_index=None):
     """
     Execute the edit on the passed column based on either
         (i)  a dictionary of replacements
@@ -62,10 +195,12 @@ def make_per_column_cleaning(md, name_col, sample_id_cols, ranges_or_reps, nan_v
     sample_id_cols : list
         Names of the columns containing the sample IDs
 
-    ranges_or_reps : dict
+    ranges_or_reps : list
         All rules for the current columns placeholder,
-            e.g. {'age': ['range(0,120)'], ...}
+            e.g. ['range(0,120)'] for 'age'
             (could apply to age, age_cat, age_corrected)
+        Rules could also be already compiled with
+        compile_per_column_rule() (e.g. from a RulePlan).
 
     nan_value : str
         Value to use for replacement for NaN / declared as such
@@ -73,6 +208,10 @@ def make_per_column_cleaning(md, name_col, sample_id_cols, ranges_or_reps, nan_v
     nan_decisions : dict
         Dict to update with the encountered edits.
 
+    column_index : ColumnIndex
+        Lookup structure of the metadata columns
+        (built here if None).
+
     Returns
     -------
     md : pd.DataFrame
@@ -80,41 +219,37 @@ def make_per_column_cleaning(md, name_col, sample_id_cols, ranges_or_reps, nan_v
     """
     # get the columns that match the given column name
     # => TO BE SET TO PERFECT MATCH --> discussion
-    cols_to_edit = [x for x in md.columns if name_col.lower() in x.lower()]
+    if column_index is None:
+        column_index = ColumnIndex(md.columns)
+    cols_to_edit = column_index.get_containing(name_col)
+    new_columns = {}
     for col_to_edit in cols_to_edit:
-        output_copy = md[col_to_edit].copy()
+        # the rules return a new column when they edit it
+        input_col = md[col_to_edit]
+        output_col = input_col
         #  for each actual rule to apply on the column content
         for range_or_rep in ranges_or_reps:
+            if isinstance(range_or_rep, tuple):
+                compiled_rule = range_or_rep
+            else:
+                compiled_rule = compile_per_column_rule(range_or_rep, nan_value)
+            if compiled_rule is None:
+                continue
+            rule_type, rule = compiled_rule
 
             # could be simple factors replacement rule
-            if isinstance(range_or_rep, dict):
+            if rule_type == 'replace':
                 # always collect an edit value in the column (nan_decisions)
-                output_copy, nan_decisions = make_replacement_cleaning(output_copy, name_col,
-                                                                       sample_id_cols,
-                                                                       nan_decisions, nan_value,
-                                                                       range_or_rep, None)
+                output_col, nan_decisions = make_replacement_cleaning(output_col, name_col,
+                                                                      sample_id_cols,
+                                                                      nan_decisions, nan_value,
+                                                                      None, None, rule)
             # could be more complicated range check rule
-            elif range_or_rep.startswith('range('):
-                new_col = []
-                # get the range
-                cur_range_xy = [float(x) if x else None for x in
-                                re.split('\(|\)', range_or_rep)[1].split(',')]
-                # for each entry that can be compared to a numeric range
-                for entry in output_copy:
-                    try:
-                        entry_float = float(entry)
-                        # check if in/out range
-                        edit_or_not = missing_decision(cur_range_xy, entry_float)
-                        if edit_or_not:
-                            new_col.append(nan_value)
-                            # always collect an edit value in the column (nan_decisions)
-                            nan_decisions[col_to_edit].add(nan_value)
-                        else:
-                            new_col.append(entry)
-                    except ValueError:
-                        new_col.append(entry)
-                # get the edited column as a pandas Series
-                output_copy = pd.Series(new_col)
-        # put back the edited column
-        md[col_to_edit] = output_copy
-    return md, nan_decisions
+            elif rule_type == 'range':
+                output_col, edited = make_range_cleaning(output_col, rule, nan_value)
+                if edited:
+                    # always collect an edit value in the column (nan_decisions)
+                    nan_decisions[col_to_edit].add(nan_value)
+        if output_col is not input_col:
+            new_columns[col_to_edit] = output_col
+    return make_columns_frame(md, new_columns), nan_decisions
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import re
+
+from metadata_cleaning._main_utils import (
+    get_replacement_aug,
+    compile_forbidden_characters
+)
+from metadata_cleaning._perColumn_utils import compile_per_column_rule
+from metadata_cleaning._combis_utils import get_combinations_rule_details
+from metadata_cleaning._dtypes_utils import make_regex_from_nan_value
+
+
+class RulePlan(object):
+    """
+    Cleaning rules compiled once, to be applied to any number
+    of metadata tables without parsing the rules again.
+
+    Parameters
+    ----------
+    rules : dict
+        All rules as returned by parse_yaml_file().
+
+    nan_value : str
+        Value to use for replacement for NaN / declared as such.
+
+    Attributes
+    ----------
+    replacements : dict
+        key    -> 'nans' or 'booleans'
+        value  -> replacements augmented with the lower/upper cases
+
+    per_column : dict
+        key    -> per_column rule name, e.g. 'age'
+        value  -> compiled rules, e.g. [('range', [0.0, 120.0])]
+
+    combinations : dict
+        key    -> combination, e.g. ('age', 'alcohol_consumption')
+        value  -> conditions parsed by get_combinations_rule_details(),
+                  e.g. {'age': ('in', 0.0, 4.0),
+                        'alcohol_consumption': ('is', True, None)}
+
+    forbidden_characters : tuple or None
+        Rules compiled by compile_forbidden_characters(),
+        e.g. ('translate', {40: '_', 41: '_'})
+
+    regex_nan : re.Pattern
+        Compiled regex allowing finding persistent NaN values.
+    """
+    def __init__(self, rules, nan_value):
+        self.rules = rules
+        self.nan_value = nan_value
+
+        self.replacements = {}
+        for rule in ['nans', 'booleans']:
+            if rule in rules:
+                self.replacements[rule] = get_replacement_aug(rules[rule], nan_value)
+
+        self.per_column = {}
+        for name_col, ranges_or_reps in rules.get('per_column', {}).items():
+            compiled_rules = [compile_per_column_rule(x, nan_value) for x in ranges_or_reps]
+            self.per_column[name_col] = [x for x in compiled_rules if x is not None]
+
+        self.combinations = {}
+        for combination, conditions_decision in rules.get('combinations', {}).items():
+            self.combinations[combination] = get_combinations_rule_details(
+                combination, conditions_decision[0])
+
+        self.forbidden_characters = None
+        if isinstance(rules.get('forbidden_characters'), dict):
+            self.forbidden_characters = compile_forbidden_characters(
+                rules['forbidden_characters'])
+
+        self.regex_nan = re.compile(make_regex_from_nan_value(nan_value))
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+import time
+import tracemalloc
+import pandas as pd
+
+MB = 1024. * 1024.
+
+
+def get_cells_hashes(metadata_pd, columns=None):
+    """
+    Hash the cells of a metadata table as text (the missing values
+    apart), to count the cells edited by a cleaning stage or rule.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Metadata table.
+
+    columns : list
+        Columns to hash (Default: all columns).
+
+    Returns
+    -------
+    hashes : dict
+        key    -> column
+        value  -> hashes of the cells (np.array of uint64)
+    """
+    hashes = {}
+    if columns is None:
+        columns = metadata_pd.columns
+    for col in columns:
+        if col not in metadata_pd.columns:
+            continue
+        cur_col = metadata_pd[col]
+        if isinstance(cur_col, pd.DataFrame):
+            # duplicated column names
+            continue
+        cells_hashes = pd.util.hash_array(cur_col.astype('str').to_numpy(dtype=object))
+        cells_hashes[cur_col.isna().to_numpy()] = 0
+        hashes[col] = cells_hashes
+    return hashes
+
+
+def count_edited_cells(hashes_in, hashes_out):
+    """
+    Count the cells whose hash changed.
+
+    Parameters
+    ----------
+    hashes_in : dict
+        Hashes of the cells before the cleaning stage or rule.
+
+    hashes_out : dict
+        Hashes of the cells after the cleaning stage or rule.
+
+    Returns
+    -------
+    edited : int
+        Number of edited cells (in the columns present before and after).
+    """
+    edited = 0
+    for col, cells_hashes in hashes_out.items():
+        if col in hashes_in and hashes_in[col].shape == cells_hashes.shape:
+            edited += int((hashes_in[col] != cells_hashes).sum())
+    return edited
+
+
+class CleaningProfile(object):
+    """
+    Wall time, CPU time and peak memory (traced by tracemalloc) of the
+    cleaning stages and of the rules within them, with the number of
+    rows/columns and of cells edited. The stages recorded many times
+    (e.g. once per chunk) are summed up.
+
+    The hashing of the cells to count the edits is not timed, but
+    tracemalloc slows down the cleaning itself.
+
+    Parameters
+    ----------
+    count_edits : bool
+        Count the cells edited by each stage and rule.
+
+    trace_memory : bool
+        Trace the peak memory (e.g. False to only time the stages).
+
+    Attributes
+    ----------
+    stages : list
+        Records of the stages (in order), each with the records
+        of its rules in 'rules'.
+
+    records : dict
+        key    -> (stage, rule)
+        value  -> record
+    """
+    def __init__(self, count_edits=True, trace_memory=True):
+        self.count_edits = count_edits
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.records = {}
+        self.opened = []
+        self.started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self.peak = self.get_traced_memory()[1]
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+    def get_record(self, stage, rule=None):
+        """
+        Get the record of a stage or of a rule within a stage.
+
+        Parameters
+        ----------
+        stage : str
+            Cleaning stage, e.g. 'per_column'.
+
+        rule : str or tuple
+            Rule of the stage, e.g. 'age' (Default: the stage itself).
+
+        Returns
+        -------
+        record : dict
+            Record of the stage or rule (created if new).
+        """
+        key = (stage, None if rule is None else repr(rule))
+        if key not in self.records:
+            record = {'stage': stage}
+            if rule is not None:
+                record = {'rule': list(rule) if isinstance(rule, tuple) else rule}
+            record.update({'calls': 0, 'wall_time_s': 0., 'cpu_time_s': 0.,
+                           'peak_memory_mb': 0., 'rows_in': 0, 'columns_in': 0,
+                           'rows_out': 0, 'columns_out': 0, 'cells_edited': 0})
+            if rule is None:
+                record['rules'] = []
+                self.stages.append(record)
+            else:
+                self.get_record(stage)['rules'].append(record)
+            self.records[key] = record
+        return self.records[key]
+
+    def get_traced_memory(self):
+        """
+        Get the current and peak memory traced (zeros if not tracing).
+        """
+        if not self.trace_memory:
+            return 0, 0
+        return tracemalloc.get_traced_memory()
+
+    def add_overhead(self, wall, cpu):
+        """
+        Remove the time spent in the profiling from the opened stages.
+        """
+        for opened in self.opened:
+            opened['wall'] += wall
+            opened['cpu'] += cpu
+
+    def update_peaks(self):
+        """
+        Keep the peak memory traced so far in the opened stages,
+        before the tracemalloc peak is reset for a new stage.
+        """
+        peak = self.get_traced_memory()[1]
+        self.peak = max(self.peak, peak)
+        for opened in self.opened:
+            opened['peak'] = max(opened['peak'], peak)
+
+    def start(self, stage, metadata_pd=None, rule=None, columns=None, count_edits=True):
+        """
+        Start recording a cleaning stage or rule.
+
+        Parameters
+        ----------
+        stage : str
+            Cleaning stage, e.g. 'per_column'.
+
+        metadata_pd : pd.DataFrame
+            Metadata table before the stage (if any).
+
+        rule : str or tuple
+            Rule of the stage, e.g. 'age' (Default: the stage itself).
+
+        columns : list
+            Columns that the stage or rule may edit (Default: all columns).
+
+        count_edits : bool
+            Count the cells edited (if the profile counts them).
+
+        Returns
+        -------
+        opened : dict
+            Opened record to pass to stop().
+        """
+        wall, cpu = time.perf_counter(), time.process_time()
+        opened = {'record': self.get_record(stage, rule), 'hashes': None}
+        if metadata_pd is not None:
+            opened['record']['rows_in'] += metadata_pd.shape[0]
+            opened['record']['columns_in'] = metadata_pd.shape[1]
+            if self.count_edits and count_edits:
+                opened['hashes'] = get_cells_hashes(metadata_pd, columns)
+        self.update_peaks()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        opened['memory'], opened['peak'] = self.get_traced_memory()
+        self.add_overhead(time.perf_counter() - wall, time.process_time() - cpu)
+        self.opened.append(opened)
+        opened['wall'], opened['cpu'] = time.perf_counter(), time.process_time()
+        return opened
+
+    def stop(self, opened, metadata_pd=None, call=True):
+        """
+        Stop recording a cleaning stage or rule.
+
+        Parameters
+        ----------
+        opened : dict
+            Opened record returned by start().
+
+        metadata_pd : pd.DataFrame
+            Metadata table after the stage (if any).
+
+        call : bool
+            Count a call of the stage (False for e.g.
+            the end of a file read by chunks).
+        """
+        wall, cpu = time.perf_counter(), time.process_time()
+        self.opened.remove(opened)
+        record = opened['record']
+        record['calls'] += int(call)
+        record['wall_time_s'] += wall - opened['wall']
+        record['cpu_time_s'] += cpu - opened['cpu']
+        opened['peak'] = max(opened['peak'], self.get_traced_memory()[1])
+        record['peak_memory_mb'] = max(record['peak_memory_mb'],
+                                       (opened['peak'] - opened['memory']) / MB)
+        self.update_peaks()
+        if metadata_pd is not None:
+            record['rows_out'] += metadata_pd.shape[0]
+            record['columns_out'] = metadata_pd.shape[1]
+            if opened['hashes'] is not None:
+                record['cells_edited'] += count_edited_cells(
+                    opened['hashes'], get_cells_hashes(metadata_pd, list(opened['hashes'])))
+        self.add_overhead(time.perf_counter() - wall, time.process_time() - cpu)
+
+    def iterate(self, stage, chunks):
+        """
+        Record the reading of each chunk of a metadata file.
+
+        Parameters
+        ----------
+        stage : str
+            Stage of the reading, e.g. 'read'.
+
+        chunks : iterable
+            Chunks of the metadata table.
+
+        Yields
+        ------
+        chunk : pd.DataFrame
+            Chunk of the metadata table.
+        """
+        chunks = iter(chunks)
+        while True:
+            opened = self.start(stage)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                self.stop(opened, call=False)
+                return
+            self.stop(opened, chunk)
+            yield chunk
+
+    def get_report(self, **info):
+        """
+        Get the profiling report.
+
+        Parameters
+        ----------
+        info
+            Other items of the report, e.g. the metadata file.
+
+        Returns
+        -------
+        report : dict
+            Total wall time, CPU time and peak memory,
+            the passed items and the records of the stages.
+        """
+        self.update_peaks()
+        report = {
+            'wall_time_s': time.perf_counter() - self.wall,
+            'cpu_time_s': time.process_time() - self.cpu,
+            'peak_memory_mb': self.peak / MB
+        }
+        report.update(info)
+        report['stages'] = self.stages
+        return report
+
+    def write(self, profile_fp, **info):
+        """
+        Write the profiling report as JSON (and stop tracing the memory).
+
+        Parameters
+        ----------
+        profile_fp : str
+            Path to the output JSON file.
+
+        info
+            Other items of the report, e.g. the metadata file.
+
+        Returns
+        -------
+        profile_fp : str
+            Path to the output JSON file.
+        """
+        report = self.get_report(**info)
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        with open(profile_fp, 'w') as o:
+            json.dump(report, o, indent=2)
+        return profile_fp
+
+
+def start_stage(profile, stage, metadata_pd=None, rule=None, columns=None, count_edits=True):
+    """
+    Start recording a cleaning stage or rule, if profiling.
+
+    Parameters
+    ----------
+    profile : CleaningProfile
+        Profile of the cleaning (None if not profiling).
+
+    (same as CleaningProfile.start())
+
+    Returns
+    -------
+    opened : dict
+        Opened record to pass to stop_stage() (None if not profiling).
+    """
+    if profile is None:
+        return None
+    return profile.start(stage, metadata_pd, rule, columns, count_edits)
+
+
+def stop_stage(profile, opened, metadata_pd=None):
+    """
+    Stop recording a cleaning stage or rule, if profiling.
+
+    Parameters
+    ----------
+    profile : CleaningProfile
+        Profile of the cleaning (None if not profiling).
+
+    opened : dict
+        Opened record returned by start_stage().
+
+    metadata_pd : pd.DataFrame
+        Metadata table after the stage (if any).
+    """
+    if profile is not None:
+        profile.stop(opened, metadata_pd)
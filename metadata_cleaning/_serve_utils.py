@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import json
+import time
+import socket
+import getpass
+import hashlib
+import tempfile
+import threading
+import socketserver
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# only the standard library is imported here, for a fast client: the
+# cleaning modules (pandas, numpy) are imported by the server and its workers
+SOCKET_FP = os.path.join(tempfile.gettempdir(), 'metadata_cleaning-%s.sock' % getpass.getuser())
+
+# options of a clean job read with the metadata file (the others are cleaning options)
+READ_OPTIONS = ['categorical_ratio', 'input_format', 'reader']
+
+
+def send_request(request, socket_fp=None, timeout=None):
+    """
+    Send a request to the cleaning server and wait for its response.
+    The requests and responses are JSON objects on one line, one per connection.
+
+    Parameters
+    ----------
+    request : dict
+        Request, with its 'command' ('clean', 'ping' or 'shutdown').
+
+    socket_fp : str
+        Path to the Unix socket of the server (Default: SOCKET_FP).
+
+    timeout : float
+        Seconds to wait for the response (Default: no limit).
+
+    Returns
+    -------
+    response : dict
+        Response of the server.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_fp or SOCKET_FP)
+        sock.sendall(('%s\n' % json.dumps(request)).encode('utf-8'))
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError('No response from the cleaning server.')
+    return json.loads(line.decode('utf-8'))
+
+
+def make_clean_job(metadata_fp, rules_fp, output_fp=None, **options):
+    """
+    Make the request to clean a metadata file, with absolute paths
+    as the server may not run from the same folder.
+
+    Parameters
+    ----------
+    metadata_fp : str
+        Path to the metadata file.
+
+    rules_fp : str
+        Path to the rules file.
+
+    output_fp : str
+        Path to the output metadata file (Default: next to the metadata file).
+
+    options
+        Options of the cleaning commands (e.g. "no_nans=True").
+
+    Returns
+    -------
+    job : dict
+        Request of the cleaning.
+    """
+    if options.get('cache_dir'):
+        options['cache_dir'] = os.path.abspath(options['cache_dir'])
+    if options.get('sample_id'):
+        options['sample_id'] = list(options['sample_id'])
+    return {'command': 'clean', 'metadata_fp': os.path.abspath(metadata_fp),
+            'rules_fp': os.path.abspath(rules_fp),
+            'output_fp': os.path.abspath(output_fp) if output_fp else None,
+            'options': options}
+
+
+class RulesStore(object):
+    """
+    Rules parsed and compiled by the server, cached by the hash of the
+    content of the rules file and reloaded when the file is modified.
+
+    Attributes
+    ----------
+    loads : int
+        Number of rules files parsed and compiled.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # path -> ((mtime, size), hash)
+        self.files = {}
+        # hash -> (rules, na_value, nan_value_user, sample_id_cols, plan)
+        self.plans = {}
+        self.loads = 0
+
+    def get(self, rules_fp):
+        """
+        Get the parsed and compiled rules of a rules file.
+
+        Parameters
+        ----------
+        rules_fp : str
+            Path to the rules file.
+
+        Returns
+        -------
+        rules_hash : str
+            Hash of the content of the rules file.
+
+        rules_entry : tuple
+            Parsed rules (from parse_yaml_file()) and RulePlan.
+        """
+        from metadata_cleaning._yaml_utils import parse_yaml_file
+        from metadata_cleaning._plan_utils import RulePlan
+
+        with self.lock:
+            stat = os.stat(rules_fp)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if rules_fp in self.files and self.files[rules_fp][0] == signature:
+                rules_hash = self.files[rules_fp][1]
+                return rules_hash, self.plans[rules_hash]
+            with open(rules_fp, 'rb') as f:
+                rules_hash = hashlib.sha256(f.read()).hexdigest()
+            if rules_hash not in self.plans:
+                rules, na_value, nan_value_user, sample_id_cols = parse_yaml_file(rules_fp)
+                self.plans[rules_hash] = (rules, na_value, nan_value_user, sample_id_cols,
+                                          RulePlan(rules, na_value))
+                self.loads += 1
+            self.files[rules_fp] = (signature, rules_hash)
+            # forget the plans of the previous versions of the rules files
+            used = set(x[1] for x in self.files.values())
+            for old_hash in [x for x in self.plans if x not in used]:
+                del self.plans[old_hash]
+            return rules_hash, self.plans[rules_hash]
+
+
+def run_clean_job(job, rules_entry):
+    """
+    Clean a metadata file for the server (in a worker process).
+
+    Parameters
+    ----------
+    job : dict
+        Request of the cleaning (from make_clean_job()).
+
+    rules_entry : tuple
+        Parsed rules and RulePlan (from RulesStore.get()).
+
+    Returns
+    -------
+    status : dict
+        Status of the cleaning (see clean_metadata_file()).
+    """
+    from metadata_cleaning._batch_utils import make_cleaning_args, clean_metadata_file
+
+    options = dict(job['options'])
+    read_options = dict((x, options.pop(x, None)) for x in READ_OPTIONS)
+    cleaning_args = make_cleaning_args(*rules_entry, **options)
+    return clean_metadata_file(job['metadata_fp'], job['output_fp'], cleaning_args,
+                               read_options['categorical_ratio'], read_options['input_format'],
+                               read_options['reader'])
+
+
+class CleaningRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handle one request to the cleaning server.
+    """
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line.decode('utf-8'))
+            response = self.server.respond(request)
+        except Exception as e:
+            response = {'status': 'failed', 'error': '%s: %s' % (type(e).__name__, e)}
+        self.wfile.write(('%s\n' % json.dumps(response, default=str)).encode('utf-8'))
+
+
+class CleaningServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Local server cleaning metadata files on a pool of worker processes,
+    with the rules kept parsed and compiled between the requests.
+
+    Parameters
+    ----------
+    socket_fp : str
+        Path to the Unix socket to listen on.
+
+    jobs : int
+        Number of worker processes.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_fp, jobs=1):
+        self.socket_fp = socket_fp
+        self.rules_store = RulesStore()
+        self.jobs = jobs
+        methods = multiprocessing.get_all_start_methods()
+        # the workers are not forked from the threads of the server
+        self.context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+        self.executor = ProcessPoolExecutor(max_workers=jobs, mp_context=self.context)
+        self.executor_lock = threading.Lock()
+        self.jobs_done = 0
+        socketserver.ThreadingUnixStreamServer.__init__(self, socket_fp, CleaningRequestHandler)
+
+    def respond(self, request):
+        """
+        Run a request and get its response.
+
+        Parameters
+        ----------
+        request : dict
+            Request, with its 'command'.
+
+        Returns
+        -------
+        response : dict
+            Status of the cleaning for 'clean'.
+        """
+        command = request.get('command')
+        if command == 'ping':
+            return {'status': 'done', 'pid': os.getpid(), 'jobs_done': self.jobs_done,
+                    'rules_loads': self.rules_store.loads}
+        if command == 'shutdown':
+            threading.Thread(target=self.shutdown).start()
+            return {'status': 'done'}
+        if command != 'clean':
+            raise ValueError('Unknown command "%s"' % command)
+        start = time.time()
+        rules_hash, rules_entry = self.rules_store.get(request['rules_fp'])
+        status = self.run_job(request, rules_entry)
+        self.jobs_done += 1
+        print('%s\t%s\t%s\t%ss' % (status['status'], request['metadata_fp'], rules_hash[:12],
+                                   round(time.time() - start, 3)), flush=True)
+        return status
+
+    def run_job(self, request, rules_entry):
+        """
+        Run a clean job on the pool of worker processes. If a worker
+        dies (e.g. killed when out of memory), the pool is broken for all
+        its jobs: it is replaced by a new pool for the next requests, and
+        the job is run again in a process of its own, so that only the job
+        that kills its process fails.
+
+        Parameters
+        ----------
+        request : dict
+            Request of the cleaning (from make_clean_job()).
+
+        rules_entry : tuple
+            Parsed rules and RulePlan (from RulesStore.get()).
+
+        Returns
+        -------
+        status : dict
+            Status of the cleaning (see clean_metadata_file()).
+        """
+        executor = self.executor
+        try:
+            return executor.submit(run_clean_job, request, rules_entry).result()
+        except BrokenProcessPool:
+            with self.executor_lock:
+                # once for all the jobs of the broken pool
+                if self.executor is executor:
+                    print('worker process terminated: new pool of workers', flush=True)
+                    self.executor = ProcessPoolExecutor(max_workers=self.jobs, mp_context=self.context)
+                    executor.shutdown(wait=False)
+        with ProcessPoolExecutor(max_workers=1, mp_context=self.context) as alone:
+            try:
+                return alone.submit(run_clean_job, request, rules_entry).result()
+            except BrokenProcessPool as e:
+                from metadata_cleaning._batch_utils import get_failed_status
+                return get_failed_status(request['metadata_fp'], e)
+
+    def server_close(self):
+        socketserver.ThreadingUnixStreamServer.server_close(self)
+        self.executor.shutdown()
+        if os.path.exists(self.socket_fp):
+            os.remove(self.socket_fp)
+
+
+def make_server(socket_fp=None, jobs=1):
+    """
+    Make the cleaning server, replacing the socket
+    of a previous server that did not stop properly.
+
+    Parameters
+    ----------
+    socket_fp : str
+        Path to the Unix socket to listen on (Default: SOCKET_FP).
+
+    jobs : int
+        Number of worker processes.
+
+    Returns
+    -------
+    server : CleaningServer
+        Server, to run with serve_forever().
+    """
+    socket_fp = socket_fp or SOCKET_FP
+    if os.path.exists(socket_fp):
+        try:
+            send_request({'command': 'ping'}, socket_fp, timeout=5)
+        except (OSError, ValueError):
+            os.remove(socket_fp)
+        else:
+            raise OSError('A cleaning server is already listening on "%s"' % socket_fp)
+    return CleaningServer(socket_fp, jobs)
@@ -8,7 +8,6 @@
 # ----------------------------------------------------------------------------
 import os
 import yaml
-import numpy as np
 from yaml.scanner import ScannerError
 
 
@@ -90,7 +89,8 @@ def get_nan_value_and_sample_id_cols(rules):
     if 'na_value' in rules:
         nan_value = rules['na_value']
     else:
-        nan_value = np.nan
+        # np.nan, without importing numpy to read the rules
+        nan_value = float('nan')
     return nan_value
 
 
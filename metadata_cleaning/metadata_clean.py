@@ -13,20 +13,44 @@
 # ----------------------------------------------------------------------------
 
 import os, sys
+import tempfile
+import pandas as pd
+import numpy as np
+from collections import Counter
 
 from metadata_cleaning._df_utils import (
-    write_outputs
+    write_outputs,
+    make_object_columns,
+    make_columns_frame,
+    get_read_kinds,
+    merge_read_kinds,
+    get_read_dtypes,
+    read_metadata_chunks,
+    spill_chunk,
+    read_spilled_chunks,
+    append_outputs,
+    get_outputs_fps,
+    get_profile_fp,
+    get_state_fp,
+    get_table_format,
+    write_tsv_outputs
 )
 
 from metadata_cleaning._main_utils import (
-    make_replacement_cleaning,
+    make_nans_booleans_cleaning,
     make_sample_id_cleaning,
     make_date_time_cleaning,
+    get_unique_datetimes,
+    get_date_time_formats,
     make_forbidden_characters_cleaning,
 )
 
 from metadata_cleaning._dtypes_utils import (
-    make_solve_dtypes_cleaning
+    make_solve_dtypes_cleaning,
+    get_dtypes_final_and_unks,
+    merge_dtypes_final,
+    show_certainly_NaNs,
+    apply_dtypes_final
 )
 
 from metadata_cleaning._perColumn_utils import (
@@ -34,41 +58,310 @@ from metadata_cleaning._perColumn_utils import (
 )
 
 from metadata_cleaning._combis_utils import (
+    get_decision,
     make_combinations_cleaning
 )
 
+from metadata_cleaning._yaml_utils import (
+    parse_yaml_file
+)
 
-def metadata_clean(
+from metadata_cleaning._plan_utils import (
+    RulePlan
+)
+
+from metadata_cleaning._columns_utils import (
+    ColumnIndex
+)
+
+from metadata_cleaning._profile_utils import (
+    CleaningProfile,
+    start_stage,
+    stop_stage
+)
+
+from metadata_cleaning._cache_utils import (
+    ColumnCache,
+    get_column_content_hash,
+    get_column_rules,
+    get_column_rules_hash
+)
+
+from metadata_cleaning._parallel_utils import (
+    ColumnWorkers
+)
+
+from metadata_cleaning._incremental_utils import (
+    get_rules_hash,
+    get_rows_fingerprints,
+    get_ids_summary,
+    merge_ids_summaries,
+    get_new_ids_counts,
+    read_state,
+    write_state,
+    get_nan_decisions_key
+)
+
+
+def clean_nans_booleans(
+        metadata_pd,
+        rules,
+        no_booleans,
+        no_nans,
+        nan_value,
+        sample_id_cols,
+        nan_decisions,
+        plan
+):
+    """
+    Replace the values of the "nans" and "booleans" rules.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Metadata table.
+
+    rules : dict
+        All rules in the following keys:
+            ['booleans', 'combinations', 'nans', 'del_columns', 'forbidden_characters', 'na_value',
+             'solve_dtypes', 'per_column', 'sample_id', 'time_format'] (or more to come...)
+
+    no_booleans : bool
+        Boolean to not replace the True/False ("booleans" rules).
+
+    no_nans : bool
+        Boolean to not clean the values of "nans" ("nans" rules).
+
+    nan_value : str
+        Value to use for replacement for NaN / declared as such.
+
+    sample_id_cols : list
+        Names of the columns containing the sample IDs
+
+    nan_decisions : dict
+        Dict to update with the encountered edits.
+
+    plan : RulePlan
+        Compiled rules.
+
+    Returns
+    -------
+    metadata_pd : pd.DataFrame
+        Metadata table with cleaned NaNs and booleans.
+
+    nan_decisions : dict
+        Updated dict of the encountered edits.
+    """
+    replacements_aug = []
+    for rule in ['nans', 'booleans']:
+        if rule in rules:
+            if rule == 'booleans' and no_booleans:
+                continue
+            if rule == 'nans' and no_nans:
+                continue
+            replacements_aug.append(plan.replacements[rule])
+    if 'booleans' in rules and not no_booleans:
+        booleans_aug = plan.replacements['booleans']
+    else:
+        booleans_aug = {}
+
+    new_columns = {}
+    for name_col in metadata_pd.columns:
+        nan_decisions.setdefault(name_col, set())
+        nan_decisions.setdefault(name_col.lower(), set())
+        input_col = metadata_pd[name_col]
+        # clean NaNs or Yes/No
+        output_col, nan_decisions = make_nans_booleans_cleaning(
+            input_col,
+            name_col,
+            sample_id_cols,
+            nan_decisions,
+            replacements_aug,
+            booleans_aug
+        )
+        if output_col is not input_col:
+            new_columns[name_col] = output_col
+
+    return make_columns_frame(metadata_pd, new_columns), nan_decisions
+
+
+def clean_column(
+        input_col,
+        rules,
+        no_booleans,
+        no_nans,
+        no_per_column,
+        no_time_format,
+        nan_value,
+        sample_id_cols,
+        rules_keys,
+        plan,
+        show
+):
+    """
+    Run the cleaning steps that only depend on the content of a column
+    (see clean_columns()) on one column.
+
+    Parameters
+    ----------
+    input_col : pd.Series
+        Metadata column.
+
+    rules_keys : list
+        Names of the "per_column" rules that are also names
+        of columns (the rules edit the decisions of these keys).
+
+    (others same as clean_nans_booleans() and clean_rows())
+
+    Returns
+    -------
+    output_col : pd.Series
+        Cleaned column (None if no step edits the column).
+
+    nan_decisions : dict
+        Values decided as NaN while cleaning the column
+        (for the keys with decisions only).
+    """
+    name_col = input_col.name
+    input_pd = input_col.to_frame()
+    column_decisions = dict((x, set()) for x in [name_col, name_col.lower()] + rules_keys)
+    column_pd, column_decisions = clean_nans_booleans(
+        input_pd, rules, no_booleans, no_nans, nan_value,
+        sample_id_cols, column_decisions, plan)
+    column_pd = make_sample_id_cleaning(
+        column_pd, sample_id_cols, rules['sample_id'], show)
+    if 'time_format' in rules and not no_time_format:
+        column_pd = make_date_time_cleaning(column_pd, rules)
+    if 'per_column' in rules and not no_per_column:
+        column_index = ColumnIndex(column_pd.columns)
+        for name_rule, ranges_or_reps in plan.per_column.items():
+            column_pd, column_decisions = make_per_column_cleaning(
+                column_pd, name_rule, sample_id_cols, ranges_or_reps,
+                nan_value, column_decisions, column_index)
+    # the steps return the same table when they do not edit the column
+    output_col = None if column_pd is input_pd else column_pd[name_col]
+    return output_col, dict((x, y) for x, y in column_decisions.items() if y)
+
+
+def clean_columns(
+        metadata_pd,
         rules,
         no_booleans,
+        no_nans,
+        no_per_column,
+        no_time_format,
+        nan_value,
+        sample_id_cols,
+        plan,
+        show,
+        cache=None,
+        workers=None
+):
+    """
+    Run the cleaning steps that only depend on the content of each column,
+    i.e. "nans", "booleans", "sample_id", "time_format" and "per_column",
+    column by column: the columns already cleaned with the same content and
+    the same rules are read from the cache (except the sample IDs columns,
+    always cleaned), the others are cleaned (in parallel if there are
+    workers) and added to the cache.
+
+    Parameters
+    ----------
+    (same as clean_nans_booleans() and clean_rows())
+
+    cache : ColumnCache
+        Cache of the cleaned columns (None for no cache).
+
+    workers : ColumnWorkers
+        Workers cleaning the columns in parallel (None to clean them in turn).
+
+    Returns
+    -------
+    metadata_pd : pd.DataFrame
+        Metadata table with cleaned columns.
+
+    nan_decisions : dict
+        Dict of the encountered edits.
+    """
+    # the keys of the decisions are set as when cleaning the entire table
+    decisions_keys = [x for col in metadata_pd.columns for x in [col, col.lower()]]
+    nan_decisions = dict((x, set()) for x in decisions_keys)
+    rules_keys = []
+    if 'per_column' in rules and not no_per_column:
+        rules_keys = [x for x in plan.per_column if x in nan_decisions]
+    hits = cache.hits if cache is not None else 0
+    keys, entries = {}, {}
+    for pos, name_col in enumerate(metadata_pd.columns):
+        if cache is not None and name_col not in sample_id_cols:
+            column_rules = get_column_rules(name_col, rules, no_booleans, no_nans,
+                                            no_per_column, no_time_format, nan_value, plan)
+            keys[pos] = '%s_%s' % (get_column_content_hash(metadata_pd.iloc[:, pos]),
+                                   get_column_rules_hash(column_rules))
+            entry = cache.get(keys[pos])
+            if entry is not None:
+                entries[pos] = entry
+    to_clean = [x for x in range(metadata_pd.shape[1]) if x not in entries]
+    clean_args = (rules, no_booleans, no_nans, no_per_column, no_time_format,
+                  nan_value, sample_id_cols, rules_keys, plan, show)
+    if workers is None:
+        results = [clean_column(metadata_pd.iloc[:, x], *clean_args) for x in to_clean]
+    else:
+        results = workers.map_columns(clean_column, metadata_pd, to_clean, *clean_args)
+    for pos, (output_col, column_decisions) in zip(to_clean, results):
+        entries[pos] = {'column': output_col, 'nan_decisions': column_decisions}
+        if pos in keys:
+            if output_col is None:
+                output_col = metadata_pd.iloc[:, pos]
+            cache.put(keys[pos], output_col, column_decisions)
+    output_cols = {}
+    for pos, name_col in enumerate(metadata_pd.columns):
+        entry = entries[pos]
+        if entry['column'] is not None:
+            output_cols[name_col] = entry['column']
+        for decisions_key, decisions in entry['nan_decisions'].items():
+            nan_decisions.setdefault(decisions_key, set()).update(decisions)
+    # one table made at once, rather than one column at a time
+    metadata_pd = make_columns_frame(metadata_pd, output_cols)
+    if cache is not None:
+        cache.evict()
+        if show:
+            print('columns read from the cache: %s (of %s)' % (
+                cache.hits - hits, metadata_pd.shape[1]))
+    return metadata_pd, nan_decisions
+
+
+def clean_rows(
+        metadata_pd,
+        rules,
         no_combinations,
         no_del_columns,
         no_forbidden_characters,
-        no_nans,
         no_per_column,
-        no_solve_dtypes,
         no_time_format,
         nan_value,
-        nan_value_user,
         sample_id_cols,
-        metadata_pd,
-        metadata_fp,
-        output_fp=None,
-        show=True
+        nan_decisions,
+        plan,
+        show,
+        profile=None,
+        column_steps=True,
+        workers=None,
+        date_time_formats=None
 ):
     """
-    Main command running the cleaning.
+    Run the cleaning steps that only depend on the content of each row, i.e.
+    "time_format", "per_column", "combinations", "del_columns" and "forbidden_characters".
 
     Parameters
     ----------
+    metadata_pd : pd.DataFrame
+        Metadata table.
+
     rules : dict
         All rules in the following keys:
             ['booleans', 'combinations', 'nans', 'del_columns', 'forbidden_characters', 'na_value',
              'solve_dtypes', 'per_column', 'sample_id', 'time_format'] (or more to come...)
 
-    no_booleans : bool
-        Boolean to not replace the True/False ("booleans" rules).
-
     no_combinations : bool
         Boolean to not check the conditions of combinations ("combinations" rules).
 
@@ -78,152 +371,1052 @@ def metadata_clean(
     no_forbidden_characters : bool
         Boolean to not replace the given forbidden characters ("forbidden_characters" rules).
 
-    no_nans : bool
-        Boolean to not clean the values of "nans" ("nans" rules).
-
     no_per_column : bool
         Boolean to not apply the per-column rules ("per_column" rules).
 
-    no_solve_dtypes : bool
-        Boolean to not check the dtypes of the columns ("solve_dtypes" rule).
-
     no_time_format : bool
         Boolean to not clean the formatting of the time/date ("time_format" rule).
 
     nan_value : str
         Value to use for replacement for NaN / declared as such.
 
-    nan_value_user : str
-        Value to use for replacement for NaN declared by user.
-
     sample_id_cols : list
         Names of the columns containing the sample IDs
 
-    metadata_pd : pd.DataFrame
-        Metadata table.
-
-    metadata_fp : str
-        Input file path
+    nan_decisions : dict
+        Dict to update with the encountered edits.
 
-    output_fp : str
-        Output file path
+    plan : RulePlan
+        Compiled rules.
 
     show : bool
         Activate verbose.
 
+    profile : CleaningProfile
+        Profile recording each step and rule (None if not profiling).
+
+    column_steps : bool
+        Run "time_format" and "per_column" (False if they
+        were already run column by column, see clean_columns()).
+
+    workers : ColumnWorkers
+        Workers cleaning the columns in parallel in "forbidden_characters".
+
+    date_time_formats : dict
+        Formatted distinct values of each date/time column, when
+        metadata_pd is only a chunk (see get_date_time_formats()).
+
     Returns
     -------
     metadata_pd : pd.DataFrame
-        final metadata table with updated dtypes
-    """
-
-    nan_decisions = {}
-    for name_col in metadata_pd.columns:
-        nan_decisions[name_col] = set()
-        nan_decisions[name_col.lower()] = set()
-        input_col = metadata_pd[name_col]
-        # clean NaNs or Yes/No
-        for rule in ['nans', 'booleans']:
-            if rule in rules:
-                if rule == 'booleans' and no_booleans:
-                    continue
-                if rule == 'nans' and no_nans:
-                    continue
-                output_col, nan_decisions = make_replacement_cleaning(
-                    input_col,
-                    name_col,
-                    sample_id_cols,
-                    nan_decisions,
-                    nan_value,
-                    rules,
-                    rule
-                )
-                metadata_pd[name_col] = output_col
-
-    # correct sample ID
-    if 'sample_id' not in rules:
-        if show:
-            print('"sample_id" cleaning...')
-        print('Error: "sample_id" in a mandatory rule')
-        return 1
+        Cleaned metadata table.
 
-    metadata_pd = make_sample_id_cleaning(
-        metadata_pd,
-        sample_id_cols,
-        rules['sample_id'],
-        show
-    )
+    nan_decisions : dict
+        Updated dict of the encountered edits.
+    """
+    # resolve the rules names into the columns of this table
+    column_index = ColumnIndex(metadata_pd.columns)
 
     # correct time
-    if 'time_format' in rules and not no_time_format:
+    if 'time_format' in rules and not no_time_format and column_steps:
         if show:
             print('"time_format" cleaning...')
-        metadata_pd = make_date_time_cleaning(metadata_pd, rules)
+        stage = start_stage(profile, 'time_format', metadata_pd)
+        metadata_pd = make_date_time_cleaning(metadata_pd, rules, date_time_formats)
+        stop_stage(profile, stage, metadata_pd)
 
     # clean per_column
-    if 'per_column' in rules and not no_per_column:
+    if 'per_column' in rules and not no_per_column and column_steps:
         if show:
             print('"per_column" cleaning...')
-        for name_col, ranges_or_reps in rules['per_column'].items():
+        stage = start_stage(profile, 'per_column', metadata_pd)
+        for name_col, ranges_or_reps in plan.per_column.items():
+            stage_rule = start_stage(profile, 'per_column', metadata_pd, name_col,
+                                     column_index.get_containing(name_col))
             metadata_pd, nan_decisions = make_per_column_cleaning(
                 metadata_pd,
                 name_col,
                 sample_id_cols,
                 ranges_or_reps,
                 nan_value,
-                nan_decisions
+                nan_decisions,
+                column_index
             )
+            stop_stage(profile, stage_rule, metadata_pd)
+        stop_stage(profile, stage, metadata_pd)
 
     # clean combinations
     if 'combinations' in rules and not no_combinations:
         if show:
             print('"combinations" cleaning...')
+        stage = start_stage(profile, 'combinations', metadata_pd)
         for combination, conditions_decision in rules['combinations'].items():
+            stage_rule = start_stage(profile, 'combinations', metadata_pd, combination,
+                                     column_index.get_containing(
+                                         get_decision(conditions_decision, nan_value)[0])[:1])
             metadata_pd = make_combinations_cleaning(
                 metadata_pd,
                 combination,
                 conditions_decision,
                 nan_decisions,
-                nan_value
+                nan_value,
+                plan.combinations[combination],
+                column_index
             )
+            stop_stage(profile, stage_rule, metadata_pd)
+        stop_stage(profile, stage, metadata_pd)
 
     # clean del_columns
     if 'del_columns' in rules and not no_del_columns:
         if show:
             print('"del_columns" cleaning...')
-        del_columns = [y.lower() for y in rules['del_columns']]
-        metadata_pd = metadata_pd[[x for x in metadata_pd.columns if x.lower() not in del_columns]]
+        stage = start_stage(profile, 'del_columns', metadata_pd, count_edits=False)
+        del_columns = [x for y in rules['del_columns'] for x in column_index.get_lower(y)]
+        column_index.delete(del_columns)
+        metadata_pd = make_columns_frame(metadata_pd, columns=column_index.columns)
+        stop_stage(profile, stage, metadata_pd)
 
     # clean forbidden_characters
     if 'forbidden_characters' in rules and not no_forbidden_characters:
         if show:
             print('"forbidden_characters" cleaning...')
+        # the sample IDs and the date/time columns formatted as declared are kept as is
+        keep_cols = list(sample_id_cols)
+        if 'time_format' in rules and not no_time_format:
+            keep_cols.extend(rules['time_format'].get('columns', []))
+        stage = start_stage(profile, 'forbidden_characters', metadata_pd)
         metadata_pd = make_forbidden_characters_cleaning(
-            metadata_pd, sample_id_cols, rules['forbidden_characters']
+            metadata_pd, keep_cols, plan.forbidden_characters or rules['forbidden_characters'],
+            workers
         )
+        stop_stage(profile, stage, metadata_pd)
 
-    # solve dtypes
-    if 'solve_dtypes' in rules and rules['solve_dtypes'] and not no_solve_dtypes:
-        if show:
-            print('"solve_dtypes" cleaning...')
-        metadata_pd = make_solve_dtypes_cleaning(
+    return metadata_pd, nan_decisions
+
+
+def clean_frame(
+        metadata_pd,
+        rules,
+        no_booleans=False,
+        no_combinations=False,
+        no_del_columns=False,
+        no_forbidden_characters=False,
+        no_nans=False,
+        no_per_column=False,
+        no_solve_dtypes=False,
+        no_time_format=False,
+        nan_value='nan',
+        sample_id_cols=None,
+        show=False,
+        plan=None,
+        profile=None,
+        cache=None,
+        workers=None
+):
+    """
+    Clean a metadata table in memory: nothing is written and the
+    input table is not modified. The columns that no rule edits are
+    shared with the input table (copy-on-write) rather than copied.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Metadata table (e.g. from parse_metadata_file()).
+
+    rules : dict or str
+        All rules (see metadata_clean()), or the path to the rules file.
+
+    no_booleans, ..., no_time_format : bool
+        Booleans to not apply these rules (see metadata_clean()).
+
+    nan_value : str
+        Value to use for replacement for NaN / declared as such.
+
+    sample_id_cols : list
+        Names of the columns containing the sample IDs
+        (Default: the "sample_id_cols" of the "sample_id" rules).
+
+    show : bool
+        Activate verbose.
+
+    plan : RulePlan
+        Compiled rules (compiled here if None).
+
+    profile : CleaningProfile
+        Profile recording each step and rule (None if not profiling).
+
+    cache : ColumnCache
+        Cache of the cleaned columns (see metadata_clean()).
+
+    workers : int or ColumnWorkers
+        Workers cleaning the columns in parallel (see metadata_clean()).
+
+    Returns
+    -------
+    metadata_pd : pd.DataFrame
+        Clean metadata table, with missing values as NaN (the first
+        output of metadata_clean(), before the "na_value" of the user).
+
+    report : dict
+        Summary of the cleaning: 'rows' and 'columns' before and after,
+        'deleted_columns', 'nan_decisions' (values decided as NaN per
+        column, as strings), 'dtypes' and 'shared_columns' (columns
+        not copied from the input table).
+    """
+    if isinstance(rules, str):
+        rules, nan_value, _, rules_sample_id_cols = parse_yaml_file(rules, show)
+        if sample_id_cols is None:
+            sample_id_cols = rules_sample_id_cols
+
+    # the "sample_id" rules are mandatory
+    if 'sample_id' not in rules:
+        raise ValueError('"sample_id" in a mandatory rule')
+    if sample_id_cols is None:
+        sample_id_cols = rules['sample_id']['sample_id_cols']
+
+    if plan is None:
+        plan = RulePlan(rules, nan_value)
+
+    if cache is True:
+        cache = ColumnCache()
+    elif not cache:
+        cache = None
+
+    if isinstance(workers, int):
+        workers = ColumnWorkers(workers) if workers > 1 else None
+
+    input_pd = metadata_pd
+    with pd.option_context('mode.copy_on_write', True):
+        # the steps replace the columns they edit in this copy, not in the input
+        metadata_pd = input_pd.copy(deep=False)
+
+        if cache is not None or workers is not None:
+            # clean NaNs or Yes/No, sample ID, time_format and per_column, column by column
+            stage = start_stage(profile, 'columns', metadata_pd)
+            metadata_pd, nan_decisions = clean_columns(
+                metadata_pd,
+                rules,
+                no_booleans,
+                no_nans,
+                no_per_column,
+                no_time_format,
+                nan_value,
+                sample_id_cols,
+                plan,
+                show,
+                cache,
+                workers
+            )
+            stop_stage(profile, stage, metadata_pd)
+        else:
+            # clean NaNs or Yes/No
+            stage = start_stage(profile, 'nans_booleans', metadata_pd)
+            metadata_pd, nan_decisions = clean_nans_booleans(
+                metadata_pd,
+                rules,
+                no_booleans,
+                no_nans,
+                nan_value,
+                sample_id_cols,
+                {},
+                plan
+            )
+            stop_stage(profile, stage, metadata_pd)
+
+            # correct sample ID
+            stage = start_stage(profile, 'sample_id', metadata_pd, columns=sample_id_cols)
+            metadata_pd = make_sample_id_cleaning(
+                metadata_pd,
+                sample_id_cols,
+                rules['sample_id'],
+                show
+            )
+            stop_stage(profile, stage, metadata_pd)
+
+        # clean time_format, per_column, combinations, del_columns and forbidden_characters
+        metadata_pd, nan_decisions = clean_rows(
             metadata_pd,
+            rules,
+            no_combinations,
+            no_del_columns,
+            no_forbidden_characters,
+            no_per_column,
+            no_time_format,
             nan_value,
             sample_id_cols,
-            show
+            nan_decisions,
+            plan,
+            show,
+            profile,
+            cache is None and workers is None,
+            workers
         )
 
+        # categorical columns (if any) are only useful for the previous steps
+        metadata_pd = make_object_columns(metadata_pd)
+
+        # solve dtypes
+        if 'solve_dtypes' in rules and rules['solve_dtypes'] and not no_solve_dtypes:
+            if show:
+                print('"solve_dtypes" cleaning...')
+            stage = start_stage(profile, 'solve_dtypes', metadata_pd)
+            metadata_pd = make_solve_dtypes_cleaning(
+                metadata_pd,
+                nan_value,
+                sample_id_cols,
+                show,
+                plan.regex_nan,
+                workers
+            )
+            stop_stage(profile, stage, metadata_pd)
+
+        report = {
+            'rows': [input_pd.shape[0], metadata_pd.shape[0]],
+            'columns': [input_pd.shape[1], metadata_pd.shape[1]],
+            'deleted_columns': [x for x in input_pd.columns if x not in metadata_pd.columns],
+            'nan_decisions': dict((col, sorted(map(str, values)))
+                                  for col, values in nan_decisions.items()
+                                  if values and col in metadata_pd.columns),
+            'dtypes': dict((col, str(dtype)) for col, dtype in metadata_pd.dtypes.items()),
+            'shared_columns': [x for x in metadata_pd.columns if x in input_pd.columns
+                               and np.shares_memory(metadata_pd[x].to_numpy(),
+                                                    input_pd[x].to_numpy())]
+        }
+    return metadata_pd, report
+
+
+def metadata_clean(
+        rules,
+        no_booleans,
+        no_combinations,
+        no_del_columns,
+        no_forbidden_characters,
+        no_nans,
+        no_per_column,
+        no_solve_dtypes,
+        no_time_format,
+        nan_value,
+        nan_value_user,
+        sample_id_cols,
+        metadata_pd,
+        metadata_fp,
+        output_fp=None,
+        show=True,
+        plan=None,
+        output_format=None,
+        compression=None,
+        profile=None,
+        cache=None,
+        workers=None
+):
+    """
+    Main command running the cleaning.
+
+    Parameters
+    ----------
+    rules : dict
+        All rules in the following keys:
+            ['booleans', 'combinations', 'nans', 'del_columns', 'forbidden_characters', 'na_value',
+             'solve_dtypes', 'per_column', 'sample_id', 'time_format'] (or more to come...)
+
+    no_booleans : bool
+        Boolean to not replace the True/False ("booleans" rules).
+
+    no_combinations : bool
+        Boolean to not check the conditions of combinations ("combinations" rules).
+
+    no_del_columns : bool
+        Boolean to not delete the given columns ("del_columns" rule).
+
+    no_forbidden_characters : bool
+        Boolean to not replace the given forbidden characters ("forbidden_characters" rules).
+
+    no_nans : bool
+        Boolean to not clean the values of "nans" ("nans" rules).
+
+    no_per_column : bool
+        Boolean to not apply the per-column rules ("per_column" rules).
+
+    no_solve_dtypes : bool
+        Boolean to not check the dtypes of the columns ("solve_dtypes" rule).
+
+    no_time_format : bool
+        Boolean to not clean the formatting of the time/date ("time_format" rule).
+
+    nan_value : str
+        Value to use for replacement for NaN / declared as such.
+
+    nan_value_user : str
+        Value to use for replacement for NaN declared by user.
+
+    sample_id_cols : list
+        Names of the columns containing the sample IDs
+
+    metadata_pd : pd.DataFrame
+        Metadata table.
+
+    metadata_fp : str
+        Input file path
+
+    output_fp : str
+        Output file path
+
+    show : bool
+        Activate verbose.
+
+    plan : RulePlan
+        Rules compiled once with RulePlan(rules, nan_value), e.g. to clean
+        many metadata tables with the same rules (compiled here if None).
+
+    output_format : str
+        'tsv', 'parquet' or 'feather' (Default: given by
+        the extension of output_fp, otherwise 'tsv').
+
+    compression : str
+        'gzip' or 'zstd' to compress the outputs (Default: none).
+
+    profile : CleaningProfile or True
+        Record the wall time, CPU time, peak memory and cells edited of
+        each cleaning step and rule, in a CleaningProfile (created if True,
+        or passed with e.g. the reading already recorded), written as JSON
+        next to the output ('*_clean_profile.json').
+
+    cache : bool or ColumnCache
+        Read the columns cleaned by the steps that only depend on their
+        content from a cache of the previous cleanings, and add the others
+        (the default cache is created if True, see ColumnCache).
+
+    workers : int or ColumnWorkers
+        Clean the columns in parallel in the steps that clean each column
+        independently ("nans", "booleans", "sample_id", "time_format",
+        "per_column", "forbidden_characters" and the dtypes inference),
+        on this number of processes or with these workers (e.g. on threads).
+        The outputs are the same as when the columns are cleaned in turn.
+
+    Returns
+    -------
+    metadata_pd : pd.DataFrame
+        final metadata table with updated dtypes
+    """
+
+    if profile is True:
+        profile = CleaningProfile()
+    shape_in = metadata_pd.shape
+
+    # the "sample_id" rules are mandatory
+    if 'sample_id' not in rules:
+        if show:
+            print('"sample_id" cleaning...')
+        print('Error: "sample_id" in a mandatory rule')
+        return 1
+
+    metadata_pd, _ = clean_frame(
+        metadata_pd,
+        rules,
+        no_booleans,
+        no_combinations,
+        no_del_columns,
+        no_forbidden_characters,
+        no_nans,
+        no_per_column,
+        no_solve_dtypes,
+        no_time_format,
+        nan_value,
+        sample_id_cols,
+        show,
+        plan,
+        profile,
+        cache,
+        workers
+    )
+
     # write outputs
+    stage = start_stage(profile, 'write', metadata_pd, count_edits=False)
     exit_code = write_outputs(
         metadata_pd,
         metadata_fp,
         output_fp,
         nan_value,
-        nan_value_user
+        nan_value_user,
+        output_format,
+        compression
     )
+    stop_stage(profile, stage, metadata_pd)
 
     if exit_code != 0:
         raise ValueError("No metadata cleaning output.")
 
+    if profile is not None:
+        profile_fp = profile.write(
+            get_profile_fp(metadata_fp, output_fp, output_format),
+            metadata_file=metadata_fp,
+            output_files=get_outputs_fps(metadata_fp, output_fp, nan_value, nan_value_user,
+                                         output_format, compression)[0],
+            rows=shape_in[0],
+            columns=shape_in[1]
+        )
+        print('Profile: %s' % profile_fp)
+
+
+def get_date_time_uniques(
+        metadata_pd,
+        rules,
+        no_booleans,
+        no_nans,
+        nan_value,
+        sample_id_cols,
+        plan,
+        date_time_uniques=None
+):
+    """
+    Collect the distinct values of the date/time columns ("time_format"
+    rule) as they are formatted, i.e. after the "nans" and "booleans"
+    replacements, for rows cleaned apart from the rest of the table.
+
+    Parameters
+    ----------
+    metadata_pd : pd.DataFrame
+        Rows of the metadata table.
+
+    (same as metadata_clean() for the rules and options)
+
+    plan : RulePlan
+        Compiled rules.
+
+    date_time_uniques : dict
+        Distinct values of the other rows (updated here).
+
+    Returns
+    -------
+    date_time_uniques : dict
+        key    -> date/time column
+        value  -> distinct values (as strings), in order of
+                  appearance (as dict keys)
+    """
+    if date_time_uniques is None:
+        date_time_uniques = {}
+    time_cols = [x for x in rules['time_format'].get('columns', []) if x in metadata_pd.columns]
+    times_pd, _ = clean_nans_booleans(
+        metadata_pd[time_cols], rules, no_booleans, no_nans, nan_value,
+        sample_id_cols, {}, plan)
+    for name_col in time_cols:
+        date_time_uniques.setdefault(name_col, {}).update(
+            dict.fromkeys(get_unique_datetimes(times_pd[name_col])[1]))
+    return date_time_uniques
+
+
+def clean_chunk(
+        chunk,
+        rules,
+        no_booleans,
+        no_combinations,
+        no_del_columns,
+        no_forbidden_characters,
+        no_nans,
+        no_per_column,
+        no_time_format,
+        nan_value,
+        sample_id_cols,
+        nan_decisions,
+        plan,
+        id_counts,
+        id_seen,
+        show,
+        profile=None,
+        date_time_formats=None
+):
+    """
+    Run all the cleaning steps but "solve_dtypes" on some rows of a
+    metadata table, the sample IDs being checked against their number
+    of occurrences in the entire table.
+
+    Parameters
+    ----------
+    chunk : pd.DataFrame
+        Rows of the metadata table.
+
+    (same as metadata_clean() for the rules and options)
+
+    nan_decisions : dict
+        Values decided as NaN in the other rows (updated here).
+
+    plan : RulePlan
+        Compiled rules.
+
+    id_counts : dict
+        Number of occurrences of each sample ID per sample ID column
+        (counted on the entire metadata table).
 
+    id_seen : dict
+        Number of occurrences of each duplicated sample ID per sample
+        ID column in the previous chunks (updated here).
+
+    show : bool
+        Activate verbose.
+
+    profile : CleaningProfile
+        Profile recording each step and rule (None if not profiling).
+
+    date_time_formats : dict
+        Formatted distinct values of each date/time column, decided
+        on the entire table (see get_date_time_formats()).
+
+    Returns
+    -------
+    chunk : pd.DataFrame
+        Clean rows.
 
+    nan_decisions : dict
+        Updated values decided as NaN.
+    """
+    stage = start_stage(profile, 'nans_booleans', chunk)
+    chunk, nan_decisions = clean_nans_booleans(
+        chunk, rules, no_booleans, no_nans, nan_value,
+        sample_id_cols, nan_decisions, plan)
+    stop_stage(profile, stage, chunk)
+    stage = start_stage(profile, 'sample_id', chunk, columns=sample_id_cols)
+    chunk = make_sample_id_cleaning(
+        chunk, sample_id_cols, rules['sample_id'], show, id_counts, id_seen)
+    stop_stage(profile, stage, chunk)
+    chunk, nan_decisions = clean_rows(
+        chunk, rules, no_combinations, no_del_columns,
+        no_forbidden_characters, no_per_column, no_time_format,
+        nan_value, sample_id_cols, nan_decisions, plan, show, profile,
+        date_time_formats=date_time_formats)
+    return chunk, nan_decisions
+
+
+def metadata_clean_chunks(
+        rules,
+        no_booleans,
+        no_combinations,
+        no_del_columns,
+        no_forbidden_characters,
+        no_nans,
+        no_per_column,
+        no_solve_dtypes,
+        no_time_format,
+        nan_value,
+        nan_value_user,
+        sample_id_cols,
+        metadata_fp,
+        output_fp=None,
+        show=True,
+        plan=None,
+        chunksize=100000,
+        output_format=None,
+        compression=None,
+        profile=None
+):
+    """
+    Run the cleaning on a metadata file read by chunks of rows,
+    for metadata tables too large to fit in memory.
+
+    The cleaning steps that only depend on the content of each row are
+    applied chunk by chunk and each chunk is written to the output(s) as
+    soon as it is clean. A first pass collects the kinds of values of each
+    column, so that every chunk is read with the dtypes of the entire table
+    (e.g. integers are read as floats in all the chunks if one chunk has
+    blanks), and the counts of the sample IDs ("sample_id" uniqueness).
+    The distinct dates (formatted as for the entire table in "time_format")
+    are collected on the date/time columns read with these dtypes.
+    For "solve_dtypes", the clean chunks are spilled to a temporary file
+    while the dtypes of their columns are collected, and they are only
+    re-typed when read back to be written.
+
+    Parameters
+    ----------
+    (same as metadata_clean(), except for metadata_pd)
+
+    chunksize : int
+        Number of rows per chunk.
+
+    output_format : str
+        Only 'tsv' (default) outputs can be written by chunks.
+
+    compression : str
+        'gzip' or 'zstd' to compress the outputs (Default: none).
+
+    profile : CleaningProfile or True
+        Profile the cleaning (see metadata_clean()): the
+        stages of each chunk are summed up.
+
+    Returns
+    -------
+    clean_metadata_fps : list
+        Paths to the output metadata files.
+    """
+
+    if plan is None:
+        plan = RulePlan(rules, nan_value)
+
+    if profile is True:
+        profile = CleaningProfile()
+
+    if 'sample_id' not in rules:
+        print('Error: "sample_id" in a mandatory rule')
+        return 1
+
+    sample_rules = rules['sample_id']
+    check_ids = 'check_sample_id_unique' in sample_rules and sample_rules['check_sample_id_unique']
+    solve_dtypes = 'solve_dtypes' in rules and rules['solve_dtypes'] and not no_solve_dtypes
+
+    time_cols = []
+    if 'time_format' in rules and not no_time_format:
+        time_cols = rules['time_format'].get('columns', [])
+
+    # first pass: collect the dtypes of the entire table and what the global cleaning steps need
+    id_counts, date_time_formats = None, None
+    stage = start_stage(profile, 'first_pass')
+    if show:
+        print('first pass for %s...' % ', '.join(
+            ['the dtypes'] + ['"%s"' % rule for rule, run in [
+                ('sample_id', check_ids), ('time_format', time_cols)] if run]))
+    if check_ids or time_cols:
+        id_counts = dict((sample_col, Counter()) for sample_col in sample_id_cols)
+    read_kinds = {}
+    for chunk in read_metadata_chunks(metadata_fp, sample_id_cols, chunksize):
+        read_kinds = merge_read_kinds(read_kinds, get_read_kinds(chunk))
+        if id_counts is not None:
+            for sample_col in sample_id_cols:
+                if sample_col in chunk.columns:
+                    id_counts[sample_col].update(chunk[sample_col].astype('str').value_counts().to_dict())
+    # every chunk is read with the dtypes of the entire table
+    read_dtypes = get_read_dtypes(read_kinds)
+    if time_cols:
+        date_time_uniques = {}
+        usecols = (lambda x: x in sample_id_cols or x in time_cols)
+        for chunk in read_metadata_chunks(metadata_fp, sample_id_cols, chunksize, usecols, read_dtypes):
+            date_time_uniques = get_date_time_uniques(
+                chunk, rules, no_booleans, no_nans, nan_value, sample_id_cols,
+                plan, date_time_uniques)
+        date_time_formats = get_date_time_formats(date_time_uniques, rules)
+    stop_stage(profile, stage)
+
+    # clean each chunk: written right away, or spilled until the dtypes are solved
+    nan_decisions = {}
+    id_seen = {}
+    clean_metadata_fps = []
+    rows, columns = 0, 0
+    spill = tempfile.TemporaryFile() if solve_dtypes else None
+    dtypes_final, potential_unks = {}, {}
+    chunks = read_metadata_chunks(metadata_fp, sample_id_cols, chunksize, None, read_dtypes)
+    if profile is not None:
+        chunks = profile.iterate('read', chunks)
+    for cdx, chunk in enumerate(chunks):
+        rows, columns = rows + chunk.shape[0], chunk.shape[1]
+        chunk, nan_decisions = clean_chunk(
+            chunk, rules, no_booleans, no_combinations, no_del_columns,
+            no_forbidden_characters, no_nans, no_per_column, no_time_format,
+            nan_value, sample_id_cols, nan_decisions, plan, id_counts, id_seen,
+            show and not cdx, profile, date_time_formats)
+        if solve_dtypes:
+            stage = start_stage(profile, 'solve_dtypes', chunk, count_edits=False)
+            chunk_dtypes_final, chunk_unks = get_dtypes_final_and_unks(
+                chunk, nan_value, sample_id_cols, plan.regex_nan)
+            dtypes_final = merge_dtypes_final(dtypes_final, chunk_dtypes_final)
+            for unk, unk_cols in chunk_unks.items():
+                potential_unks[unk] = sorted(set(potential_unks.get(unk, []) + unk_cols))
+            spill_chunk(chunk, spill)
+            stop_stage(profile, stage, chunk)
+        else:
+            stage = start_stage(profile, 'write', chunk, count_edits=False)
+            clean_metadata_fps = append_outputs(
+                chunk, metadata_fp, output_fp, nan_value, nan_value_user, not cdx,
+                output_format, compression)
+            stop_stage(profile, stage, chunk)
+
+    # re-type the spilled chunks with the dtypes of the entire table, and write them
+    if solve_dtypes:
+        if show:
+            show_certainly_NaNs(potential_unks, pd.DataFrame(columns=list(dtypes_final)), nan_value)
+        with spill:
+            for cdx, chunk in enumerate(read_spilled_chunks(spill)):
+                stage = start_stage(profile, 'solve_dtypes', chunk)
+                chunk = apply_dtypes_final(chunk, nan_value, dtypes_final)
+                stop_stage(profile, stage, chunk)
+                stage = start_stage(profile, 'write', chunk, count_edits=False)
+                clean_metadata_fps = append_outputs(
+                    chunk, metadata_fp, output_fp, nan_value, nan_value_user, not cdx,
+                    output_format, compression)
+                stop_stage(profile, stage, chunk)
+
+    if not clean_metadata_fps:
+        raise ValueError("No metadata cleaning output.")
+    print("\nOutput(s) of metadata_cleaning:")
+    print('\n'.join(clean_metadata_fps))
+    if profile is not None:
+        profile_fp = profile.write(
+            get_profile_fp(metadata_fp, output_fp, output_format),
+            metadata_file=metadata_fp,
+            output_files=clean_metadata_fps,
+            rows=rows,
+            columns=columns,
+            chunksize=chunksize
+        )
+        print('Profile: %s' % profile_fp)
+    return clean_metadata_fps
+
+
+def clean_incremental_rows(
+        rules,
+        no_booleans,
+        no_combinations,
+        no_del_columns,
+        no_forbidden_characters,
+        no_nans,
+        no_per_column,
+        no_solve_dtypes,
+        no_time_format,
+        nan_value,
+        sample_id_cols,
+        metadata_pd,
+        id_counts,
+        id_seen,
+        nan_decisions,
+        dtypes_final,
+        date_time_formats,
+        show,
+        plan,
+        profile=None
+):
+    """
+    Clean some rows of a metadata table, using what the global cleaning
+    steps collected on the entire table or during the previous cleaning.
+
+    Parameters
+    ----------
+    (same as metadata_clean())
+
+    metadata_pd : pd.DataFrame
+        Rows of the metadata table to clean (as read with the entire table).
+
+    id_counts : dict
+        Number of occurrences of each sample ID per sample ID column
+        in all the rows (None if metadata_pd holds all the rows).
+
+    id_seen : dict
+        Number of occurrences of each duplicated sample ID per
+        sample ID column in the previous rows.
+
+    nan_decisions : dict
+        Values decided as NaN during the previous cleaning.
+
+    dtypes_final : dict
+        Final dtypes of the previous cleaning (e.g. {} if none).
+
+    date_time_formats : dict
+        Formatted distinct values of each date/time column in all
+        the rows (see get_date_time_formats()).
+
+    Returns
+    -------
+    chunk : pd.DataFrame
+        Clean rows.
+
+    nan_decisions : dict
+        Updated values decided as NaN.
+
+    dtypes_final : dict
+        Final dtypes merged with these of the clean rows
+        (None if "solve_dtypes" is not applied).
+    """
+    chunk, nan_decisions = clean_chunk(
+        metadata_pd.copy(), rules, no_booleans, no_combinations,
+        no_del_columns, no_forbidden_characters, no_nans, no_per_column,
+        no_time_format, nan_value, sample_id_cols, nan_decisions, plan,
+        id_counts, id_seen, show, profile, date_time_formats)
+    chunk = make_object_columns(chunk)
+    if 'solve_dtypes' in rules and rules['solve_dtypes'] and not no_solve_dtypes:
+        if show:
+            print('"solve_dtypes" cleaning...')
+        stage = start_stage(profile, 'solve_dtypes', chunk)
+        unks_counts = Counter()
+        chunk_dtypes_final, potential_unks = get_dtypes_final_and_unks(
+            chunk, nan_value, sample_id_cols, plan.regex_nan, unks_counts)
+        if show:
+            show_certainly_NaNs(potential_unks, chunk, nan_value, unks_counts)
+        dtypes_final = merge_dtypes_final(dict(dtypes_final), chunk_dtypes_final)
+        chunk = apply_dtypes_final(chunk, nan_value, dtypes_final)
+        stop_stage(profile, stage, chunk)
+    else:
+        dtypes_final = None
+    return chunk, nan_decisions, dtypes_final
+
+
+def metadata_clean_incremental(
+        rules,
+        no_booleans,
+        no_combinations,
+        no_del_columns,
+        no_forbidden_characters,
+        no_nans,
+        no_per_column,
+        no_solve_dtypes,
+        no_time_format,
+        nan_value,
+        nan_value_user,
+        sample_id_cols,
+        metadata_pd,
+        metadata_fp,
+        output_fp=None,
+        show=True,
+        plan=None,
+        output_format=None,
+        compression=None,
+        profile=None
+):
+    """
+    Run the cleaning on the rows appended to a metadata table since the
+    previous cleaning, for append-only tables that grow by new rows and
+    are cleaned again and again.
+
+    A fingerprint of each input row, the dtypes of the input columns and a
+    hash of the rules and options are kept next to the outputs
+    ('*_clean_state.npz'), with the summaries of the previous rows needed by
+    the cleaning steps that use the entire table: the counts of the sample
+    IDs ("sample_id"), the formatted distinct dates ("time_format"), the
+    final dtypes ("solve_dtypes") and the values decided as NaN (used by
+    "combinations"). The next cleaning only cleans the appended rows, from
+    these summaries, and appends them to the outputs.
+
+    Only appended rows are cleaned incrementally: all the rows are cleaned
+    again (as by metadata_clean()) if there is no state, if the rules,
+    options, columns or dtypes read changed, if previous rows changed or
+    were deleted, if the outputs changed since, or if the new rows change
+    the cleaning of the previous rows (final dtypes, values decided as NaN,
+    formats of the dates, or a sample ID that gets duplicated when the
+    sample IDs are made unique, "check_sample_id_force").
+
+    Parameters
+    ----------
+    (same as metadata_clean())
+
+    output_format : str
+        Only 'tsv' (default) outputs can be cleaned incrementally.
+
+    Returns
+    -------
+    clean_metadata_fps : list
+        Paths to the output metadata files.
+    """
+
+    if plan is None:
+        plan = RulePlan(rules, nan_value)
+
+    if profile is True:
+        profile = CleaningProfile()
+
+    if 'sample_id' not in rules:
+        print('Error: "sample_id" in a mandatory rule')
+        return 1
+
+    clean_metadata_fps, na_values = get_outputs_fps(
+        metadata_fp, output_fp, nan_value, nan_value_user, output_format, compression)
+    if get_table_format(clean_metadata_fps[0], output_format) != 'tsv':
+        raise ValueError("Only tsv outputs can be cleaned incrementally.")
+
+    # fingerprints of the rows, to continue the previous cleaning
+    stage = start_stage(profile, 'fingerprints')
+    state_fp = get_state_fp(metadata_fp, output_fp, output_format)
+    rules_hash = get_rules_hash(
+        rules, no_booleans, no_combinations, no_del_columns, no_forbidden_characters,
+        no_nans, no_per_column, no_solve_dtypes, no_time_format, nan_value,
+        nan_value_user, sample_id_cols, clean_metadata_fps)
+    fingerprints = get_rows_fingerprints(metadata_pd)
+    dtypes = [str(x) for x in metadata_pd.dtypes]
+    state = read_state(state_fp, rules_hash, list(metadata_pd.columns), dtypes,
+                       clean_metadata_fps, fingerprints)
+    stop_stage(profile, stage)
+
+    n_rows = metadata_pd.shape[0]
+    time_format = 'time_format' in rules and not no_time_format
+    sample_rules = rules['sample_id']
+    force_ids = sample_rules.get('check_sample_id_unique') and sample_rules.get(
+        'check_sample_id_force')
+    cleaning_args = [rules, no_booleans, no_combinations, no_del_columns,
+                     no_forbidden_characters, no_nans, no_per_column,
+                     no_solve_dtypes, no_time_format, nan_value, sample_id_cols]
+    dates_args = [rules, no_booleans, no_nans, nan_value, sample_id_cols, plan]
+    if state is not None:
+        new_pd = metadata_pd.iloc[state['rows']:]
+        if not new_pd.shape[0]:
+            print('No new rows since the previous cleaning.')
+            return clean_metadata_fps
+        if show:
+            print('cleaning %s new rows (of %s)...' % (new_pd.shape[0], n_rows))
+        # the global steps continue from the summaries of the previous rows
+        id_counts, id_seen = get_new_ids_counts(new_pd, sample_id_cols, state['ids'], force_ids)
+        merged = id_seen is not None
+        date_time_formats = None
+        if time_format:
+            previous_formats = state['date_time_formats']
+            date_time_formats = get_date_time_formats(get_date_time_uniques(
+                new_pd, *dates_args, dict((name_col, dict.fromkeys(formats))
+                                          for name_col, formats in previous_formats.items())),
+                rules)
+            # the previous dates must keep their formats (e.g. no time added)
+            merged = merged and all(
+                date_time_formats[name_col][value] == formatted
+                for name_col, formats in previous_formats.items()
+                for value, formatted in formats.items())
+        if merged:
+            nan_decisions = dict((col, set(values))
+                                 for col, values in state['nan_decisions'].items())
+            chunk, nan_decisions, dtypes_final = clean_incremental_rows(
+                *cleaning_args, new_pd, id_counts, id_seen, nan_decisions,
+                state['dtypes_final'], date_time_formats, show, plan, profile)
+            merged = (get_nan_decisions_key(nan_decisions) == get_nan_decisions_key(
+                          state['nan_decisions'])
+                      and (dtypes_final or {}) == state['dtypes_final']
+                      and [str(x) for x in chunk.columns] == state['clean_columns'])
+        if merged:
+            stage = start_stage(profile, 'write', chunk, count_edits=False)
+            write_tsv_outputs(chunk, clean_metadata_fps, na_values, 'a', False, compression)
+            stop_stage(profile, stage, chunk)
+            ids_summary = merge_ids_summaries(state['ids'], get_ids_summary(new_pd, sample_id_cols))
+            rows_cleaned = new_pd.shape[0]
+        else:
+            print('The new rows change the previous cleaning: cleaning all the rows...')
+            state = None
+
+    if state is None:
+        ids_summary = get_ids_summary(metadata_pd, sample_id_cols)
+        date_time_formats = None
+        if time_format:
+            date_time_formats = get_date_time_formats(
+                get_date_time_uniques(metadata_pd, *dates_args), rules)
+        chunk, nan_decisions, dtypes_final = clean_incremental_rows(
+            *cleaning_args, metadata_pd, None, {}, {}, {}, date_time_formats,
+            show, plan, profile)
+        stage = start_stage(profile, 'write', chunk, count_edits=False)
+        write_tsv_outputs(chunk, clean_metadata_fps, na_values, compression=compression)
+        stop_stage(profile, stage, chunk)
+        rows_cleaned = n_rows
+
+    write_state(state_fp, {
+        'rules_hash': rules_hash,
+        'columns': [str(x) for x in metadata_pd.columns],
+        'dtypes': dtypes,
+        'rows': n_rows,
+        'clean_columns': [str(x) for x in chunk.columns],
+        'dtypes_final': dtypes_final or {},
+        'date_time_formats': date_time_formats or {},
+        'nan_decisions': dict((col, sorted(values, key=repr))
+                              for col, values in nan_decisions.items() if values)
+    }, fingerprints, ids_summary, clean_metadata_fps)
+
+    print('Cleaned rows: %s (of %s)' % (rows_cleaned, n_rows))
+    print("\nOutput(s) of metadata_cleaning:")
+    print('\n'.join(clean_metadata_fps))
+    if profile is not None:
+        profile_fp = profile.write(
+            get_profile_fp(metadata_fp, output_fp, output_format),
+            metadata_file=metadata_fp,
+            output_files=clean_metadata_fps,
+            rows=n_rows,
+            columns=metadata_pd.shape[1],
+            rows_cleaned=rows_cleaned
+        )
+        print('Profile: %s' % profile_fp)
+    return clean_metadata_fps
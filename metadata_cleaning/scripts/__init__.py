@@ -6,7 +6,3 @@
 # The full license is in the file LICENSE.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
-from ._clean_dummy import clean_dummy
-
-__all__ = ["clean_dummy"]
-
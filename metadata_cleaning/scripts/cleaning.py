@@ -7,18 +7,314 @@
 # The full license is in the file LICENSE.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 import click
-from metadata_cleaning.metadata_clean import (
-    metadata_clean
-)
-
-from metadata_cleaning._yaml_utils import parse_yaml_file
 
-from metadata_cleaning._df_utils import parse_metadata_file
+# only the light modules are imported here, for a fast "--help", "--version"
+# or "validate": the cleaning modules (pandas, numpy) are imported by the commands
+from metadata_cleaning._cache_utils import CACHE_SIZE_MB
 
 from metadata_cleaning import __version__
 
 
-@click.command()
+class CleaningGroup(click.Group):
+    """
+    Group of commands that runs "clean" when no command
+    is given, e.g. `cleaning.py -r rules.yaml -m metadata.tsv`.
+    """
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in [
+                '--help', '--version']:
+            args = ['clean'] + list(args)
+        return super(CleaningGroup, self).parse_args(ctx, args)
+
+
+CLEANING_OPTIONS = [
+    click.option(
+        "-na",
+        "--nan-value",
+        required=False,
+        default=None,
+        help=(
+            "Value to be use to replace the missing or violating entries. "
+            "Violations are detected based on the rules of the yaml file."
+        ),
+    ),
+    click.option(
+        "-s",
+        "--sample-id",
+        required=False,
+        multiple=True,
+        default=None,
+        help=(
+            "List of columns names containing samples IDs. "
+            "(or any other column(s) which may contain numeric "
+            "and should not be interpreted as number."
+        ),
+    ),
+    click.option(
+        "-boo",
+        "--no-booleans",
+        required=False,
+        is_flag=True,
+        default=False,
+        help=(
+            "[YAML] Do not replace the True/False ('booleans' rules)"
+        ),
+    ),
+    click.option(
+        "-com",
+        "--no-combinations",
+        required=False,
+        is_flag=True,
+        default=False,
+        help=(
+            "[YAML] Do not check the conditions of combinations ('combinations' rules)"
+        ),
+    ),
+    click.option(
+        "-del",
+        "--no-del-columns",
+        required=False,
+        is_flag=True,
+        default=False,
+        help=(
+            "[YAML] Do not delete the given columns ('del_columns' rule)"
+        ),
+    ),
+    click.option(
+        "-for",
+        "--no-forbidden-characters",
+        required=False,
+        is_flag=True,
+        default=False,
+        help=(
+            "[YAML] Do not replace the given forbidden characters ('forbidden_characters' rules)"
+        ),
+    ),
+    click.option(
+        "-nan",
+        "--no-nans",
+        required=False,
+        is_flag=True,
+        default=False,
+        help=(
+            "[YAML] Do not clean the values of 'nans' ('nans' rules)"
+        ),
+    ),
+    click.option(
+        "-per",
+        "--no-per-column",
+        required=False,
+        is_flag=True,
+        default=False,
+        help=(
+            "[YAML] Do not apply the per-column rules ('per_column' rules)"
+        ),
+    ),
+    click.option(
+        "-sol",
+        "--no-solve-dtypes",
+        required=False,
+        is_flag=True,
+        default=False,
+        help=(
+            "[YAML] Do not check the dtypes of the columns ('solve_dtypes' rule)"
+        ),
+    ),
+    click.option(
+        "-tim",
+        "--no-time-format",
+        required=False,
+        is_flag=True,
+        default=False,
+        help=(
+            "[YAML] Do not clean the formatting of the time/date ('time_format' rule)"
+        ),
+    ),
+    click.option(
+        "--categorical-ratio",
+        required=False,
+        default=None,
+        type=float,
+        help=(
+            "Read the columns of strings as categorical when their number "
+            "of distinct values is at most this ratio of the number of rows "
+            "(e.g. 0.5), so that the rules apply once per distinct value."
+        ),
+    ),
+    click.option(
+        "--input-format",
+        required=False,
+        default=None,
+        type=click.Choice(['tsv', 'excel', 'parquet', 'feather']),
+        help=(
+            "Format of the metadata file(s) (Default: given by "
+            "the file extension, e.g. '.parquet', otherwise 'tsv')."
+        ),
+    ),
+    click.option(
+        "--reader",
+        required=False,
+        default='pandas',
+        show_default=True,
+        type=click.Choice(['pandas', 'arrow']),
+        help=(
+            "Parser of the tab-separated metadata file(s): 'arrow' for "
+            "the multithreaded Arrow CSV reader (needs pyarrow; not "
+            "used when reading by chunks)."
+        ),
+    ),
+    click.option(
+        "--output-format",
+        required=False,
+        default=None,
+        type=click.Choice(['tsv', 'parquet', 'feather']),
+        help=(
+            "Format of the output metadata file(s) (Default: given by "
+            "the output file extension, otherwise 'tsv'). The parquet "
+            "and feather outputs keep the numeric columns as numbers."
+        ),
+    ),
+    click.option(
+        "--compression",
+        required=False,
+        default=None,
+        type=click.Choice(['gzip', 'zstd']),
+        help=(
+            "Compress the output metadata file(s): the tsv outputs get "
+            "a '.gz' or '.zst' extension ('zstd' needs zstandard), the "
+            "parquet and feather outputs are compressed internally."
+        ),
+    ),
+    click.option(
+        "--profile",
+        required=False,
+        is_flag=True,
+        help=(
+            "Write the wall time, CPU time, peak memory and number of "
+            "cells edited of each cleaning step and rule as JSON, next "
+            "to the output ('*_clean_profile.json')."
+        ),
+    ),
+    click.option(
+        "--no-cache",
+        required=False,
+        is_flag=True,
+        help=(
+            "Do not read the columns already cleaned with the same "
+            "rules from the cache, nor add the cleaned columns to it."
+        ),
+    ),
+    click.option(
+        "--cache-dir",
+        required=False,
+        default=None,
+        help=(
+            "Folder of the cache of the cleaned columns "
+            "(Default: '~/.cache/metadata_cleaning')."
+        ),
+    ),
+    click.option(
+        "--cache-size",
+        required=False,
+        default=CACHE_SIZE_MB,
+        show_default=True,
+        type=float,
+        help=(
+            "Maximum size of the cache, in MB (the least "
+            "recently used columns are removed beyond)."
+        ),
+    ),
+    click.option(
+        "-v",
+        "--verbose",
+        required=False,
+        is_flag=True,
+        help=(
+            "Show the rules and other info about encountered issue "
+            "while cleaning."
+        ),
+    ),
+]
+
+
+def add_cleaning_options(func):
+    """
+    Add the options common to the cleaning commands.
+    """
+    for option in reversed(CLEANING_OPTIONS):
+        func = option(func)
+    return func
+
+
+def get_cleaning_args(
+    r_yaml_file,
+    nan_value,
+    sample_id,
+    no_booleans,
+    no_combinations,
+    no_del_columns,
+    no_forbidden_characters,
+    no_nans,
+    no_per_column,
+    no_solve_dtypes,
+    no_time_format,
+    output_format,
+    compression,
+    profile,
+    no_cache,
+    cache_dir,
+    cache_size,
+    verbose
+):
+    """
+    Parse the rules and get the arguments of metadata_clean()
+    that do not depend on the metadata file.
+    """
+    from metadata_cleaning._yaml_utils import parse_yaml_file
+    from metadata_cleaning._plan_utils import RulePlan
+    from metadata_cleaning._batch_utils import make_cleaning_args
+
+    rules, na_value, nan_value_user, sample_id_cols = parse_yaml_file(
+        r_yaml_file,
+        verbose
+    )
+    return make_cleaning_args(
+        rules,
+        na_value,
+        nan_value_user,
+        sample_id_cols,
+        RulePlan(rules, na_value),
+        nan_value=nan_value,
+        sample_id=sample_id,
+        no_booleans=no_booleans,
+        no_combinations=no_combinations,
+        no_del_columns=no_del_columns,
+        no_forbidden_characters=no_forbidden_characters,
+        no_nans=no_nans,
+        no_per_column=no_per_column,
+        no_solve_dtypes=no_solve_dtypes,
+        no_time_format=no_time_format,
+        output_format=output_format,
+        compression=compression,
+        # the click flag is False when not passed
+        profile=True if profile else None,
+        no_cache=no_cache,
+        cache_dir=cache_dir,
+        cache_size=cache_size,
+        verbose=verbose
+    )
+
+
+@click.group(cls=CleaningGroup)
+@click.version_option(__version__, prog_name="metadata_clean")
+def metadata_clean_cli():
+    """
+    Clean metadata tables based on rules passed as a yaml file.
+    """
+    pass
+
+
+@metadata_clean_cli.command("clean")
 @click.option(
     "-r",
     "--r-yaml-file",
@@ -44,176 +340,324 @@ from metadata_cleaning import __version__
     ),
 )
 @click.option(
-    "-na",
-    "--nan-value",
+    "-c",
+    "--chunksize",
     required=False,
     default=None,
+    type=int,
     help=(
-        "Value to be use to replace the missing or violating entries. "
-        "Violations are detected based on the rules of the yaml file."
+        "Read and clean the metadata by chunks of this number of rows "
+        "(for tab-separated tables that do not fit in memory)."
     ),
 )
 @click.option(
-    "-s",
-    "--sample-id",
-    required=False,
-    multiple=True,
-    default=None,
-    help=(
-        "List of columns names containing samples IDs. "
-        "(or any other column(s) which may contain numeric "
-        "and should not be interpreted as number."
-    ),
-)
-@click.option(
-    "-boo",
-    "--no-booleans",
-    required=False,
+    "--incremental",
     is_flag=True,
     default=False,
     help=(
-        "[YAML] Do not replace the True/False ('booleans' rules)"
+        "For append-only metadata: only clean the rows appended since the "
+        "previous cleaning to the same output(s), and append them to these "
+        "outputs (a state is kept next to the outputs: '*_clean_state.npz'). "
+        "All the rows are cleaned again if previous rows changed or were "
+        "deleted, or if the new rows change the cleaning of the previous ones."
     ),
 )
 @click.option(
-    "-com",
-    "--no-combinations",
+    "-j",
+    "--jobs",
     required=False,
-    is_flag=True,
-    default=False,
+    default=1,
+    type=int,
+    show_default=True,
     help=(
-        "[YAML] Do not check the conditions of combinations ('combinations' rules)"
+        "Number of processes cleaning the columns in parallel, in the "
+        "steps that clean each column independently (not used when "
+        "reading by chunks or cleaning incrementally)."
     ),
 )
 @click.option(
-    "-del",
-    "--no-del-columns",
-    required=False,
+    "--threads",
     is_flag=True,
     default=False,
     help=(
-        "[YAML] Do not delete the given columns ('del_columns' rule)"
+        "Clean the columns in parallel on threads rather than processes "
+        "(only faster for the steps running in numpy/pandas code)."
     ),
 )
+@add_cleaning_options
+def run_cleaning(
+    r_yaml_file,
+    m_metadata_file,
+    o_metadata_file,
+    chunksize,
+    incremental,
+    jobs,
+    threads,
+    categorical_ratio,
+    input_format,
+    reader,
+    **kwargs
+):
+    """
+    Perform the cleaning of metadata on command line.
+    """
+    from metadata_cleaning.metadata_clean import (
+        metadata_clean,
+        metadata_clean_chunks,
+        metadata_clean_incremental
+    )
+    from metadata_cleaning._df_utils import parse_metadata_file
+    from metadata_cleaning._profile_utils import CleaningProfile, start_stage, stop_stage
+    from metadata_cleaning._parallel_utils import ColumnWorkers
+
+    if chunksize and incremental:
+        raise click.UsageError('Options "--chunksize" and "--incremental" are incompatible.')
+
+    cleaning_args = get_cleaning_args(r_yaml_file, **kwargs)
+
+    if chunksize or incremental:
+        # only parts of the columns are cleaned: nothing to cache
+        cleaning_args.pop('cache')
+
+    if chunksize:
+        metadata_clean_chunks(
+            metadata_fp=m_metadata_file,
+            output_fp=o_metadata_file,
+            chunksize=chunksize,
+            **cleaning_args
+        )
+        return
+
+    if cleaning_args['profile'] is not None:
+        cleaning_args['profile'] = CleaningProfile()
+    stage = start_stage(cleaning_args['profile'], 'read')
+    metadata_pd = parse_metadata_file(
+        m_metadata_file,
+        cleaning_args['sample_id_cols'],
+        categorical_ratio,
+        input_format,
+        reader=reader
+    )
+    stop_stage(cleaning_args['profile'], stage, metadata_pd)
+
+    if incremental:
+        metadata_clean_incremental(
+            metadata_pd=metadata_pd,
+            metadata_fp=m_metadata_file,
+            output_fp=o_metadata_file,
+            **cleaning_args
+        )
+        return
+
+    metadata_clean(
+        metadata_pd=metadata_pd,
+        metadata_fp=m_metadata_file,
+        output_fp=o_metadata_file,
+        workers=ColumnWorkers(jobs, threads) if jobs > 1 else None,
+        **cleaning_args
+    )
+
+
+@metadata_clean_cli.command("batch")
 @click.option(
-    "-for",
-    "--no-forbidden-characters",
-    required=False,
-    is_flag=True,
-    default=False,
-    help=(
-        "[YAML] Do not replace the given forbidden characters ('forbidden_characters' rules)"
-    ),
+    "-r",
+    "--r-yaml-file",
+    required=True,
+    help="Rules file in yaml format."
 )
 @click.option(
-    "-nan",
-    "--no-nans",
-    required=False,
-    is_flag=True,
-    default=False,
+    "-m",
+    "--m-metadata-file",
+    required=True,
+    multiple=True,
     help=(
-        "[YAML] Do not clean the values of 'nans' ('nans' rules)"
+        "Metadata file(s) in tab, glob pattern(s) (in quotes) "
+        "or folder(s) of metadata files."
     ),
 )
 @click.option(
-    "-per",
-    "--no-per-column",
+    "-o",
+    "--o-metadata-dir",
     required=False,
-    is_flag=True,
-    default=False,
+    default=None,
     help=(
-        "[YAML] Do not apply the per-column rules ('per_column' rules)"
+        "Output folder for the cleaned metadata files, in sub-folders "
+        "for the files with the same name (Default: next to each metadata file)."
     ),
 )
 @click.option(
-    "-sol",
-    "--no-solve-dtypes",
+    "-j",
+    "--jobs",
     required=False,
-    is_flag=True,
-    default=False,
-    help=(
-        "[YAML] Do not check the dtypes of the columns ('solve_dtypes' rule)"
-    ),
+    default=1,
+    type=int,
+    show_default=True,
+    help="Number of processes cleaning metadata files in parallel.",
 )
 @click.option(
-    "-tim",
-    "--no-time-format",
+    "--summary",
     required=False,
-    is_flag=True,
-    default=False,
+    default=None,
     help=(
-        "[YAML] Do not clean the formatting of the time/date ('time_format' rule)"
+        "Output file for the per-file status and timing (Default: "
+        "'metadata_cleaning_batch.tsv' in the output folder)."
     ),
 )
+@add_cleaning_options
+def run_batch_cleaning(
+    r_yaml_file,
+    m_metadata_file,
+    o_metadata_dir,
+    jobs,
+    summary,
+    categorical_ratio,
+    input_format,
+    reader,
+    **kwargs
+):
+    """
+    Perform the cleaning of many metadata files with the same rules.
+    """
+    from metadata_cleaning._batch_utils import run_batch
+
+    cleaning_args = get_cleaning_args(r_yaml_file, **kwargs)
+
+    statuses = run_batch(
+        m_metadata_file,
+        cleaning_args,
+        o_metadata_dir,
+        jobs,
+        summary,
+        categorical_ratio,
+        input_format,
+        reader
+    )
+    if any(status['status'] != 'done' for status in statuses):
+        raise SystemExit(1)
+
+
+@metadata_clean_cli.command("validate")
+@click.option(
+    "-r",
+    "--r-yaml-file",
+    required=True,
+    help="Rules file in yaml format."
+)
 @click.option(
     "-v",
     "--verbose",
     required=False,
     is_flag=True,
+    help="Show the rules."
+)
+def run_validation(r_yaml_file, verbose):
+    """
+    Check a rules file without cleaning any metadata.
+    """
+    from metadata_cleaning._yaml_utils import parse_yaml_file
+
+    # raises on invalid rules
+    parse_yaml_file(r_yaml_file, verbose)
+    print('Rules file "%s" can be used for cleaning.' % r_yaml_file)
+
+
+@metadata_clean_cli.command("serve")
+@click.option(
+    "--socket",
+    "socket_fp",
+    required=False,
+    default=None,
     help=(
-        "Show the rules and other info about encountered issue "
-        "while cleaning."
+        "Unix socket to listen on (Default: "
+        "'metadata_cleaning-<user>.sock' in the temporary folder)."
     ),
 )
-@click.version_option(__version__, prog_name="metadata_clean")
+@click.option(
+    "-j",
+    "--jobs",
+    required=False,
+    default=1,
+    type=int,
+    show_default=True,
+    help="Number of processes cleaning metadata files in parallel.",
+)
+def run_server(socket_fp, jobs):
+    """
+    Run a local server cleaning the metadata files submitted
+    with "submit", with the rules kept parsed and compiled.
+    """
+    import signal
+    from metadata_cleaning._serve_utils import make_server
 
-def run_cleaning(
+    try:
+        server = make_server(socket_fp, jobs)
+    except OSError as e:
+        raise click.ClickException(str(e))
+    # stop as on Ctrl-C, to remove the socket
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print('Cleaning server listening on "%s" (%s job(s))' % (server.socket_fp, jobs), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@metadata_clean_cli.command("submit")
+@click.option(
+    "-r",
+    "--r-yaml-file",
+    required=True,
+    help="Rules file in yaml format."
+)
+@click.option(
+    "-m",
+    "--m-metadata-file",
+    required=True,
+    help="Metadata file in tab"
+)
+@click.option(
+    "-o",
+    "--o-metadata-file",
+    required=False,
+    default=None,
+    help="Output Metadata file name (Default: '*_clean.tsv')."
+)
+@click.option(
+    "--socket",
+    "socket_fp",
+    required=False,
+    default=None,
+    help="Unix socket of the server (Default: the one of \"serve\")."
+)
+@add_cleaning_options
+def run_submission(
     r_yaml_file,
     m_metadata_file,
-    nan_value,
     o_metadata_file,
-    sample_id,
-    no_booleans,
-    no_combinations,
-    no_del_columns,
-    no_forbidden_characters,
-    no_nans,
-    no_per_column,
-    no_solve_dtypes,
-    no_time_format,
-    verbose
+    socket_fp,
+    **kwargs
 ):
     """
-    Perform the cleaning of metadata on command line.
+    Clean a metadata file by the server started with "serve"
+    and wait for the end of the cleaning.
     """
+    from metadata_cleaning._serve_utils import SOCKET_FP, make_clean_job, send_request
 
-    rules, na_value, nan_value_user, sample_id_cols = parse_yaml_file(
-        r_yaml_file,
-        verbose
-    )
-
-    # override sample IDs columns
-    if sample_id:
-        sample_id_cols = sample_id
-
-    # override default NaN
-    if nan_value:
-        nan_value_user = nan_value
-
-    metadata_pd = parse_metadata_file(
-        m_metadata_file,
-        sample_id_cols
-    )
-
-    metadata_clean(
-        rules,
-        no_booleans,
-        no_combinations,
-        no_del_columns,
-        no_forbidden_characters,
-        no_nans,
-        no_per_column,
-        no_solve_dtypes,
-        no_time_format,
-        na_value,
-        nan_value_user,
-        sample_id_cols,
-        metadata_pd,
-        m_metadata_file,
-        o_metadata_file,
-        verbose
-    )
+    job = make_clean_job(m_metadata_file, r_yaml_file, o_metadata_file, **kwargs)
+    try:
+        status = send_request(job, socket_fp)
+    except (FileNotFoundError, ConnectionRefusedError):
+        raise click.ClickException(
+            'No cleaning server on "%s" (start one with "serve").' % (
+                socket_fp or SOCKET_FP))
+    if status['status'] != 'done':
+        raise click.ClickException('Cleaning of "%s" failed: %s' % (
+            m_metadata_file, status['error']))
+    print('Cleaned "%s" (%s rows, %s columns) in %ss' % (
+        m_metadata_file, status['rows'], status['columns'], status['seconds']))
 
 
 if __name__ == "__main__":
-    run_cleaning()
+    metadata_clean_cli()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+from os.path import join, isfile
+import os
+import shutil
+import pandas as pd
+
+from metadata_cleaning._yaml_utils import parse_yaml_file
+from metadata_cleaning._plan_utils import RulePlan
+from metadata_cleaning import _batch_utils
+from metadata_cleaning._batch_utils import (
+    get_batch_metadata_fps,
+    get_batch_output_fp,
+    get_batch_output_fps,
+    clean_metadata_file,
+    run_batch
+)
+
+
+def clean_or_kill(metadata_fp, *args):
+    # a worker killed while cleaning (e.g. out of memory)
+    if os.path.basename(metadata_fp) == 'kill.tsv':
+        os._exit(1)
+    return clean_metadata_file(metadata_fp, *args)
+
+
+def test_get_batch_metadata_fps():
+    md_dir = join("test_datasets", "input", "metadata")
+    full = join(md_dir, "metadata_test_full.tsv")
+    xy = join(md_dir, "metadata_test_XYSampleDtypes.tsv")
+    missing = join(md_dir, "metadata_test_NOFILE.tsv")
+    # largest first, missing last, no duplicates
+    assert [full, xy, missing] == get_batch_metadata_fps([xy, missing, full, xy])
+    assert [full, xy] == get_batch_metadata_fps([join(md_dir, "metadata_test_[fX]*.tsv")])
+    fps = get_batch_metadata_fps([md_dir])
+    assert full in fps
+    assert join(md_dir, "dummy_clean.tsv") not in fps
+
+
+def test_get_batch_output_fp():
+    assert get_batch_output_fp(join('a', 'b.tsv'), None) is None
+    assert join('out', 'b') == get_batch_output_fp(join('a', 'b.tsv'), 'out')
+
+
+def test_get_batch_output_fps():
+    fps = [join('x', 'a', 'md.tsv'), join('x', 'b', 'c', 'md.tsv'), join('x', 'md.tsv'),
+           join('x', 'md.xlsx'), join('x', 'other.tsv')]
+    assert {fps[0]: join('out', 'a', 'md'), fps[1]: join('out', 'b', 'c', 'md'),
+            fps[2]: join('out', 'md_tsv'), fps[3]: join('out', 'md_xlsx'),
+            fps[4]: join('out', 'other')} == get_batch_output_fps(fps, 'out')
+    assert {fps[0]: None, fps[1]: None} == get_batch_output_fps(fps[:2], None)
+
+
+def test_run_batch(tmpdir, monkeypatch):
+    rules_fp = join("test_datasets", "input", "rules", "cleaning_rules.yaml")
+    rules, nan_value, nan_value_user, sample_id_cols = parse_yaml_file(rules_fp, False)
+    cleaning_args = {
+        'rules': rules, 'no_booleans': False, 'no_combinations': False,
+        'no_del_columns': False, 'no_forbidden_characters': False, 'no_nans': False,
+        'no_per_column': False, 'no_solve_dtypes': False, 'no_time_format': False,
+        'nan_value': nan_value, 'nan_value_user': nan_value_user,
+        'sample_id_cols': sample_id_cols, 'show': False,
+        'plan': RulePlan(rules, nan_value)
+    }
+    md_dir = join("test_datasets", "input", "metadata")
+    md_fps = [join(md_dir, "dummy.tsv"), join(md_dir, "metadata_test_empty.tsv")]
+    output_dir = str(tmpdir)
+    for jobs in [1, 2]:
+        statuses = run_batch(md_fps, cleaning_args, output_dir, jobs)
+        # the failing file does not stop the batch
+        assert ['done', 'failed'] == [x['status'] for x in statuses]
+        assert (13, 16) == (statuses[0]['rows'], statuses[0]['columns'])
+        assert isfile(join(output_dir, 'dummy_clean.tsv'))
+        summary_pd = pd.read_csv(join(output_dir, 'metadata_cleaning_batch.tsv'), sep='\t')
+        assert md_fps == summary_pd['metadata_fp'].tolist()
+    # files with the same name do not overwrite each other's outputs
+    md_fps = []
+    for folder in ['a', 'b']:
+        os.makedirs(join(str(tmpdir), 'in', folder))
+        md_fps.append(join(str(tmpdir), 'in', folder, 'dummy.tsv'))
+        shutil.copy(join(md_dir, "dummy.tsv"), md_fps[-1])
+    output_dir = join(str(tmpdir), 'out')
+    statuses = run_batch(md_fps, cleaning_args, output_dir)
+    assert ['done', 'done'] == [x['status'] for x in statuses]
+    for folder in ['a', 'b']:
+        assert isfile(join(output_dir, folder, 'dummy_clean.tsv'))
+
+    # a killed worker only fails its file, and the batch goes on in a new pool
+    md_fps = []
+    for name in ['a', 'kill', 'b', 'c', 'd']:
+        md_fps.append(join(str(tmpdir), 'in', '%s.tsv' % name))
+        shutil.copy(join(md_dir, "dummy.tsv"), md_fps[-1])
+    output_dir = join(str(tmpdir), 'out_kill')
+    monkeypatch.setattr(_batch_utils, 'clean_metadata_file', clean_or_kill)
+    statuses = run_batch(md_fps, cleaning_args, output_dir, 2)
+    assert md_fps == [x['metadata_fp'] for x in statuses]
+    assert ['done', 'failed', 'done', 'done', 'done'] == [x['status'] for x in statuses]
+    assert statuses[1]['error'].startswith('BrokenProcessPool')
+    summary_pd = pd.read_csv(join(output_dir, 'metadata_cleaning_batch.tsv'), sep='\t')
+    assert md_fps == summary_pd['metadata_fp'].tolist()
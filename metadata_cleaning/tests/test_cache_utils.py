@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import pandas as pd
+from pandas.util.testing import assert_series_equal
+
+from metadata_cleaning._plan_utils import RulePlan
+from metadata_cleaning._cache_utils import (
+    ColumnCache,
+    get_column_content_hash,
+    get_column_rules
+)
+
+
+def test_get_column_content_hash():
+    col = pd.Series(['a', 'b', None], name='x')
+    assert get_column_content_hash(col) == get_column_content_hash(col.copy())
+    assert get_column_content_hash(col) != get_column_content_hash(col.rename('y'))
+    assert get_column_content_hash(col) != get_column_content_hash(
+        pd.Series(['a', 'c', None], name='x'))
+    assert get_column_content_hash(col) != get_column_content_hash(col.astype('category'))
+
+
+def test_get_column_rules():
+    rules = {'nans': ['unknown'], 'booleans': {'yes': True},
+             'per_column': {'age': ['range(0,120)'], 'bmi': ['range(15,50)']},
+             'time_format': {'columns': ['date'], 'format': 'YYYY'}}
+    plan = RulePlan(rules, 'Missing')
+    age_rules = get_column_rules('AGE_CORR', rules, False, False, False, False, 'Missing', plan)
+    assert ('per_column', 'age', ['range(0,120)']) in age_rules
+    assert 'bmi' not in repr(age_rules)
+    assert 'time_format' not in repr(age_rules)
+    date_rules = get_column_rules('date', rules, False, False, False, False, 'Missing', plan)
+    assert ('time_format', [('format', 'YYYY')]) in date_rules
+    # a rule that is not applied is not part of the key
+    assert 'unknown' not in repr(get_column_rules('date', rules, False, True, False, False,
+                                                  'Missing', plan))
+    rules['per_column']['bmi'].append('range(10,60)')
+    assert age_rules == get_column_rules('AGE_CORR', rules, False, False, False, False,
+                                         'Missing', plan)
+
+
+def test_column_cache(tmpdir):
+    cache = ColumnCache(str(tmpdir))
+    col = pd.Series(['a', 'Missing'], name='x')
+    assert cache.get('key1') is None
+    cache.put('key1', col, {'x': {'unknown'}})
+    entry = cache.get('key1')
+    assert_series_equal(col, entry['column'])
+    assert {'x': {'unknown'}} == entry['nan_decisions']
+    assert (1, 1) == (cache.hits, cache.misses)
+
+    # the least recently used entries are removed beyond the maximum size
+    for key in ['key2', 'key3']:
+        cache.put(key, col, {})
+    entry_size = os.path.getsize(cache.get_fp('key1'))
+    for mtime, key in enumerate(['key2', 'key1', 'key3']):
+        os.utime(cache.get_fp(key), (mtime, mtime))
+    cache.max_size = 2 * entry_size
+    assert 1 == cache.evict()
+    assert not os.path.isfile(cache.get_fp('key2'))
+    assert os.path.isfile(cache.get_fp('key1'))
+    assert 0 == cache.evict()
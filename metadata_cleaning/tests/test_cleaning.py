@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import sys
+import subprocess
+from os.path import abspath, dirname, join
+
+ROOT = dirname(dirname(dirname(abspath(__file__))))
+CLI_FP = join(ROOT, 'metadata_cleaning', 'scripts', 'cleaning.py')
+
+
+def get_imported_modules(args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', CLI_FP] + args, env=env,
+                            check=True, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True).stderr
+    return set(line.rsplit('|', 1)[-1].strip().split('.')[0]
+               for line in stderr.splitlines() if line.startswith('import time:'))
+
+
+def test_cli_cold_start():
+    rules_fp = abspath(join("test_datasets", "input", "rules", "rules_test_full.yaml"))
+    for args in [['--help'], ['--version'], ['clean', '--help'], ['validate', '-r', rules_fp]]:
+        modules = get_imported_modules(args)
+        assert 'click' in modules
+        assert not {'pandas', 'numpy'} & modules
+
+
+def test_get_cleaning_args_profile():
+    from metadata_cleaning.scripts.cleaning import get_cleaning_args
+    rules_fp = join("test_datasets", "input", "rules", "rules_test_full.yaml")
+    options = dict(nan_value=None, sample_id=None, no_booleans=False, no_combinations=False,
+                   no_del_columns=False, no_forbidden_characters=False, no_nans=False,
+                   no_per_column=False, no_solve_dtypes=False, no_time_format=False,
+                   output_format=None, compression=None, no_cache=True, cache_dir=None,
+                   cache_size=1, verbose=False)
+    assert get_cleaning_args(rules_fp, profile=False, **options)['profile'] is None
+    assert get_cleaning_args(rules_fp, profile=True, **options)['profile'] is True
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+from metadata_cleaning._columns_utils import ColumnIndex
+
+
+def test_column_index():
+    columns = ['sample_name', 'age', 'AGE_CORR', 'Age', 'weight', 'page_count']
+    column_index = ColumnIndex(columns)
+    assert 'AGE_CORR' in column_index
+    assert 'age_corr' not in column_index
+    assert ['age', 'Age'] == column_index.get_lower('AGE')
+    assert [] == column_index.get_lower('ag')
+    # same as the lowercase substring lookup over all the columns
+    for name in ['age', 'AGE', 'e', 'ample_n', 'nt', 'x', 'page_count', '']:
+        assert [x for x in columns if name.lower() in x.lower()] == \
+               column_index.get_containing(name)
+    assert 'age' in column_index.cache
+    # deleting columns invalidates the cache
+    column_index.delete(['Age', 'page_count', 'not_there'])
+    assert ['sample_name', 'age', 'AGE_CORR', 'weight'] == column_index.columns
+    assert {} == column_index.cache
+    assert ['age', 'AGE_CORR'] == column_index.get_containing('age')
+    assert [] == ColumnIndex([]).get_containing('age')
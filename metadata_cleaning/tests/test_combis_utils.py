@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import pandas as pd
+import numpy as np
+
+from pandas.util.testing import assert_frame_equal
+
+from metadata_cleaning._combis_utils import (
+    get_combinations_rule_details,
+    get_columns_from_combination,
+    get_rule_column_mask,
+    get_combination_mask,
+    make_combinations_cleaning
+)
+
+
+def test_get_combinations_rule_details():
+    assert {'age': ('in', 0., 4.), 'alcohol': ('is', True, None)} == get_combinations_rule_details(
+        ('age', 'alcohol'), ('range(0,4)', True))
+    assert {'age': ('>', 20., None), 'bmi': ('<', 15., None)} == get_combinations_rule_details(
+        ('age', 'bmi'), ('range(20,None)', 'range(None,15)'))
+
+
+def test_get_columns_from_combination():
+    md = pd.DataFrame({'AGE_years': [1], 'alcohol_gin': [1], 'alcohol_consumption': [1]})
+    assert {'age': ['AGE_years'], 'alcohol': ['alcohol_gin', 'alcohol_consumption']} == \
+           get_columns_from_combination(md, ('age', 'alcohol'))
+
+
+def test_get_rule_column_mask():
+    col = pd.Series([0, 3, 5, 'nan', 'x', '4'], dtype='object')
+    assert [True, True, False, False, False, True] == get_rule_column_mask(
+        col, ('in', 0., 4.), set()).tolist()
+    assert [False, False, True, False, False, True] == get_rule_column_mask(
+        col, ('>', 4., None), set()).tolist()
+    assert [True, True, False, False, False, True] == get_rule_column_mask(
+        col, ('<', 4., None), set()).tolist()
+    # edited values are not compared
+    assert [True, True, False, False, False, False] == get_rule_column_mask(
+        col, ('in', 0., 4.), {'4'}).tolist()
+    # floats are not digits
+    assert [False, False] == get_rule_column_mask(
+        pd.Series([1., 2.]), ('in', 0., 4.), set()).tolist()
+    col = pd.Series(['Yes', 'No', 'True', 'False', '1', '0', 'nan'])
+    assert [True, False, True, False, True, False, False] == get_rule_column_mask(
+        col, ('is', True, None), set()).tolist()
+    assert [False, True, False, True, False, True, False] == get_rule_column_mask(
+        col, ('is', False, None), set()).tolist()
+
+
+def test_get_combination_mask():
+    md = pd.DataFrame({'age': [1, 10, 1, 10],
+                       'alcohol_gin': ['Yes', 'Yes', 'No', 'No'],
+                       'alcohol_rum': ['No', 'No', 'Yes', 'No']})
+    cur_rules = {'age': ('in', 0., 4.), 'alcohol': ('is', True, None)}
+    columns_match = {'age': ['age'], 'alcohol': ['alcohol_gin', 'alcohol_rum']}
+    assert [True, False, True, False] == get_combination_mask(
+        md, cur_rules, columns_match, {}).tolist()
+    # no rule to check
+    assert [True, True, True, True] == get_combination_mask(
+        md, {}, columns_match, {}).tolist()
+
+
+def test_make_combinations_cleaning():
+    md_in = pd.DataFrame({'age': [1, 10, 2, 'nan'],
+                          'alcohol_consumption': ['Yes', 'Yes', 'No', 'Yes']})
+    nan_decisions = {'age': {'nan'}, 'alcohol_consumption': set()}
+    md_out = pd.DataFrame({'age': [1, 10, 2, 'nan'],
+                           'alcohol_consumption': ['nan', 'Yes', 'No', 'Yes']})
+    assert_frame_equal(md_out, make_combinations_cleaning(
+        md_in.copy(), ('age', 'alcohol_consumption'),
+        [('range(0,4)', True), 'alcohol_consumption'], nan_decisions, 'nan'))
+    md_out = pd.DataFrame({'age': [1, 10, 2, 'nan'],
+                           'alcohol_consumption': [np.nan, 'Yes', 'No', 'Yes']})
+    assert_frame_equal(md_out, make_combinations_cleaning(
+        md_in.copy(), ('age', 'alcohol_consumption'),
+        [('range(0,4)', True), {'alcohol_consumption': np.nan}], nan_decisions, 'nan'))
+    # a column of the combination is missing
+    assert_frame_equal(md_in, make_combinations_cleaning(
+        md_in.copy(), ('age', 'pregnant'),
+        [('range(0,4)', True), 'pregnant'], nan_decisions, 'nan'))
@@ -7,17 +7,37 @@
 # The full license is in the file LICENSE.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 from os.path import join
+import numpy as np
 import pandas as pd
 import pytest
 import glob
+import tempfile
 
 from pandas.util.testing import assert_frame_equal
 
 from metadata_cleaning._df_utils import (
     validate_fp,
     validate_pd,
+    read_arrow_csv,
     read_input_metadata,
-    parse_metadata_file
+    parse_metadata_file,
+    make_categorical_columns,
+    make_object_columns,
+    make_columns_frame,
+    get_read_kinds,
+    merge_read_kinds,
+    get_read_dtypes,
+    read_metadata_chunks,
+    spill_chunk,
+    read_spilled_chunks,
+    get_table_format,
+    get_clean_metadata_fp,
+    get_clean_metadata_user_fp,
+    get_typed_metadata,
+    write_tsv_outputs,
+    write_metadata_table,
+    write_outputs,
+    append_outputs
 )
 
 
@@ -50,6 +70,35 @@ def test_read_input_metadata():
     assert_frame_equal(md_pd, read_input_metadata(md_fp, False, ['X', 'Y']))
 
 
+def test_read_arrow_csv(tmpdir):
+    pytest.importorskip('pyarrow')
+    # same tables as with the pandas reader
+    for md_fp in glob.glob(join("test_datasets", "input", "metadata", "*.tsv")):
+        if 'empty' in md_fp:
+            continue
+        assert_frame_equal(read_input_metadata(md_fp, False, ['sample_name']),
+                           read_input_metadata(md_fp, False, ['sample_name'], None, 'arrow'))
+    md_fp = join(str(tmpdir), 'md.tsv')
+    with open(md_fp, 'w') as o:
+        o.write('sample_name\tempty\tbool\tdate\ttime\tsex\n'
+                '001\t\tTrue\t2015-01-01\t00:20\tmale\n'
+                '002\t\t\t 2015-01-02\t00:21\tNA\n')
+    md_pd = pd.DataFrame({'sample_name': ['001', '002'], 'empty': [np.nan, np.nan],
+                          'bool': [True, np.nan], 'date': ['2015-01-01', ' 2015-01-02'],
+                          'time': ['00:20', '00:21'], 'sex': ['male', np.nan]})
+    assert_frame_equal(md_pd, read_input_metadata(md_fp, False, ['sample_name']))
+    assert_frame_equal(md_pd, read_arrow_csv(md_fp, ['sample_name']))
+    assert_frame_equal(md_pd[['sex', 'sample_name']],
+                       read_arrow_csv(md_fp, ['sample_name'], ['sex', 'sample_name']))
+    # dates only after the first block read by pyarrow (1MB)
+    with open(md_fp, 'w') as o:
+        o.write('sample_name\tdate\n')
+        o.write(''.join('%s\t\n' % x for x in range(200000)))
+        o.write('200000\t2015-01-01\n')
+    assert_frame_equal(read_input_metadata(md_fp, False, ['sample_name']),
+                       read_arrow_csv(md_fp, ['sample_name']))
+
+
 def test_parse_metadata_file():
     md_fp = join("test_datasets", "input", "metadata", "metadata_test_XYSampleDtypes.tsv")
     md_pd = pd.DataFrame({'X': ['1', '2', '3'],
@@ -68,3 +117,196 @@ def test_parse_metadata_file():
     md_pd = pd.read_csv(md_fp, header=0, sep='\t',
                         dtype=dict((x, 'str') for x in sample_cols))
     assert_frame_equal(md_pd, parse_metadata_file(md_fp, sample_cols))
+
+
+def test_make_categorical_columns():
+    md_pd = pd.DataFrame({'sample_name': ['1', '1', '2', '3'],
+                          'sex': ['male', 'female', 'male', 'male'],
+                          'host': ['a', 'b', 'c', 'd'],
+                          'age': [1, 1, 1, 1]})
+    md_cat = make_categorical_columns(md_pd.copy(), ['sample_name'], 0.5)
+    assert ['object', 'category', 'object', 'int64'] == [str(x) for x in md_cat.dtypes]
+    assert_frame_equal(md_pd, make_object_columns(md_cat))
+
+    md_fp = join("test_datasets", "input", "metadata", 'metadata_test_full.tsv')
+    md_pd = parse_metadata_file(md_fp, ['sample_name'], 0.5)
+    assert 'category' == str(md_pd['sex'].dtype)
+    assert 'object' == str(md_pd['sample_name'].dtype)
+    assert_frame_equal(parse_metadata_file(md_fp, ['sample_name']), make_object_columns(md_pd))
+
+
+def test_make_columns_frame():
+    md_pd = pd.DataFrame({'sample_name': ['1', '2', '3'],
+                          'sex': ['male', 'female', 'nan'],
+                          'age': [1., 2., 3.],
+                          'bmi': [20., 25., 30.]}, index=['a', 'b', 'c'])
+    assert md_pd is make_columns_frame(md_pd)
+    new_sex = pd.Series(['male', 'female', np.nan], index=md_pd.index)
+    columns_pd = make_columns_frame(md_pd, {'sex': new_sex})
+    assert_frame_equal(md_pd.assign(sex=new_sex), columns_pd)
+    # the other columns are not copied
+    for col in ['sample_name', 'age', 'bmi']:
+        assert np.shares_memory(md_pd[col].to_numpy(), columns_pd[col].to_numpy())
+    assert 'nan' == md_pd['sex'].iloc[2]
+
+    columns_pd = make_columns_frame(md_pd, columns=['bmi', 'sample_name'])
+    assert_frame_equal(md_pd[['bmi', 'sample_name']], columns_pd)
+    assert np.shares_memory(md_pd['bmi'].to_numpy(), columns_pd['bmi'].to_numpy())
+
+
+def test_read_metadata_chunks():
+    md_fp = join("test_datasets", "input", "metadata", 'metadata_test_full.tsv')
+    sample_cols = ['sample_name']
+    md_pd = parse_metadata_file(md_fp, sample_cols)
+    chunks = list(read_metadata_chunks(md_fp, sample_cols, 5))
+    assert [5, 5, 3] == [chunk.shape[0] for chunk in chunks]
+    for cdx, chunk in enumerate(chunks):
+        assert_frame_equal(md_pd.iloc[(cdx * 5):((cdx + 1) * 5)].reset_index(drop=True),
+                           chunk, check_dtype=False)
+    chunks = list(read_metadata_chunks(md_fp, sample_cols, 5, lambda x: x in sample_cols))
+    assert ['sample_name'] == chunks[0].columns.tolist()
+
+
+def test_get_read_dtypes(tmpdir):
+    md_fp = str(tmpdir.join('md.tsv'))
+    md_pd = pd.DataFrame({'sample_name': ['a', 'b', 'c', 'd'], 'int': ['1', '2', '3', '4'],
+                          'float': ['1', '2', '', '4'], 'str': ['1', '2', 'x', '4'],
+                          'bool': ['True', 'False', '', 'True'], 'mix': ['True', '0', '1', '2'],
+                          'nan': ['', '', '', '']})
+    md_pd.to_csv(md_fp, index=False, sep='\t')
+    chunks = list(read_metadata_chunks(md_fp, ['sample_name'], 2))
+    assert 'int64' == str(chunks[0]['float'].dtype)
+    read_kinds = {}
+    for chunk in chunks:
+        read_kinds = merge_read_kinds(read_kinds, get_read_kinds(chunk))
+    assert {'int'} == read_kinds['int']
+    assert {'int', 'float', 'nan'} == read_kinds['float']
+    assert {'nan'} == read_kinds['nan']
+    read_dtypes = get_read_dtypes(read_kinds)
+    assert {'sample_name': 'str', 'int': 'int64', 'float': 'float64', 'str': 'str',
+            'bool': 'object', 'mix': 'str', 'nan': 'float64'} == read_dtypes
+    # each chunk is read as a part of the entire table
+    full_pd = parse_metadata_file(md_fp, ['sample_name'])
+    chunks = list(read_metadata_chunks(md_fp, ['sample_name'], 2, None, read_dtypes))
+    for cdx, chunk in enumerate(chunks):
+        assert_frame_equal(full_pd.iloc[(cdx * 2):((cdx + 1) * 2)].reset_index(drop=True), chunk)
+
+
+def test_read_spilled_chunks():
+    md_fp = join("test_datasets", "input", "metadata", 'metadata_test_full.tsv')
+    chunks = list(read_metadata_chunks(md_fp, ['sample_name'], 5))
+    with tempfile.TemporaryFile() as spill:
+        assert [] == list(read_spilled_chunks(spill))
+        for chunk in chunks:
+            spill_chunk(chunk, spill)
+        spilled = list(read_spilled_chunks(spill))
+    assert len(chunks) == len(spilled)
+    for chunk, spilled_chunk in zip(chunks, spilled):
+        assert_frame_equal(chunk, spilled_chunk)
+
+
+def test_get_table_format():
+    assert 'tsv' == get_table_format('md.tsv')
+    assert 'tsv' == get_table_format('md.txt')
+    assert 'excel' == get_table_format('md.xlsx')
+    assert 'parquet' == get_table_format('md.PARQUET')
+    assert 'feather' == get_table_format('md.feather')
+    assert 'parquet' == get_table_format('md.txt', 'parquet')
+    assert 'md_clean.parquet' == get_clean_metadata_fp('md.tsv', None, 'parquet')
+    assert 'out_clean.feather' == get_clean_metadata_fp('md.tsv', 'out', 'feather')
+    assert 'out.tsv' == get_clean_metadata_fp('md.tsv', 'out.tsv', 'feather')
+    assert 'md_clean.tsv.gz' == get_clean_metadata_fp('md.tsv', None, None, 'gzip')
+    assert 'out.tsv.zst' == get_clean_metadata_fp('md.tsv', 'out.tsv', None, 'zstd')
+    assert 'out.tsv.gz' == get_clean_metadata_fp('md.tsv', 'out.tsv.gz', None, 'gzip')
+    assert 'out.parquet' == get_clean_metadata_fp('md.tsv', 'out.parquet', None, 'gzip')
+    # the user output does not overwrite an explicit output file
+    user_fp = get_clean_metadata_user_fp('md.tsv', 'out.tsv.gz', None, 'gzip')
+    assert user_fp.startswith('out_') and user_fp.endswith('.tsv.gz')
+
+
+def test_get_typed_metadata():
+    md_pd = pd.DataFrame({'sample_name': ['1', '2', '3'],
+                          'mixed': ['a', 1, np.nan],
+                          'cat': pd.Categorical(['x', np.nan, 'x']),
+                          'age': [1., np.nan, 3.]}, index=[5, 6, 7])
+    typed_pd = pd.DataFrame({'sample_name': ['1', '2', '3'],
+                             'mixed': ['a', '1', np.nan],
+                             'cat': ['x', np.nan, 'x'],
+                             'age': [1., np.nan, 3.]})
+    assert_frame_equal(typed_pd, get_typed_metadata(md_pd))
+
+
+@pytest.mark.parametrize('extension', ['parquet', 'feather'])
+def test_arrow_metadata(tmpdir, extension):
+    pytest.importorskip('pyarrow')
+    md_pd = pd.DataFrame({'sample_name': ['1', '2', '3'],
+                          'sex': ['male', np.nan, 'female'],
+                          'age': [1., np.nan, 3.]})
+    md_fp = join(str(tmpdir), 'md.%s' % extension)
+    write_metadata_table(md_pd, md_fp)
+    # the numeric columns are kept as numbers
+    assert_frame_equal(md_pd, parse_metadata_file(md_fp, ['sample_name']))
+    assert_frame_equal(md_pd[['sample_name', 'age']],
+                       parse_metadata_file(md_fp, ['sample_name'], usecols=['sample_name', 'age']))
+    # the sample IDs are read as strings
+    md_fp = join(str(tmpdir), 'md_int.%s' % extension)
+    write_metadata_table(md_pd.assign(sample_name=[1, 2, 3]), md_fp)
+    assert_frame_equal(md_pd, parse_metadata_file(md_fp, ['sample_name']))
+    # the format can be passed for any file name
+    md_txt_fp = join(str(tmpdir), 'md_%s.txt' % extension)
+    write_metadata_table(md_pd, md_txt_fp, extension)
+    assert_frame_equal(md_pd, parse_metadata_file(md_txt_fp, ['sample_name'], None, extension))
+    with pytest.raises(ValueError) as e:
+        list(read_metadata_chunks(md_fp, ['sample_name'], 2))
+    assert 'cannot be read by chunks' in str(e.value)
+    with pytest.raises(ValueError) as e:
+        append_outputs(md_pd, md_fp, None, 'nan', 'nan', True, extension)
+    assert 'cannot be written by chunks' in str(e.value)
+
+
+def test_write_tsv_outputs(tmpdir):
+    md_pd = pd.DataFrame({'sample_name': ['1', '2', '3', '4'],
+                          'sex': ['male', np.nan, 'female', 'a\tb'],
+                          'cat': pd.Categorical(['x', 'x', np.nan, 'y']),
+                          'age': [1.5, np.nan, 3., np.nan]})
+    out_fps = [join(str(tmpdir), 'out.tsv'), join(str(tmpdir), 'out_user.tsv')]
+    # same bytes as formatting each output on its own
+    expected = [md_pd.to_csv(index=False, sep='\t'),
+                md_pd.astype('object').fillna('not applicable').to_csv(index=False, sep='\t')]
+    for block_rows in [1, 3, 10]:
+        write_tsv_outputs(md_pd, out_fps, ['', 'not applicable'], block_rows=block_rows)
+        assert expected == [open(out_fp).read() for out_fp in out_fps]
+    # values that need to be quoted
+    write_tsv_outputs(md_pd, out_fps[:1], ['a\tb'])
+    assert open(out_fps[0]).read() == md_pd.astype('object').fillna('a\tb').to_csv(
+        index=False, sep='\t')
+    # the placeholder in the metadata is kept
+    md_pd['sex'] = ['\x1f', np.nan, 'female', 'male']
+    write_tsv_outputs(md_pd, out_fps, ['', 'nan'])
+    assert md_pd.to_csv(index=False, sep='\t') == open(out_fps[0]).read()
+    assert md_pd.astype('object').fillna('nan').to_csv(
+        index=False, sep='\t') == open(out_fps[1]).read()
+    # appended chunks
+    write_tsv_outputs(md_pd.iloc[:2], out_fps, ['', 'nan'], 'w', True)
+    write_tsv_outputs(md_pd.iloc[2:], out_fps, ['', 'nan'], 'a', False)
+    assert md_pd.to_csv(index=False, sep='\t') == open(out_fps[0]).read()
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'zstd'])
+def test_write_outputs_compression(tmpdir, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    md_pd = pd.DataFrame({'sample_name': ['1', '2', '3'],
+                          'sex': ['male', np.nan, 'female'],
+                          'age': [1., np.nan, 3.]})
+    md_fp = join(str(tmpdir), 'md.tsv')
+    out_fp = join(str(tmpdir), 'out')
+    write_outputs(md_pd, md_fp, out_fp, 'nan', 'missing', None, compression)
+    out_fps = [get_clean_metadata_fp(md_fp, out_fp, None, compression),
+               get_clean_metadata_user_fp(md_fp, out_fp, None, compression)]
+    assert_frame_equal(md_pd, parse_metadata_file(out_fps[0], ['sample_name']))
+    assert ['male', 'missing', 'female'] == parse_metadata_file(
+        out_fps[1], ['sample_name'])['sex'].tolist()
+    for first, chunk in [(True, md_pd.iloc[:2]), (False, md_pd.iloc[2:])]:
+        append_outputs(chunk, md_fp, out_fp, 'nan', 'missing', first, None, compression)
+    assert_frame_equal(md_pd, parse_metadata_file(out_fps[0], ['sample_name']))
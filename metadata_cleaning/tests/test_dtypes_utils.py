@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import re
+import pandas as pd
+import numpy as np
+from collections import Counter
+
+from metadata_cleaning import _dtypes_utils
+from metadata_cleaning._dtypes_utils import (
+    get_unique_values_inference,
+    get_dtypes_and_unks,
+    get_unks_counts,
+    get_certainly_NaNs,
+    get_dtypes_final,
+    is_str_column,
+    apply_dtypes_final
+)
+
+
+def test_get_unique_values_inference(monkeypatch):
+    uniques = np.array(['1', ' 2 ', 'inf', 'NaN', np.nan, 'not provided', 'a\nnan',
+                        'nan:unspecified', 'x²', 'None'], dtype=object)
+    inference = get_unique_values_inference(uniques, re.compile('nan'), 20, 'not provided')
+    nan_hits, is_nan, is_float, unks, is_nan_value = inference
+    assert [False, False, False, True, True, False, True, False, False, False] == nan_hits.tolist()
+    assert [False, False, False, True, True, False, False, False, False, False] == is_nan.tolist()
+    assert [True, True, True, False, False, False, False, False, False, False] == is_float.tolist()
+    assert ['not provided', 'a\nnan', 'nan:unspecified', 'none'] == unks
+    assert [5] == np.flatnonzero(is_nan_value).tolist()
+    # same inference by blocks of unique values
+    monkeypatch.setattr(_dtypes_utils, 'INFERENCE_BLOCK', 3)
+    for block, whole in zip(get_unique_values_inference(
+            uniques, re.compile('nan'), 20, 'not provided'), inference):
+        assert list(whole) == list(block)
+    assert [[]] * 5 == [list(x) for x in get_unique_values_inference(
+        np.array([], dtype=object), re.compile('nan'), 20)]
+    # the regex is searched in each value, as with re.search()
+    for regex in ['^nan$', r'nan\Z', '(?<!ba)nan(?!a)', 'a\nnan']:
+        nan_hits = get_unique_values_inference(
+            np.array(['nan', 'banana', 'a\nnan', 'nana'], dtype=object), re.compile(regex), 20)[0]
+        assert [bool(re.search(regex, x)) for x in ['nan', 'banana', 'a\nnan', 'nana']] == \
+            nan_hits.tolist()
+    # numbers
+    nan_hits, is_nan, is_float, unks, is_nan_value = get_unique_values_inference(
+        np.array([1., np.nan, -9999.]), re.compile('-9999'), 20)
+    assert [False, False, True] == nan_hits.tolist()
+    assert [False, True, False] == is_nan.tolist()
+    assert [True, False, True] == is_float.tolist()
+    assert [] == unks
+
+
+def test_get_dtypes_and_unks():
+    md_pd = pd.DataFrame({
+        'sample_name': ['1', '2', '3', '4'],
+        'age': [1., np.nan, 3., 4.],
+        'height': ['1', 'nan', '3', '4'],
+        'sex': ['male', 'Unknown', 'unknown', 'not provided'],
+        'date': ['2015-01-01', 'none', 'x²', '5']
+    })
+    floats_but_nan = {}
+    dtypes, potential_unks, nan_diversity = get_dtypes_and_unks(
+        md_pd, 'nan', ['sample_name'], 20, None, floats_but_nan)
+    assert {'sample_name': ['object', 'object'], 'age': ['float64', 'float64'],
+            'height': ['object', 'float64'], 'sex': ['object', 'object'],
+            'date': ['object', 'check']} == dtypes
+    assert {'male': ['sex'], 'unknown': ['sex', 'sex'], 'not provided': ['sex'],
+            'none': ['date']} == potential_unks
+    assert {'nan'} == set(x for x in nan_diversity if isinstance(x, str))
+    assert 1 == len([x for x in nan_diversity if not isinstance(x, str)])
+    assert {'age': True, 'height': True, 'sex': False, 'date': False} == floats_but_nan
+
+    dtypes, dtypes_final = get_dtypes_final(dtypes, md_pd, 'nan', ['sample_name'])
+    assert {'sample_name': 'O', 'age': 'Q', 'height': 'Q', 'sex': 'O',
+            'date': 'O'} == dtypes_final
+
+
+def test_get_certainly_NaNs():
+    md_pd = pd.DataFrame(dict(('col%s' % x, ['unknown', 'none', 'male', 'x%s' % x])
+                              for x in range(12)))
+    md_pd['sex'] = ['unknown', 'male', 'female', 'female']
+    unks_counts = Counter()
+    dtypes, potential_unks, nan_diversity = get_dtypes_and_unks(
+        md_pd, 'nan', [], 20, None, None, unks_counts)
+    assert {'unknown': 13, 'none': 12, 'male': 13, 'female': 1} == dict(
+        (x, unks_counts[x]) for x in ['unknown', 'none', 'male', 'female'])
+    assert unks_counts == get_unks_counts(potential_unks, md_pd.columns)
+    # only the columns of the table are counted
+    assert 2 == get_unks_counts({'unknown': ['a', 'b', 'b', 'c']}, ['a', 'b'])['unknown']
+
+    certainly_NaNs = get_certainly_NaNs(potential_unks, md_pd, 10, unks_counts)
+    assert ['male', 'none', 'unknown'] == certainly_NaNs.columns.tolist()
+    assert md_pd.columns.tolist() == certainly_NaNs.index.tolist()
+    assert [13, 12, 13] == certainly_NaNs.sum().tolist()
+    assert [1, 0, 1] == certainly_NaNs.loc['sex'].tolist()
+    assert certainly_NaNs.equals(get_certainly_NaNs(potential_unks, md_pd, 10))
+    assert [] == get_certainly_NaNs(potential_unks, md_pd, 20).columns.tolist()
+
+
+def test_apply_dtypes_final():
+    md_pd = pd.DataFrame({'sample_name': ['1', '2', '3'],
+                          'age': ['1', 'nan', '3'],
+                          'bmi': [20., 25., 30.],
+                          'sex': ['male', 'female', 'nan'],
+                          'host': ['a', 'b', 'c']})
+    assert is_str_column(md_pd['host'])
+    assert not is_str_column(md_pd['bmi'])
+    assert not is_str_column(pd.Series(['a', np.nan]))
+    dtypes_pd = apply_dtypes_final(md_pd, 'nan', {'sample_name': 'O', 'age': 'Q', 'bmi': 'Q',
+                                                  'sex': 'O', 'host': 'O'})
+    assert ['object', 'float64', 'float64', 'object', 'object'] == [
+        str(x) for x in dtypes_pd.dtypes]
+    assert [1., 3.] == dtypes_pd['age'].dropna().tolist()
+    assert ['male', 'female'] == dtypes_pd['sex'].dropna().tolist()
+    # the columns already with their final dtype are not copied
+    for col in ['sample_name', 'bmi', 'host']:
+        assert np.shares_memory(md_pd[col].to_numpy(), dtypes_pd[col].to_numpy())
+    assert 'nan' == md_pd['sex'][2]
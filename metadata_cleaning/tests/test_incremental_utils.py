@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from metadata_cleaning._incremental_utils import (
+    get_rows_fingerprints,
+    get_ids_summary,
+    get_previous_counts,
+    merge_ids_summaries,
+    get_new_ids_counts,
+    read_state,
+    write_state
+)
+
+
+def test_get_rows_fingerprints():
+    old_pd = pd.DataFrame({'sample_name': ['a', 'b', 'c'], 'x': [1, 2, 3]})
+    new_pd = pd.DataFrame({'sample_name': ['a', 'b', 'c', 'd'], 'x': [1, 2, 3, 4]})
+    fingerprints = get_rows_fingerprints(new_pd)
+    assert 4 == fingerprints.shape[0]
+    np.testing.assert_array_equal(get_rows_fingerprints(old_pd), fingerprints[:3])
+    # the integers read as floats (e.g. with an appended decimal number)
+    assert (get_rows_fingerprints(new_pd.astype({'x': float})) != fingerprints).all()
+
+
+def test_get_ids_summary():
+    md_pd = pd.DataFrame({'sample_name': ['a', 'b', 'a'], 'x': ['1', '2', '3']})
+    ids_summary = get_ids_summary(md_pd, ['sample_name', 'host_id'])
+    assert ['sample_name'] == list(ids_summary)
+    hashes, counts = ids_summary['sample_name']
+    np.testing.assert_array_equal([2, 1, 0, 0], get_previous_counts(
+        hashes, counts, np.array(['a', 'b', 'c', 'nan'], dtype=object)))
+    np.testing.assert_array_equal([0], get_previous_counts(hashes[:0], counts[:0], ['a']))
+    # the counts of new rows are added
+    new_summary = get_ids_summary(pd.DataFrame({'sample_name': ['c', 'a']}), ['sample_name'])
+    hashes, counts = merge_ids_summaries(ids_summary, new_summary)['sample_name']
+    np.testing.assert_array_equal([3, 1, 1], get_previous_counts(hashes, counts, ['a', 'b', 'c']))
+    assert 'int64' == str(counts.dtype)
+
+
+def test_get_new_ids_counts():
+    ids_summary = get_ids_summary(pd.DataFrame({'sample_name': ['a', 'b', 'b']}),
+                                  ['sample_name'])
+    new_pd = pd.DataFrame({'sample_name': ['b', 'c', 'c']})
+    id_counts, id_seen = get_new_ids_counts(new_pd, ['sample_name'], ids_summary, True)
+    assert {'sample_name': {'b': 3, 'c': 2}} == id_counts
+    # the new "b" is numbered after the two previous ones
+    assert {'sample_name': {'b': 3}} == id_seen
+    # a sample ID that was unique would get a suffix in the previous rows
+    new_pd = pd.DataFrame({'sample_name': ['a', 'c']})
+    assert get_new_ids_counts(new_pd, ['sample_name'], ids_summary, True)[1] is None
+    id_counts, id_seen = get_new_ids_counts(new_pd, ['sample_name'], ids_summary, False)
+    assert {'sample_name': {'a': 2, 'c': 1}} == id_counts
+    assert {'sample_name': {}} == id_seen
+
+
+def test_read_write_state(tmpdir):
+    state_fp = str(tmpdir.join('md_clean_state.npz'))
+    out_fp = str(tmpdir.join('md_clean.tsv'))
+    md_pd = pd.DataFrame({'sample_name': ['a', 'b'], 'x': ['1', '2']})
+    columns, dtypes = ['sample_name', 'x'], ['object', 'object']
+    fingerprints = get_rows_fingerprints(md_pd)
+    assert read_state(state_fp, 'hash', columns, dtypes, [out_fp], fingerprints) is None
+    with open(out_fp, 'w') as o:
+        o.write('sample_name\tx\na\t1\nb\t2\n')
+    write_state(state_fp, {'rules_hash': 'hash', 'columns': columns, 'dtypes': dtypes,
+                           'rows': 2, 'dtypes_final': {'x': 'Q'},
+                           'nan_decisions': {'x': [np.nan]}},
+                fingerprints, get_ids_summary(md_pd, ['sample_name']), [out_fp])
+    state = read_state(state_fp, 'hash', columns, dtypes, [out_fp], fingerprints)
+    assert 2 == state['rows']
+    assert {'x': 'Q'} == state['dtypes_final']
+    assert np.isnan(state['nan_decisions']['x'][0])
+    np.testing.assert_array_equal(fingerprints, state['fingerprints'])
+    np.testing.assert_array_equal([1, 1], state['ids']['sample_name'][1])
+    assert read_state(state_fp, 'other', columns, dtypes, [out_fp], fingerprints) is None
+    assert read_state(state_fp, 'hash', ['sample_name'], dtypes, [out_fp], fingerprints) is None
+    assert read_state(state_fp, 'hash', columns, ['object', 'int64'], [out_fp],
+                      fingerprints) is None
+    # appended rows only
+    md_pd = pd.DataFrame({'sample_name': ['a', 'b', 'c'], 'x': ['1', '2', '3']})
+    new_fingerprints = get_rows_fingerprints(md_pd)
+    assert read_state(state_fp, 'hash', columns, dtypes, [out_fp], new_fingerprints)
+    # a changed or deleted row
+    md_pd.loc[1, 'x'] = 'abc'
+    new_fingerprints = get_rows_fingerprints(md_pd)
+    assert read_state(state_fp, 'hash', columns, dtypes, [out_fp], new_fingerprints) is None
+    assert read_state(state_fp, 'hash', columns, dtypes, [out_fp], fingerprints[:1]) is None
+    # outputs changed since
+    with open(out_fp, 'a') as o:
+        o.write('c\t3\n')
+    assert read_state(state_fp, 'hash', columns, dtypes, [out_fp], fingerprints) is None
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+from os.path import join, isfile
+import os
+import json
+import pytest
+import numpy as np
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+
+from metadata_cleaning._yaml_utils import parse_yaml_file
+from metadata_cleaning._cache_utils import ColumnCache
+from metadata_cleaning._parallel_utils import ColumnWorkers
+from metadata_cleaning._df_utils import (
+    parse_metadata_file,
+    get_clean_metadata_fp,
+    get_clean_metadata_user_fp,
+    get_profile_fp,
+    get_state_fp,
+    get_outputs_fps,
+    format_tsv_blocks
+)
+from metadata_cleaning.metadata_clean import (
+    clean_frame,
+    metadata_clean,
+    metadata_clean_chunks,
+    metadata_clean_incremental
+)
+
+
+def get_cleaning_args(rules_fp):
+    rules, nan_value, nan_value_user, sample_id_cols = parse_yaml_file(rules_fp, False)
+    return {
+        'rules': rules, 'no_booleans': False, 'no_combinations': False,
+        'no_del_columns': False, 'no_forbidden_characters': False, 'no_nans': False,
+        'no_per_column': False, 'no_solve_dtypes': False, 'no_time_format': False,
+        'nan_value': nan_value, 'nan_value_user': nan_value_user,
+        'sample_id_cols': sample_id_cols, 'show': False
+    }
+
+
+def test_clean_frame(tmpdir, monkeypatch):
+    rules_fp = join("test_datasets", "input", "rules", "rules_test_full.yaml")
+    md_fp = join("test_datasets", "input", "metadata", "metadata_test_full.tsv")
+    cleaning_args = get_cleaning_args(rules_fp)
+    metadata_pd = parse_metadata_file(md_fp, cleaning_args['sample_id_cols'])
+    input_pd = metadata_pd.copy()
+    out_fp = join(str(tmpdir), 'out')
+    metadata_clean(metadata_pd=metadata_pd, metadata_fp=md_fp, output_fp=out_fp,
+                   **cleaning_args)
+    assert_frame_equal(input_pd, metadata_pd)
+
+    # same table as the first output, with nothing written
+    monkeypatch.chdir(str(tmpdir.mkdir('empty')))
+    rules_fp = join(os.path.dirname(__file__), rules_fp)
+    clean_pd, report = clean_frame(metadata_pd, rules_fp)
+    assert [] == os.listdir('.')
+    assert_frame_equal(input_pd, metadata_pd)
+    na_values = get_outputs_fps(md_fp, out_fp, cleaning_args['nan_value'],
+                                cleaning_args['nan_value_user'])[1][:1]
+    with open(get_clean_metadata_fp(md_fp, out_fp)) as f:
+        assert f.read() == ''.join(x[0] for x in format_tsv_blocks(clean_pd, na_values))
+    assert [list(metadata_pd.shape), list(clean_pd.shape)] == [
+        list(x) for x in zip(report['rows'], report['columns'])]
+    assert sorted(report['deleted_columns']) == sorted(
+        set(metadata_pd.columns) - set(clean_pd.columns))
+    assert report['nan_decisions']
+    assert str(clean_pd['bmi'].dtype) == report['dtypes']['bmi']
+
+    # the columns that no rule edits are shared with the input table
+    rules = cleaning_args['rules']
+    metadata_pd = pd.DataFrame({'sample_name': ['a', 'b', 'c'], 'x': [1.5, np.nan, 2.],
+                                'alcohol': ['True', 'False', 'True']})
+    input_pd = metadata_pd.copy()
+    clean_pd, report = clean_frame(metadata_pd, {'sample_id': rules['sample_id'],
+                                                 'booleans': rules['booleans']})
+    assert ['Yes', 'No', 'Yes'] == clean_pd['alcohol'].tolist()
+    assert 'x' in report['shared_columns']
+    assert 'alcohol' not in report['shared_columns']
+    assert_frame_equal(input_pd, metadata_pd)
+    with pytest.raises(ValueError):
+        clean_frame(metadata_pd, {'booleans': rules['booleans']})
+
+
+def test_clean_frame_workers():
+    md_fp = join("test_datasets", "input", "metadata", "metadata_test_full.tsv")
+    for rules_fp in ["rules_test_full.yaml", "cleaning_rules.yaml"]:
+        rules, nan_value, _, sample_id_cols = parse_yaml_file(
+            join("test_datasets", "input", "rules", rules_fp), False)
+        metadata_pd = parse_metadata_file(md_fp, sample_id_cols)
+        clean_pd, report = clean_frame(metadata_pd, rules, nan_value=nan_value)
+        # the same table and decisions as when the columns are cleaned in turn
+        for workers in [3, ColumnWorkers(2, threads=True)]:
+            workers_pd, workers_report = clean_frame(metadata_pd, rules, nan_value=nan_value,
+                                                     workers=workers)
+            assert_frame_equal(clean_pd, workers_pd)
+            assert report['nan_decisions'] == workers_report['nan_decisions']
+
+
+def test_metadata_clean_chunks(tmpdir):
+    rules_fp = join("test_datasets", "input", "rules", "cleaning_rules.yaml")
+    md_fp = join("test_datasets", "input", "metadata", "dummy.tsv")
+    cleaning_args = get_cleaning_args(rules_fp)
+    metadata_pd = parse_metadata_file(md_fp, cleaning_args['sample_id_cols'])
+    full_fp = join(str(tmpdir), 'full')
+    metadata_clean(metadata_pd=metadata_pd, metadata_fp=md_fp,
+                   output_fp=full_fp, **cleaning_args)
+    for chunksize in [2, 5, 100]:
+        chunks_fp = join(str(tmpdir), 'chunks_%s' % chunksize)
+        clean_fps = metadata_clean_chunks(metadata_fp=md_fp, output_fp=chunks_fp,
+                                          chunksize=chunksize, **cleaning_args)
+        assert 2 == len(clean_fps)
+        for full_out, chunks_out in zip([get_clean_metadata_fp(md_fp, full_fp),
+                                         get_clean_metadata_user_fp(md_fp, full_fp)],
+                                        clean_fps):
+            with open(full_out) as f, open(chunks_out) as g:
+                assert f.read() == g.read()
+
+    # the chunks are read with the dtypes of the entire table: the integers
+    # of a chunk without blanks are floats, as in the other chunks
+    heights_fp = join(str(tmpdir), 'heights.tsv')
+    pd.DataFrame({'sample_name': list('abcdef'), 'height': ['180', '175', '', '60', '300', '90'],
+                  'alcohol': ['True', 'False', 'True', '', 'x', 'True']}
+                 ).to_csv(heights_fp, index=False, sep='\t')
+    full_fp = join(str(tmpdir), 'heights_full')
+    metadata_clean(metadata_pd=parse_metadata_file(heights_fp, cleaning_args['sample_id_cols']),
+                   metadata_fp=heights_fp, output_fp=full_fp, **cleaning_args)
+    clean_fps = metadata_clean_chunks(metadata_fp=heights_fp, output_fp=join(str(tmpdir), 'heights'),
+                                      chunksize=2, **cleaning_args)
+    with open(get_clean_metadata_fp(heights_fp, full_fp)) as f, open(clean_fps[0]) as g:
+        assert f.read() == g.read()
+    assert '180.0' == pd.read_csv(clean_fps[0], sep='\t', dtype=str)['height'][0]
+
+    # the dates of a chunk are formatted as those of the entire table
+    cleaning_args['rules'] = dict(cleaning_args['rules'], time_format={
+        'columns': ['visit'], 'format': 'DD/MM/YYYY HH:MM'})
+    visits_fp = join(str(tmpdir), 'visits.tsv')
+    pd.DataFrame({'sample_name': ['a', 'b', 'c', 'd'],
+                  'visit': ['2015-01-01', '2015-01-02', '2015-01-03 10:30', '2015-01-04']}
+                 ).to_csv(visits_fp, index=False, sep='\t')
+    full_fp = join(str(tmpdir), 'visits_full')
+    metadata_clean(metadata_pd=parse_metadata_file(visits_fp, cleaning_args['sample_id_cols']),
+                   metadata_fp=visits_fp, output_fp=full_fp, **cleaning_args)
+    clean_fps = metadata_clean_chunks(metadata_fp=visits_fp, output_fp=join(str(tmpdir), 'visits'),
+                                      chunksize=2, **cleaning_args)
+    with open(get_clean_metadata_fp(visits_fp, full_fp)) as f, open(clean_fps[0]) as g:
+        assert f.read() == g.read()
+    clean_pd = pd.read_csv(clean_fps[0], sep='\t', dtype=str)
+    assert '01/01/2015 00:00' == clean_pd['visit'][0]
+
+
+def test_metadata_clean_parquet(tmpdir):
+    pytest.importorskip('pyarrow')
+    rules_fp = join("test_datasets", "input", "rules", "cleaning_rules.yaml")
+    md_fp = join("test_datasets", "input", "metadata", "dummy.tsv")
+    cleaning_args = get_cleaning_args(rules_fp)
+    metadata_pd = parse_metadata_file(md_fp, cleaning_args['sample_id_cols'])
+    tsv_fp = join(str(tmpdir), 'tsv')
+    metadata_clean(metadata_pd=metadata_pd.copy(), metadata_fp=md_fp,
+                   output_fp=tsv_fp, **cleaning_args)
+    parquet_fp = join(str(tmpdir), 'parquet')
+    metadata_clean(metadata_pd=metadata_pd.copy(), metadata_fp=md_fp, output_fp=parquet_fp,
+                   output_format='parquet', **cleaning_args)
+    tsv_pd = parse_metadata_file(get_clean_metadata_fp(md_fp, tsv_fp),
+                                 cleaning_args['sample_id_cols'])
+    parquet_pd = parse_metadata_file(get_clean_metadata_fp(md_fp, parquet_fp, 'parquet'),
+                                     cleaning_args['sample_id_cols'])
+    # the dtypes decided by "solve_dtypes" are those read back from the tsv
+    assert tsv_pd.dtypes.equals(parquet_pd.dtypes)
+    assert 'float64' == str(parquet_pd['bmi'].dtype)
+
+
+def test_metadata_clean_profile(tmpdir):
+    rules_fp = join("test_datasets", "input", "rules", "rules_test_full.yaml")
+    md_fp = join("test_datasets", "input", "metadata", "metadata_test_full.tsv")
+    cleaning_args = get_cleaning_args(rules_fp)
+    metadata_pd = parse_metadata_file(md_fp, cleaning_args['sample_id_cols'])
+    out_fp = join(str(tmpdir), 'out')
+    metadata_clean(metadata_pd=metadata_pd.copy(), metadata_fp=md_fp,
+                   output_fp=out_fp, profile=True, **cleaning_args)
+    with open(get_profile_fp(md_fp, out_fp)) as f:
+        report = json.load(f)
+    assert list(metadata_pd.shape) == [report['rows'], report['columns']]
+    stages = dict((x['stage'], x) for x in report['stages'])
+    assert ['nans_booleans', 'sample_id', 'time_format', 'per_column', 'combinations',
+            'del_columns', 'forbidden_characters', 'solve_dtypes', 'write'] == list(stages)
+    assert sorted(cleaning_args['rules']['per_column']) == sorted(
+        x['rule'] for x in stages['per_column']['rules'])
+    assert sorted(list(x) for x in cleaning_args['rules']['combinations']) == sorted(
+        x['rule'] for x in stages['combinations']['rules'])
+    assert stages['per_column']['cells_edited'] == sum(
+        x['cells_edited'] for x in stages['per_column']['rules'])
+    assert stages['del_columns']['columns_out'] < stages['del_columns']['columns_in']
+
+    chunks_fp = join(str(tmpdir), 'chunks')
+    metadata_clean_chunks(metadata_fp=md_fp, output_fp=chunks_fp, chunksize=5,
+                          profile=True, **cleaning_args)
+    with open(get_profile_fp(md_fp, chunks_fp)) as f:
+        report = json.load(f)
+    stages = dict((x['stage'], x) for x in report['stages'])
+    assert 3 == stages['read']['calls'] == stages['write']['calls']
+    assert metadata_pd.shape[0] == stages['write']['rows_in'] == report['rows']
+    # no profile otherwise
+    metadata_clean(metadata_pd=metadata_pd.copy(), metadata_fp=md_fp,
+                   output_fp=join(str(tmpdir), 'none'), **cleaning_args)
+    assert not isfile(get_profile_fp(md_fp, join(str(tmpdir), 'none')))
+
+
+def test_metadata_clean_incremental(tmpdir, capsys):
+    rules_fp = join("test_datasets", "input", "rules", "cleaning_rules.yaml")
+    md_fp = join("test_datasets", "input", "metadata", "dummy.tsv")
+    cleaning_args = get_cleaning_args(rules_fp)
+    sample_id_cols = cleaning_args['sample_id_cols']
+    full_fp = join(str(tmpdir), 'full')
+    metadata_clean(metadata_pd=parse_metadata_file(md_fp, sample_id_cols),
+                   metadata_fp=md_fp, output_fp=full_fp, **cleaning_args)
+    full_fps = [get_clean_metadata_fp(md_fp, full_fp), get_clean_metadata_user_fp(md_fp, full_fp)]
+
+    # the metadata grows by appended rows
+    with open(md_fp) as f:
+        lines = f.readlines()
+    grow_fp = join(str(tmpdir), 'grow.tsv')
+    inc_fp = join(str(tmpdir), 'inc')
+    for n_lines in [len(lines) - 3, len(lines), len(lines)]:
+        with open(grow_fp, 'w') as o:
+            o.write(''.join(lines[:n_lines]))
+        capsys.readouterr()
+        clean_fps = metadata_clean_incremental(
+            metadata_pd=parse_metadata_file(grow_fp, sample_id_cols),
+            metadata_fp=grow_fp, output_fp=inc_fp, **cleaning_args)
+        assert isfile(get_state_fp(grow_fp, inc_fp))
+    assert 'No new rows' in capsys.readouterr().out
+    for full_out, inc_out in zip(full_fps, clean_fps):
+        with open(full_out) as f, open(inc_out) as g:
+            assert f.read() == g.read()
+
+    # other rules or options: all the rows are cleaned again
+    metadata_clean_incremental(
+        metadata_pd=parse_metadata_file(grow_fp, sample_id_cols),
+        metadata_fp=grow_fp, output_fp=inc_fp, **dict(cleaning_args, no_nans=True))
+    n_rows = len(lines) - 1
+    assert 'Cleaned rows: %s (of %s)' % (n_rows, n_rows) in capsys.readouterr().out
+
+    with pytest.raises(ValueError):
+        metadata_clean_incremental(
+            metadata_pd=parse_metadata_file(grow_fp, sample_id_cols), metadata_fp=grow_fp,
+            output_fp=join(str(tmpdir), 'inc.parquet'), **cleaning_args)
+
+    # a changed row may change the dtype of its column: all the rows are cleaned again
+    edit_fp = join(str(tmpdir), 'edit.tsv')
+    edit_pd = pd.DataFrame({'sample_name': ['a', 'b', 'c'], 'x': ['1', '2', 'abc']})
+    for x in ['abc', '3']:
+        edit_pd.loc[2, 'x'] = x
+        edit_pd.to_csv(edit_fp, index=False, sep='\t')
+        capsys.readouterr()
+        inc_fps = metadata_clean_incremental(
+            metadata_pd=parse_metadata_file(edit_fp, sample_id_cols),
+            metadata_fp=edit_fp, output_fp=join(str(tmpdir), 'edit_inc'), **cleaning_args)
+        assert 'Cleaned rows: 3 (of 3)' in capsys.readouterr().out
+    full_fp = join(str(tmpdir), 'edit_full')
+    metadata_clean(metadata_pd=parse_metadata_file(edit_fp, sample_id_cols),
+                   metadata_fp=edit_fp, output_fp=full_fp, **cleaning_args)
+    full_fps = [get_clean_metadata_fp(edit_fp, full_fp), get_clean_metadata_user_fp(edit_fp, full_fp)]
+    for full_out, inc_out in zip(full_fps, inc_fps):
+        with open(full_out) as f, open(inc_out) as g:
+            assert f.read() == g.read()
+    assert ['1.0', '2.0', '3.0'] == pd.read_csv(inc_fps[0], sep='\t', dtype=str)['x'].tolist()
+
+
+def test_metadata_clean_incremental_summaries(tmpdir, capsys):
+    rules_fp = join("test_datasets", "input", "rules", "cleaning_rules.yaml")
+    cleaning_args = get_cleaning_args(rules_fp)
+    cleaning_args['rules'] = dict(cleaning_args['rules'], time_format={
+        'columns': ['visit'], 'format': 'DD/MM/YYYY HH:MM'})
+    sample_id_cols = cleaning_args['sample_id_cols']
+    md_fp = join(str(tmpdir), 'md.tsv')
+
+    def clean_appended(md_pd, n_rows):
+        md_pd.iloc[:n_rows].to_csv(md_fp, index=False, sep='\t')
+        inc_fps = metadata_clean_incremental(
+            metadata_pd=parse_metadata_file(md_fp, sample_id_cols), metadata_fp=md_fp,
+            output_fp=join(str(tmpdir), 'inc'), **cleaning_args)
+        full_fp = join(str(tmpdir), 'full')
+        metadata_clean(metadata_pd=parse_metadata_file(md_fp, sample_id_cols),
+                       metadata_fp=md_fp, output_fp=full_fp, **cleaning_args)
+        with open(get_clean_metadata_fp(md_fp, full_fp)) as f, open(inc_fps[0]) as g:
+            assert f.read() == g.read()
+        return capsys.readouterr().out
+
+    # the dates of the new rows are formatted as those of the previous rows...
+    md_pd = pd.DataFrame({'sample_name': ['a', 'b', 'c', 'd'],
+                          'visit': ['2015-01-01 10:30', '2015-01-02 11:00',
+                                    '2015-01-03 12:15', '2015-01-05']})
+    clean_appended(md_pd, 3)
+    assert 'Cleaned rows: 1 (of 4)' in clean_appended(md_pd, 4)
+    # ... and a first time in a column of dates changes the format of the previous rows
+    md_pd['visit'] = ['2015-01-01', '2015-01-02', '2015-01-03', '2015-01-05 10:30']
+    assert 'Cleaned rows: 3 (of 3)' in clean_appended(md_pd, 3)
+    assert 'Cleaned rows: 4 (of 4)' in clean_appended(md_pd, 4)
+
+    # the duplicated sample IDs of the new rows are numbered after the previous ones
+    md_pd = pd.DataFrame({'sample_name': ['a', 'a', 'b', 'a', 'c', 'b'],
+                          'visit': ['2015-01-01'] * 6})
+    assert 'Cleaned rows: 3 (of 3)' in clean_appended(md_pd, 3)
+    assert 'Cleaned rows: 2 (of 5)' in clean_appended(md_pd, 5)
+    # ... but a sample ID that was unique gets a suffix in its previous row
+    assert 'Cleaned rows: 6 (of 6)' in clean_appended(md_pd, 6)
+
+
+def test_metadata_clean_cache(tmpdir):
+    rules_fp = join("test_datasets", "input", "rules", "rules_test_full.yaml")
+    md_fp = join("test_datasets", "input", "metadata", "metadata_test_full.tsv")
+    cleaning_args = get_cleaning_args(rules_fp)
+    cleaning_args['no_time_format'] = False
+    sample_id_cols = cleaning_args['sample_id_cols']
+    out_fps = []
+    for name, cache in [('none', None), ('cold', ColumnCache(str(tmpdir.join('cache')))),
+                        ('warm', ColumnCache(str(tmpdir.join('cache'))))]:
+        out_fp = join(str(tmpdir), name)
+        metadata_clean(metadata_pd=parse_metadata_file(md_fp, sample_id_cols),
+                       metadata_fp=md_fp, output_fp=out_fp, cache=cache, **cleaning_args)
+        out_fps.append([get_clean_metadata_fp(md_fp, out_fp),
+                        get_clean_metadata_user_fp(md_fp, out_fp)])
+    metadata_pd = parse_metadata_file(md_fp, sample_id_cols)
+    n_cached = len([x for x in metadata_pd.columns if x not in sample_id_cols])
+    assert (n_cached, 0) == (cache.hits, cache.misses)
+    for none_fp, cold_fp, warm_fp in zip(*out_fps):
+        with open(none_fp) as f, open(cold_fp) as g, open(warm_fp) as h:
+            assert f.read() == g.read() == h.read()
+
+    # only the columns of an edited rule are cleaned again
+    rules = cleaning_args['rules']
+    name_rule = list(rules['per_column'])[0]
+    rules['per_column'][name_rule] = rules['per_column'][name_rule] + ['range(0,1)']
+    cache = ColumnCache(str(tmpdir.join('cache')))
+    metadata_clean(metadata_pd=metadata_pd, metadata_fp=md_fp, output_fp=join(str(tmpdir), 'edit'),
+                   cache=cache, **dict(cleaning_args, plan=None))
+    n_edited = len([x for x in metadata_pd.columns if name_rule.lower() in x.lower()])
+    assert 0 < n_edited == cache.misses
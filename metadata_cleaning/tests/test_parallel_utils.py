@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import pandas as pd
+
+from metadata_cleaning._parallel_utils import ColumnWorkers
+
+
+def get_column_summary(cur_col, suffix):
+    return '%s%s' % (cur_col.name, suffix), cur_col.sum()
+
+
+def test_get_shards():
+    workers = ColumnWorkers(2)
+    shards = workers.get_shards(list(range(10)))
+    assert 8 == len(shards)
+    assert list(range(10)) == [x for shard in shards for x in shard]
+    assert [[3], [5]] == workers.get_shards([3, 5])
+
+
+def test_map_columns():
+    md_pd = pd.DataFrame(dict(('c%s' % x, [x, x + 1]) for x in range(10)))
+    expected = [('c%s_' % x, 2 * x + 1) for x in range(10)]
+    for workers in [ColumnWorkers(1), ColumnWorkers(3), ColumnWorkers(3, threads=True)]:
+        assert expected == workers.map_columns(get_column_summary, md_pd, None, '_')
+        assert [('c9!', 19), ('c2!', 5)] == workers.map_columns(
+            get_column_summary, md_pd, [9, 2], '!')
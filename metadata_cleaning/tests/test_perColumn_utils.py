@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import pandas as pd
+import numpy as np
+
+from pandas.util.testing import (
+    assert_frame_equal,
+    assert_series_equal
+)
+
+from metadata_cleaning._perColumn_utils import (
+    missing_decision,
+    get_out_of_range_mask,
+    make_range_cleaning,
+    make_per_column_cleaning
+)
+
+
+def test_missing_decision():
+    assert missing_decision([0., 120.], -1.)
+    assert missing_decision([0., 120.], 121.)
+    assert not missing_decision([0., 120.], 0.)
+    # a bound of 0 is a bound
+    assert missing_decision([0., None], -1.)
+    assert missing_decision([-5., 0.], 1.)
+    assert not missing_decision([None, 0.], -1.)
+
+
+def test_get_out_of_range_mask():
+    col = pd.Series(['-1', '0', '120', '121', 'nan', 'x', np.nan, 3.5], dtype='object')
+    assert [True, False, False, True, False, False, False, False] == get_out_of_range_mask(
+        col, [0., 120.]).tolist()
+    assert [False, False, False, True, False, False, False, False] == get_out_of_range_mask(
+        col, [None, 120.]).tolist()
+    assert [True, False, False, False, False, False, False, False] == get_out_of_range_mask(
+        col, [0., None]).tolist()
+    assert [False, True, True] == get_out_of_range_mask(
+        pd.Series([-2, 1, 3]), [-5., 0.]).tolist()
+
+
+def test_make_range_cleaning():
+    col_in = pd.Series([10., 130., np.nan], index=[2, 1, 0], name='age')
+    col_out, edited = make_range_cleaning(col_in, [0., 120.], 'nan')
+    assert_series_equal(pd.Series([10., 'nan', np.nan], index=[2, 1, 0], name='age',
+                                  dtype='object'), col_out)
+    assert edited
+    col_out, edited = make_range_cleaning(col_in, [0., 200.], 'nan')
+    assert col_out is col_in
+    assert not edited
+    # categorical columns: only the categories are checked
+    col_in = pd.Series(['10', '130', 'x', '130'], dtype='category')
+    col_out, edited = make_range_cleaning(col_in, [0., 120.], 'nan')
+    assert_series_equal(pd.Series(['10', 'nan', 'x', 'nan']), col_out.astype('object'))
+    assert edited
+
+
+def test_make_per_column_cleaning():
+    md_in = pd.DataFrame({'age': ['1', '200', 'nan'], 'age_corr': [1, -1, 3],
+                          'sex': ['male', 'MALE', 'f']}, index=[10, 20, 30])
+    nan_decisions = {'age': set(), 'age_corr': set(), 'sex': set()}
+    md_out = pd.DataFrame({'age': ['1', 'nan', 'nan'], 'age_corr': [1, 'nan', 3],
+                           'sex': ['male', 'MALE', 'f']}, index=[10, 20, 30])
+    md, nan_decisions = make_per_column_cleaning(
+        md_in.copy(), 'age', [], ['range(0,120)'], 'nan', nan_decisions)
+    assert_frame_equal(md_out, md)
+    assert {'nan'} == nan_decisions['age_corr']
+    md_out['sex'] = ['male', 'male', 'female']
+    md, nan_decisions = make_per_column_cleaning(
+        md, 'sex', [], [{'male': 'male', 'f': 'female'}], 'nan', nan_decisions)
+    assert_frame_equal(md_out, md)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+from os.path import join
+
+from metadata_cleaning._yaml_utils import parse_yaml_file
+from metadata_cleaning._plan_utils import RulePlan
+
+
+def test_rule_plan():
+    rules_fp = join("test_datasets", "input", "rules", "cleaning_rules.yaml")
+    rules, nan_value, nan_value_user, sample_id_cols = parse_yaml_file(rules_fp, False)
+    plan = RulePlan(rules, nan_value)
+
+    assert plan.rules is rules
+    assert {'nans', 'booleans'} == set(plan.replacements)
+    assert {'False': 'No', 'True': 'Yes', 'false': 'No', 'true': 'Yes',
+            'FALSE': 'No', 'TRUE': 'Yes'} == plan.replacements['booleans']
+    assert 'nan' == plan.replacements['nans']['not provided']
+    assert 'NOT PROVIDED' not in plan.replacements['nans']
+
+    assert [('range', [0., 120.])] == plan.per_column['age']
+    assert 'replace' == plan.per_column['country'][0][0]
+    assert 'United States' == plan.per_column['country'][0][1]['usa']
+
+    assert {'age': ('in', 0., 4.), 'height': ('>', 105., None)} == \
+           plan.combinations[('age', 'height')]
+    assert 'translate' == plan.forbidden_characters[0]
+    assert plan.regex_nan.search('nan')
+
+    plan = RulePlan({'sample_id': {'sample_id_cols': ['sample_name']}}, nan_value)
+    assert {} == plan.replacements
+    assert {} == plan.per_column
+    assert {} == plan.combinations
+    assert plan.forbidden_characters is None
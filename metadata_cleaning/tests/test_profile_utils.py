@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+from os.path import join
+import json
+import numpy as np
+import pandas as pd
+
+from metadata_cleaning._profile_utils import (
+    get_cells_hashes,
+    count_edited_cells,
+    CleaningProfile,
+    start_stage,
+    stop_stage
+)
+
+
+def test_count_edited_cells():
+    md_in = pd.DataFrame({'a': ['1.5', 'x', np.nan, 'nan'], 'b': ['u', 'v', 'w', 'z']})
+    md_out = pd.DataFrame({'a': [1.5, 'y', np.nan, np.nan],
+                           'b': pd.Categorical(['u', 'v', 'w', 'Z'])})
+    hashes_in = get_cells_hashes(md_in)
+    # '1.5' -> 1.5 is not an edit but 'nan' -> NaN is
+    assert 3 == count_edited_cells(hashes_in, get_cells_hashes(md_out))
+    assert 1 == count_edited_cells(hashes_in, get_cells_hashes(md_out, ['b', 'c']))
+    assert 0 == count_edited_cells(hashes_in, get_cells_hashes(md_in))
+
+
+def test_cleaning_profile(tmpdir):
+    assert start_stage(None, 'stage') is None
+    stop_stage(None, None)
+
+    md_pd = pd.DataFrame({'a': ['1', 'x', 'y'], 'b': ['u', 'v', 'w']})
+    profile = CleaningProfile()
+    chunks = list(profile.iterate('read', [md_pd.iloc[:2], md_pd.iloc[2:]]))
+    assert 2 == len(chunks)
+    stage = start_stage(profile, 'per_column', md_pd)
+    for rule, col in [('a', 'a'), ('b', 'b')]:
+        stage_rule = start_stage(profile, 'per_column', md_pd, rule, [col])
+        md_pd[col] = md_pd[col].replace({'x': 'X', 'u': 'U', 'v': 'V'})
+        stop_stage(profile, stage_rule, md_pd)
+    stop_stage(profile, stage, md_pd)
+    stage = start_stage(profile, 'write', md_pd, count_edits=False)
+    stop_stage(profile, stage, md_pd.iloc[:, :1])
+
+    profile_fp = profile.write(join(str(tmpdir), 'profile.json'), rows=3)
+    with open(profile_fp) as f:
+        report = json.load(f)
+    assert 3 == report['rows']
+    assert ['read', 'per_column', 'write'] == [x['stage'] for x in report['stages']]
+    read, per_column, write = report['stages']
+    assert (2, 0, 3, 2) == (read['calls'], read['rows_in'], read['rows_out'],
+                            read['columns_out'])
+    assert 3 == per_column['cells_edited']
+    assert [('a', 1), ('b', 2)] == [(x['rule'], x['cells_edited'])
+                                    for x in per_column['rules']]
+    # the rules run within their stage
+    assert per_column['wall_time_s'] >= sum(x['wall_time_s'] for x in per_column['rules'])
+    assert (0, 2, 1) == (write['cells_edited'], write['columns_in'], write['columns_out'])
+    for record in [report] + report['stages']:
+        assert record['wall_time_s'] >= 0 and record['cpu_time_s'] >= 0
+        assert record['peak_memory_mb'] >= 0
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2019--, Clean development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import shutil
+import signal
+import threading
+from os.path import join, isfile, abspath
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+from metadata_cleaning import _serve_utils
+from metadata_cleaning._serve_utils import (
+    make_clean_job,
+    make_server,
+    send_request,
+    RulesStore
+)
+
+
+def test_make_clean_job():
+    job = make_clean_job('md.tsv', join('rules', 'r.yaml'), sample_id=('a', 'b'), no_nans=True)
+    assert 'clean' == job['command']
+    assert abspath('md.tsv') == job['metadata_fp']
+    assert abspath(join('rules', 'r.yaml')) == job['rules_fp']
+    assert job['output_fp'] is None
+    assert {'sample_id': ['a', 'b'], 'no_nans': True} == job['options']
+
+
+def test_rules_store(tmpdir):
+    rules_fp = str(tmpdir.join('rules.yaml'))
+    shutil.copy(join("test_datasets", "input", "rules", "cleaning_rules.yaml"), rules_fp)
+    store = RulesStore()
+    rules_hash, rules_entry = store.get(rules_fp)
+    assert 5 == len(rules_entry)
+    # not parsed again
+    assert (rules_hash, rules_entry) == store.get(rules_fp)
+    assert 1 == store.loads
+    # reloaded when modified
+    with open(rules_fp, 'a') as o:
+        o.write('\ndel_columns:\n- bmi\n')
+    os.utime(rules_fp, ns=(0, 0))
+    new_hash, new_entry = store.get(rules_fp)
+    assert new_hash != rules_hash
+    assert ['bmi'] == new_entry[0]['del_columns']
+    assert 2 == store.loads
+    assert [new_hash] == list(store.plans)
+
+
+def test_cleaning_server(tmpdir):
+    socket_fp = str(tmpdir.join('clean.sock'))
+    server = make_server(socket_fp, 1)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        assert 'done' == send_request({'command': 'ping'}, socket_fp)['status']
+        output_fp = str(tmpdir.join('dummy_clean.tsv'))
+        job = make_clean_job(join("test_datasets", "input", "metadata", "dummy.tsv"),
+                             join("test_datasets", "input", "rules", "cleaning_rules.yaml"),
+                             output_fp, no_cache=True)
+        for _ in range(2):
+            status = send_request(job, socket_fp)
+            assert 'done' == status['status']
+            assert (13, 16) == (status['rows'], status['columns'])
+        assert isfile(output_fp)
+        assert 1 == server.rules_store.loads
+        # a worker that dies (e.g. out of memory) does not break the next jobs
+        executor = server.executor
+        for pid in list(executor._processes):
+            os.kill(pid, signal.SIGKILL)
+        for _ in range(2):
+            assert 'done' == send_request(job, socket_fp)['status']
+        assert server.executor is not executor
+        status = send_request(dict(job, metadata_fp='NOFILE.tsv'), socket_fp)
+        assert 'failed' == status['status']
+        assert 'failed' == send_request({'command': 'other'}, socket_fp)['status']
+        assert 'done' == send_request({'command': 'shutdown'}, socket_fp)['status']
+        thread.join(30)
+        assert not thread.is_alive()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not os.path.exists(socket_fp)
+
+
+class KilledExecutor(object):
+    """
+    Pool of workers whose worker dies with each job.
+    """
+    def __init__(self, max_workers=None, mp_context=None):
+        pass
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool('A child process terminated abruptly'))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+def test_cleaning_server_killed_job(tmpdir, monkeypatch):
+    monkeypatch.setattr(_serve_utils, 'ProcessPoolExecutor', KilledExecutor)
+    server = make_server(str(tmpdir.join('clean.sock')), 1)
+    try:
+        executor = server.executor
+        job = make_clean_job(join("test_datasets", "input", "metadata", "dummy.tsv"),
+                             join("test_datasets", "input", "rules", "cleaning_rules.yaml"))
+        # the job that kills its process, even alone, fails on its own
+        status = server.respond(job)
+        assert 'failed' == status['status']
+        assert job['metadata_fp'] == status['metadata_fp']
+        assert status['error'].startswith('BrokenProcessPool')
+        assert server.executor is not executor
+    finally:
+        server.server_close()
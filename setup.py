@@ -65,6 +65,11 @@ setup(
         "pytest",
         "pandas"
     ],
+    # parquet and feather metadata files
+    extras_require={
+        "arrow": ["pyarrow"],
+        "zstd": ["zstandard"]
+    },
     ## Based on how Altair splits up its requirements:
     ## https://github.com/altair-viz/altair/blob/master/setup.py
     #extras_require={